@@ -1,3 +1,4 @@
+from pydantic import PositiveInt
 from pydantic_settings import BaseSettings
 from typing import Optional
 import json
@@ -16,6 +17,67 @@ class Settings(BaseSettings):
     TACACS_KEY_PRIMARIO: Optional[str] = None
     TACACS_KEY_SECUNDARIO: Optional[str] = None
     TACACS_KEY_FORTI: Optional[str] = None
+    # Pool de sessões SSH (segundos / sessões simultâneas por host)
+    SSH_POOL_IDLE_TIMEOUT: int = 300
+    SSH_POOL_MAX_PER_HOST: int = 2
+    SSH_POOL_HEALTH_INTERVAL: int = 30
+    # Timeout padrão por comando (segundos) até o prompt reaparecer
+    SSH_COMMAND_TIMEOUT: float = 30.0
+    # Máximo de operações SSH simultâneas (threads dedicadas fora do event loop)
+    SSH_MAX_CONCURRENCY: int = 32
+    # Máximo de equipamentos em paralelo no /api/ssh-execute/bulk (somando todas as requisições)
+    SSH_BULK_MAX_PARALLEL: int = 16
+    # Descoberta de topologia: dispositivos consultados em paralelo por nível (BFS)
+    DISCOVERY_MAX_WORKERS: int = 16
+    # Cache por IP do resultado CDP/LLDP (persistido em JSON)
+    DISCOVERY_CACHE_TTL: int = 3600
+    DISCOVERY_CACHE_MAX_ENTRIES: int = 5000
+    DISCOVERY_CACHE_PATH: str = "discovery_cache.json"
+    TOPOLOGY_REALTIME_TTL: int = 300    # segundos que o mapa em tempo real de uma loja é servido do cache
+    TOPOLOGY_REALTIME_HOPS: int = 2     # profundidade da descoberta a partir dos equipamentos da loja
+    # Planilha de lojas (circuitos/operadoras WAN); relida quando o arquivo muda
+    STORE_INVENTORY_PATH: str = "user_input_files/info_lojas.xlsx"   # ou lojas_data.json (mesmas colunas, sem pandas)
+    STORE_INVENTORY_SNAPSHOT: str = "store_inventory.snap"   # binário compilado da planilha (vazio = não usa)
+
+    # Cliente HTTP compartilhado (Zabbix/PLAI)
+    HTTP_MAX_CONNECTIONS: int = 100
+    HTTP_MAX_KEEPALIVE: int = 20
+    HTTP_KEEPALIVE_EXPIRY: float = 60.0
+    HTTP2_ENABLED: bool = False         # requer o pacote opcional 'h2'
+    # Cache de respostas do proxy Zabbix (entradas LRU)
+    ZABBIX_CACHE_MAX_ENTRIES: int = 1000
+    # Polling incremental de problemas: releitura completa a cada N ciclos
+    POLLER_RESYNC_EVERY: int = 15
+    # Estado dos problemas notificados: "sqlite" (persistente, multi-worker) ou "memory"
+    STATE_STORE_BACKEND: str = "sqlite"
+    STATE_STORE_PATH: str = "problem_state.db"
+    # Fila de notificações (webhook)
+    NOTIFY_WORKERS: int = 4               # workers por canal (padrão; "workers" no canal sobrescreve)
+    NOTIFY_QUEUE_MAX: int = 1000
+    NOTIFY_LANE_QUEUE_MAX: int = 500      # entregas pendentes por canal; excedente vai ao dead-letter
+    NOTIFY_RATE_PER_MINUTE: PositiveInt = 30   # posts por minuto por webhook (> 0)
+    NOTIFY_MAX_RETRIES: int = 4
+    NOTIFY_RETRY_BASE_DELAY: float = 1.0
+    NOTIFY_DIGEST_WINDOW: float = 5.0     # segundos agrupando alertas antes de enviar
+    NOTIFY_DIGEST_THRESHOLD: int = 3      # a partir de N alertas na janela vira um card só
+    NOTIFY_DIGEST_MAX_ITEMS: int = 25
+    # Dedup / flapping por host+trigger
+    FLAP_WINDOW: int = 1800               # janela (s) em que as transições são contadas
+    FLAP_THRESHOLD: int = 4               # transições na janela para considerar flapping
+    FLAP_HOLDDOWN: int = 120              # normalização só é avisada se durar esse tempo (s)
+    FLAP_STABLE_AFTER: int = 600          # sem transições por esse tempo (s) encerra o flapping
+
+    # Insights da análise proativa da IA (por execução SSH)
+    AI_INSIGHTS_TTL: int = 600            # segundos desde a última atualização até a sessão expirar
+    AI_INSIGHTS_MAX_ENTRIES: int = 500
+    # Fila das análises proativas: workers fixos, pendentes no máximo (1 por host) e tempo limite por análise
+    AI_JOB_WORKERS: int = 4
+    AI_JOB_QUEUE_MAX: int = 100
+    AI_JOB_TIMEOUT: float = 180.0
+    # Startup: orçamento (ms) do import do main.py até o app pronto, e módulos pesados
+    # importados em segundo plano logo depois (o primeiro uso não paga o import)
+    STARTUP_BUDGET_MS: int = 1500
+    STARTUP_PREWARM_IMPORTS: str = "paramiko,httpcore"
 
     class Config:
         env_file = ".env"
@@ -107,12 +107,10 @@ class NetworkDashboard {
             const storeExists = this.storesData.find(s => s.id === targetStoreId);
 
             if (storeExists) {
-                this.performSearch();
-
-                setTimeout(() => {
+                this.performSearch().then(() => {
                     select.value = targetStoreId;
                     this.onStoreSelect(targetStoreId, term);
-                }, 50);
+                });
 
                 return;
             }
@@ -140,7 +138,7 @@ class NetworkDashboard {
 
     async loadStoresData() {
         try {
-            const response = await fetch('/api/stores/search?limit=1000');
+            const response = await fetch('/api/stores/search');
             const data = await response.json();
             this.storesData = data.stores || [];
             this.populateStoreSelect(this.storesData);
@@ -160,21 +158,27 @@ class NetworkDashboard {
         });
     }
 
-    performSearch() {
-        const qStore = document.getElementById('store-search').value.toLowerCase();
-        const qCirc = document.getElementById('circuit-search').value.toLowerCase();
-
-        const filteredStores = this.storesData.filter(s => {
-            const text = `${s.id} - ${s.nome}`.toLowerCase();
-            const matchStore = !qStore || text.includes(qStore);
-            let matchCirc = true;
-            if (qCirc) {
-                const w1 = (s.circuito_wan1 || '').toLowerCase();
-                const w2 = (s.circuito_wan2 || '').toLowerCase();
-                matchCirc = w1.includes(qCirc) || w2.includes(qCirc);
+    // Filtro feito no backend (índice do inventário); storesData continua com a lista completa
+    async performSearch() {
+        const qStore = document.getElementById('store-search').value.trim();
+        const qCirc = document.getElementById('circuit-search').value.trim();
+        const seq = this._searchSeq = (this._searchSeq || 0) + 1;
+
+        let filteredStores = this.storesData;
+        if (qStore || qCirc) {
+            const params = new URLSearchParams();
+            if (qStore) params.append('q', qStore);
+            if (qCirc) params.append('circuit', qCirc);
+            try {
+                const response = await fetch(`/api/stores/search?${params.toString()}`);
+                filteredStores = (await response.json()).stores || [];
+            } catch (e) {
+                console.error(e);
+                return;
             }
-            return matchStore && matchCirc;
-        });
+            // Uma busca mais nova já respondeu/está a caminho: descarta esta
+            if (seq !== this._searchSeq) return;
+        }
 
         const selectEl = document.getElementById('store-select');
         const currentVal = selectEl.value;
@@ -329,6 +329,7 @@ class SSHCommandManager {
                 hostObject: host, // Return full host object for persistence
                 originalCommands: commands,
                 commands: commandResults,
+                insightSession: response.insight_session || null, // sessão da análise proativa da IA
                 timestamp: new Date()
             };
         } catch (error) {
@@ -630,41 +631,8 @@ Release 1808P35, H3C S12504
                             startRefresh();
                         }
                         
-                        // Automatic Background AI Polling
-                        let aiPollCount = 0;
-                        const maxPolls = 90; // 90 * 2s = 180s
-                        const aiPollInterval = setInterval(async () => {
-                            if (aiPollCount >= maxPolls) {
-                                clearInterval(aiPollInterval);
-                                return;
-                            }
-                            try {
-                                const response = await window.opener.api.get(\`/api/ai-insights/\${'${res.host}'}\`);
-                                
-                                if (response) {
-                                    if (response.status === 'investigating' && response.message) {
-                                        const container = window.document.getElementById('ai-analysis-container');
-                                        if (container && container.style.display === 'none') {
-                                            container.style.display = 'block';
-                                            // Adiciona mensagem inicial apenas quando exibe o container
-                                            window.opener.sshCommandManager.addChatMessage(window, 'assistant', '<em>Iniciando análise interativa dos logs...</em>');
-                                        }
-                                        window.opener.sshCommandManager.addChatMessage(window, 'assistant', response.message);
-                                        const chatContainer = window.document.getElementById('chat-messages');
-                                        if (chatContainer) chatContainer.scrollTop = chatContainer.scrollHeight;
-                                    }
-                                    
-                                    if (response.has_insight) {
-                                        clearInterval(aiPollInterval);
-                                        window.opener.sshCommandManager.showBackgroundInsight(window, response.insight);
-                                    }
-                                }
-                            } catch(e) {
-                                console.warn('AI Polling erro:', e);
-                                clearInterval(aiPollInterval);
-                            }
-                            aiPollCount++;
-                        }, 2000);
+                        // Análise da IA em segundo plano: o servidor empurra o andamento (SSE)
+                        window.opener.sshCommandManager.watchInsights(window, '${res.insightSession || ''}');
                     </script>
                 </body>
             </html>
@@ -680,6 +648,64 @@ Release 1808P35, H3C S12504
         resultsWindow.chatHistory = []; // Initialize chat history
     }
 
+    /**
+     * Acompanha a análise proativa da IA de uma execução via SSE (substitui o polling).
+     * Uma nova execução na mesma janela (auto-refresh) troca a sessão acompanhada.
+     * @param {Window} win - Janela de resultados
+     * @param {string} session - insight_session devolvido por /api/ssh-execute
+     */
+    watchInsights(win, session) {
+        if (!session || !win || win.closed) return;
+        if (win.insightSource) win.insightSource.close();
+
+        const url = `/api/ai-insights/${encodeURIComponent(session)}`;
+        const source = new EventSource(`${url}/stream`);
+        win.insightSource = source;
+        // Janela fechada com a análise ainda na fila/em andamento: libera o worker no servidor
+        const cancel = () => {
+            if (source.readyState === EventSource.CLOSED) return;
+            source.close();
+            fetch(url, { method: 'DELETE', keepalive: true }).catch(() => {});
+        };
+        win.addEventListener('beforeunload', cancel);
+
+        const alive = () => {
+            if (win.closed) {
+                cancel();
+                return false;
+            }
+            return true;
+        };
+
+        source.addEventListener('investigating', (e) => {
+            if (!alive()) return;
+            const data = JSON.parse(e.data);
+            if (!data.message) return;
+            const container = win.document.getElementById('ai-analysis-container');
+            if (container && container.style.display === 'none') {
+                container.style.display = 'block';
+                // Adiciona mensagem inicial apenas quando exibe o container
+                this.addChatMessage(win, 'assistant', '<em>Iniciando análise interativa dos logs...</em>');
+            }
+            this.addChatMessage(win, 'assistant', data.message);
+            const chatContainer = win.document.getElementById('chat-messages');
+            if (chatContainer) chatContainer.scrollTop = chatContainer.scrollHeight;
+        });
+
+        source.addEventListener('completed', (e) => {
+            source.close();
+            if (alive()) this.showBackgroundInsight(win, JSON.parse(e.data).insight);
+        });
+
+        // Falha da análise ou sessão expirada/descartada: só encerra, como o polling fazia
+        for (const ev of ['failed', 'expired', 'evicted']) {
+            source.addEventListener(ev, (e) => {
+                source.close();
+                console.warn(`AI insight ${ev}:`, e.data);
+            });
+        }
+    }
+
     /**
      * Add message to chat UI
      */
@@ -916,6 +942,7 @@ Release 1808P35, H3C S12504
             }
 
             const results = await this.executeCommands(currentHost, this.lastExecutedCommands);
+            this.watchInsights(win, results.insightSession);
 
             // Update DOM in the popup window
             const container = win.document.getElementById('results-container');
@@ -107,6 +107,14 @@ class TopologyMap {
                     <option value="3">3 hops</option>
                 </select>
 
+                <select id="topo-cache-mode" title="Uso do cache de descoberta"
+                    style="padding:6px 8px; border-radius:6px; background:#1f2937;
+                           border:1px solid #374151; color:#e5e7eb; font-size:13px;">
+                    <option value="auto" selected>Cache</option>
+                    <option value="refresh">Atualizar alterados</option>
+                    <option value="full">Reescanear tudo</option>
+                </select>
+
                 <div style="display:flex; gap:4px; flex-wrap:wrap;">
                     <label style="font-size:12px; color:#9ca3af; display:flex; align-items:center; gap:3px; cursor:pointer;">
                         <input type="checkbox" id="filter-switch" checked> Switch
@@ -128,6 +136,12 @@ class TopologyMap {
                     🔍 Descobrir
                 </button>
 
+                <button id="btn-store-realtime" title="Descoberta a partir dos equipamentos da loja no Zabbix (Shift+clique força nova varredura)"
+                    style="padding:6px 14px; border-radius:6px; background:#10b981; color:#fff;
+                           border:none; cursor:pointer; font-size:13px; white-space:nowrap;">
+                    🏬 Loja
+                </button>
+
                 <button id="btn-topo-fit" title="Ajustar visualização"
                     style="padding:6px 10px; border-radius:6px; background:#374151;
                            color:#9ca3af; border:none; cursor:pointer; font-size:13px;">
@@ -139,6 +153,13 @@ class TopologyMap {
 
         document.getElementById('btn-auto-discover')?.addEventListener('click', () => this._startAutoDiscover());
         document.getElementById('btn-topo-fit')?.addEventListener('click', () => this.network?.fit());
+        document.getElementById('btn-store-realtime')?.addEventListener('click', (e) => {
+            if (!this.currentStoreId) {
+                this._setStatus('Selecione uma loja para a descoberta em tempo real.', '#f59e0b');
+                return;
+            }
+            this.loadTopology(this.currentStoreId, 'realtime', e.shiftKey);
+        });
     }
 
     _buildLegend() {
@@ -161,8 +182,14 @@ class TopologyMap {
         if (el) el.innerHTML = `<span style="color:${color}">${msg}</span>`;
     }
 
-    // ── Descoberta Automática ──────────────────────────────────────────────
+    // ── Descoberta Automática (streaming) ──────────────────────────────────
+    // Os nós chegam por SSE conforme cada dispositivo responde; clicar de novo em
+    // "Descobrir" ou fechar o modal cancela a varredura no servidor.
     async _startAutoDiscover() {
+        if (this._discoverAbort) {
+            this._stopDiscover();
+            return;
+        }
         const seedIp = document.getElementById('topo-seed-ip')?.value?.trim();
         if (!seedIp) {
             this._setStatus('⚠ Informe o IP do dispositivo seed.', '#f59e0b');
@@ -170,6 +197,7 @@ class TopologyMap {
         }
 
         const hops = parseInt(document.getElementById('topo-hops')?.value || '1', 10);
+        const cacheMode = document.getElementById('topo-cache-mode')?.value || 'auto';
         const types = [];
         if (document.getElementById('filter-switch')?.checked) types.push('switch');
         if (document.getElementById('filter-ap')?.checked) types.push('ap');
@@ -177,49 +205,125 @@ class TopologyMap {
         if (document.getElementById('filter-router')?.checked) types.push('router');
 
         const btn = document.getElementById('btn-auto-discover');
-        if (btn) { btn.disabled = true; btn.textContent = '⏳ Escaneando...'; }
+        if (btn) btn.textContent = '⏹ Parar';
         this._setStatus(`Conectando a ${seedIp}... aguarde.`, '#60a5fa');
 
+        const abort = new AbortController();
+        this._discoverAbort = abort;
+        const progress = { scanned: 0, failed: [], hop: 0, physics: false };
+        let summary = null;
+
         try {
-            const resp = await fetch('/api/topology/discover', {
+            const resp = await fetch('/api/topology/discover/stream', {
                 method: 'POST',
                 headers: { 'Content-Type': 'application/json' },
                 body: JSON.stringify({
                     seed_ip: seedIp,
                     max_hops: hops,
                     include_types: types.length > 0 ? types : null,
+                    cache_mode: cacheMode,
                 }),
+                signal: abort.signal,
             });
 
-            const data = await resp.json();
-
             if (!resp.ok) {
+                const data = await resp.json().catch(() => ({}));
                 this._setStatus(`❌ Erro: ${data.detail || resp.statusText}`, '#ef4444');
                 return;
             }
 
-            const nodeCount = (data.nodes || []).length;
-            const edgeCount = (data.edges || []).length;
-
-            if (nodeCount === 0) {
-                this._setStatus('Nenhum dispositivo encontrado. Verifique IP e credenciais SSH no .env.', '#f59e0b');
-                return;
+            this.render({ nodes: [], edges: [] });
+
+            const reader = resp.body.getReader();
+            const decoder = new TextDecoder();
+            let buffer = '';
+            while (true) {
+                const { value, done } = await reader.read();
+                if (done) break;
+                buffer += decoder.decode(value, { stream: true });
+                let sep;
+                while ((sep = buffer.indexOf('\n\n')) >= 0) {
+                    const frame = buffer.slice(0, sep);
+                    buffer = buffer.slice(sep + 2);
+                    let event = 'message', data = '';
+                    for (const line of frame.split('\n')) {
+                        if (line.startsWith('event: ')) event = line.slice(7);
+                        else if (line.startsWith('data: ')) data += line.slice(6);
+                    }
+                    const payload = data ? JSON.parse(data) : {};
+                    if (event === 'done') summary = payload;
+                    else this._applyDiscoverEvent(event, payload, progress);
+                }
             }
 
-            this.render(data);
-
-            const errMsg = data.error ? ` (aviso: ${data.error})` : '';
-            this._setStatus(
-                `✅ ${nodeCount} dispositivo(s), ${edgeCount} link(s) descoberto(s)${errMsg}`,
-                data.error ? '#f59e0b' : '#10b981'
-            );
+            if (!summary) {
+                this._setStatus('⚠ Conexão encerrada antes do fim da descoberta.', '#f59e0b');
+            } else if (summary.nodes === 0) {
+                this._setStatus(summary.error ? `❌ Erro: ${summary.error}` : 'Nenhum dispositivo encontrado. Verifique IP e credenciais SSH no .env.', '#f59e0b');
+            } else {
+                const cacheMsg = summary.cache?.hits ? ` — ${summary.cache.hits} do cache, ${summary.cache.misses} consultado(s)` : '';
+                const failMsg = progress.failed.length ? ` — ${progress.failed.length} falha(s): ${progress.failed.join(', ')}` : '';
+                const errMsg = summary.error ? ` (aviso: ${summary.error})` : '';
+                this._setStatus(
+                    `✅ ${summary.nodes} dispositivo(s), ${summary.edges} link(s) descoberto(s) em ${(summary.elapsed_ms / 1000).toFixed(1)}s${cacheMsg}${failMsg}${errMsg}`,
+                    summary.error || progress.failed.length ? '#f59e0b' : '#10b981'
+                );
+            }
+            // Layout final igual ao da descoberta não-streaming (estabiliza, enquadra e congela)
+            if (this.nodes.length) this.render({ nodes: this.nodes.get(), edges: this.edges.get() });
 
         } catch (err) {
-            console.error('[TopologyMap] Discover error:', err);
-            this._setStatus(`❌ Erro de rede: ${err.message}`, '#ef4444');
+            if (err.name === 'AbortError') {
+                this._setStatus(`⏹ Descoberta interrompida — ${this.nodes.length} dispositivo(s) até aqui.`, '#f59e0b');
+            } else {
+                console.error('[TopologyMap] Discover error:', err);
+                this._setStatus(`❌ Erro de rede: ${err.message}`, '#ef4444');
+            }
         } finally {
-            if (btn) { btn.disabled = false; btn.textContent = '🔍 Descobrir'; }
+            if (this._discoverAbort === abort) this._discoverAbort = null;
+            if (btn) btn.textContent = '🔍 Descobrir';
+        }
+    }
+
+    _stopDiscover() {
+        this._discoverAbort?.abort();
+        this._discoverAbort = null;
+    }
+
+    _applyDiscoverEvent(event, payload, progress) {
+        switch (event) {
+            case 'node-added':
+                // Física ligada enquanto chegam nós, para o layout se acomodar aos poucos
+                if (!progress.physics) {
+                    progress.physics = true;
+                    this.network?.setOptions({ physics: { enabled: true } });
+                }
+                this.nodes.update(this._normalizeNode(payload));
+                break;
+            case 'node-updated':
+                this.nodes.update(this._normalizeNode(payload));
+                break;
+            case 'edge-added':
+                this.edges.update(payload);
+                break;
+            case 'level':
+                progress.hop = payload.hop;
+                break;
+            case 'device-scanned':
+                progress.scanned++;
+                break;
+            case 'device-failed':
+                progress.scanned++;
+                progress.failed.push(payload.ip);
+                break;
+            default:
+                return;
         }
+        this._setStatus(
+            `⏳ Hop ${progress.hop}: ${progress.scanned} consultado(s), ${this.nodes.length} dispositivo(s), ${this.edges.length} link(s)` +
+            (progress.failed.length ? ` — ${progress.failed.length} falha(s)` : ''),
+            '#60a5fa'
+        );
     }
 
     // ── Eventos do modal e nós ─────────────────────────────────────────────
@@ -233,6 +337,7 @@ class TopologyMap {
         btnOpen?.addEventListener('click', () => this.open(this.currentStoreId));
 
         btnClose?.addEventListener('click', () => {
+            this._stopDiscover();
             modal?.classList.add('hidden');
             modal?.classList.remove('flex');
         });
@@ -247,6 +352,7 @@ class TopologyMap {
 
         modal?.addEventListener('click', (e) => {
             if (e.target === modal) {
+                this._stopDiscover();
                 modal.classList.add('hidden');
                 modal.classList.remove('flex');
             }
@@ -334,15 +440,17 @@ class TopologyMap {
         }
     }
 
-    async loadTopology(storeId = null, mode = 'mock') {
+    async loadTopology(storeId = null, mode = 'mock', refresh = false) {
         this.currentStoreId = storeId;
-        this._setStatus('Carregando topologia de exemplo...', '#60a5fa');
+        const realtime = mode === 'realtime';
+        this._setStatus(realtime ? `⏳ Descobrindo equipamentos da loja ${storeId}...` : 'Carregando topologia de exemplo...', '#60a5fa');
 
         try {
             let url = '/api/topology';
             const params = new URLSearchParams();
             if (storeId) params.append('store_id', storeId);
             if (mode) params.append('mode', mode);
+            if (refresh) params.append('refresh', 'true');
             if ([...params].length > 0) url += `?${params.toString()}`;
 
             const response = await fetch(url);
@@ -350,18 +458,29 @@ class TopologyMap {
 
             const data = await response.json();
             if (!data.nodes || data.nodes.length === 0) {
-                this._setStatus('Nenhum nó retornado. Use "Descobrir" para scan real.', '#f59e0b');
+                this._setStatus(data.error || 'Nenhum nó retornado. Use "Descobrir" para scan real.', '#f59e0b');
                 return;
             }
 
             this.render(data);
-            this._setStatus(`Topologia de exemplo — ${data.nodes.length} nós. Use "Descobrir" para dados reais.`, '#6b7280');
+            if (realtime) {
+                const age = data.cached ? ` — do cache (${Math.round(Date.now() / 1000 - data.generated_at)}s atrás)` : ` em ${(data.elapsed_ms / 1000).toFixed(1)}s`;
+                this._setStatus(`✅ Loja ${storeId}: ${data.nodes.length} dispositivo(s), ${data.edges.length} link(s) a partir de ${data.seeds.length} equipamento(s)${age}`, '#10b981');
+            } else {
+                this._setStatus(`Topologia de exemplo — ${data.nodes.length} nós. Use "Descobrir" para dados reais.`, '#6b7280');
+            }
         } catch (error) {
             console.error('[TopologyMap] Load error:', error);
             this._setStatus(`Erro ao carregar: ${error.message}`, '#ef4444');
         }
     }
 
+    // Normalizar nó: garantir que group seja um dos grupos definidos
+    _normalizeNode(n) {
+        const validGroups = new Set(['switch', 'ap', 'firewall', 'router', 'cloud', 'unknown']);
+        return { ...n, group: validGroups.has(n.group) ? n.group : 'unknown' };
+    }
+
     // ── Renderizador vis.js ────────────────────────────────────────────────
     render(data) {
         if (this.container.offsetWidth < 10 && this._retryCount < 4) {
@@ -371,12 +490,7 @@ class TopologyMap {
         }
         this._retryCount = 0;
 
-        // Normalizar nós: garantir que group seja um dos grupos definidos
-        const validGroups = new Set(['switch', 'ap', 'firewall', 'router', 'cloud', 'unknown']);
-        const normalized = (data.nodes || []).map(n => ({
-            ...n,
-            group: validGroups.has(n.group) ? n.group : 'unknown',
-        }));
+        const normalized = (data.nodes || []).map(n => this._normalizeNode(n));
 
         this.nodes.clear();
         this.edges.clear();
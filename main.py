@@ -1,28 +1,72 @@
-from fastapi import FastAPI, HTTPException, Request, BackgroundTasks
+import time
+_IMPORT_STARTED = time.perf_counter()  # início do import do main (perfil de startup)
+
+from fastapi import FastAPI, HTTPException, Request
 from fastapi.staticfiles import StaticFiles
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import FileResponse, JSONResponse
+from fastapi.responses import FileResponse, JSONResponse, Response, StreamingResponse
 from pydantic import BaseModel
 from typing import List, Optional, Dict, Any
-import uvicorn
+from urllib.parse import urlsplit
 import httpx
-import paramiko
-import pandas as pd
 import os
+import re
 import json
-import time
+import asyncio
+import threading
+import traceback
+import weakref
 from config import settings
-from services.scheduler import start_scheduler, stop_scheduler
+from services.startup_profile import startup_profile
+from services.scheduler import start_scheduler, stop_scheduler, flap_detector
 from services.notifications import notification_service
+from services.notification_dispatcher import notification_dispatcher
+from services.ssh_pool import ssh_pool
+from services.ssh_executor import ssh_executor
+from services.http_clients import http_clients
+from services.zabbix_cache import zabbix_cache, is_write_method
+from services.zabbix_auth import zabbix_auth, ZabbixAPIError
+from services.zabbix_monitor import zabbix_monitor
+from services.problem_poller import problem_poller
+from services.state_store import state_store
+from services.inventory import store_inventory
+from services.ai_insights import ai_insights
+from services.ai_jobs import ai_analysis_queue
+from services.topology import topology_service
+from services.discovery import discovery_service
+from services.discovery_cache import CACHE_MODES
 from contextlib import asynccontextmanager
 
+# paramiko (SSH), httpcore (transportes HTTP) e pandas (rebuild do inventário) ficam para o primeiro uso
+startup_profile.start(_IMPORT_STARTED)
+startup_profile.mark("imports")
+
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     # Startup
+    startup_profile.mark("app")
+    await http_clients.start()
     start_scheduler()
+    startup_profile.mark("http_clients+scheduler")
+    ssh_pool.start()
+    state_store.open()
+    notification_dispatcher.start()
+    ai_analysis_queue.start()
+    startup_profile.mark("ssh_pool+state_store+notifications")
+    # Inventário de lojas: snapshot binário (ou a planilha, se ele estiver desatualizado)
+    await asyncio.to_thread(store_inventory.refresh)
+    startup_profile.mark("inventory")
+    startup_profile.ready()
     yield
     # Shutdown
     stop_scheduler()
+    ssh_executor.shutdown()
+    discovery_service.shutdown()
+    ssh_pool.shutdown()
+    await ai_analysis_queue.stop()
+    await notification_dispatcher.stop()
+    state_store.close()
+    await http_clients.close()
 
 app = FastAPI(title="Network Monitor API", lifespan=lifespan)
 
@@ -54,42 +98,52 @@ class SSHCommandRequest(BaseModel):
     username: Optional[str] = None
     password: Optional[str] = None
     commands: List[str]
+    timeout: Optional[float] = None       # Timeout por comando (s); padrão SSH_COMMAND_TIMEOUT
 
 class ConfigUpdate(BaseModel):
     zabbix: Optional[dict] = None
     ssh: Optional[dict] = None
     notifications: Optional[dict] = None
 
-# Global Cache
-LOJAS_CACHE = None
+# Token devolvido ao frontend no user.login; o token real fica só no backend
+SERVER_MANAGED_TOKEN = "server-managed-session"
 
-def carregar_lojas_excel():
-    global LOJAS_CACHE
-    if LOJAS_CACHE: return LOJAS_CACHE
-    
-    excel_path = 'user_input_files/info_lojas.xlsx'
-    if not os.path.exists(excel_path): return []
-    
-    try:
-        df = pd.read_excel(excel_path).fillna('')
-        lojas = []
-        for _, row in df.iterrows():
-            loja = {
-                'id': str(row.get('Loja', '')).strip(),
-                'nome': f"Loja {str(row.get('Loja', ''))}",
-                'operador_wan1': str(row.get('WAN1_Operadora', '')),
-                'circuito_wan1': str(row.get('WAN1_Circuito', '')),
-                'banda_wan1': str(row.get('WAN1_Banda', '')),
-                'operador_wan2': str(row.get('WAN2_Operadora', '')),
-                'circuito_wan2': str(row.get('WAN2_Circuito', '')),
-                'banda_wan2': str(row.get('WAN2_Banda', ''))
-            }
-            if loja['id']: lojas.append(loja)
-        LOJAS_CACHE = lojas
-        return lojas
-    except Exception as e:
-        print(f"Erro Excel: {e}")
-        return []
+async def _zabbix_proxy_batch(items: list) -> list:
+    """
+    Batch JSON-RPC do frontend: user.login/logout respondidos localmente (como no
+    caminho avulso), o resto vai ao Zabbix numa requisição só com o token do backend.
+    As respostas voltam com o id original de cada item.
+    """
+    if not items or not all(isinstance(i, dict) for i in items):
+        raise HTTPException(status_code=400, detail="Batch JSON-RPC inválido")
+    responses: List[Optional[dict]] = [None] * len(items)
+    forward = []
+    for pos, item in enumerate(items):
+        method = item.get("method", "")
+        if method in ("user.login", "user.logout"):
+            if not zabbix_auth.configured:
+                raise HTTPException(
+                    status_code=400,
+                    detail="Credenciais Zabbix não configuradas. Preencha ZABBIX_USER e ZABBIX_PASSWORD no .env."
+                )
+            if method == "user.login":
+                await zabbix_auth.token()
+            responses[pos] = {"jsonrpc": "2.0", "result": SERVER_MANAGED_TOKEN if method == "user.login" else True}
+        else:
+            forward.append(pos)
+    if forward:
+        writes = {items[pos].get("method", "") for pos in forward}
+        writes = {m for m in writes if is_write_method(m)}
+        for m in writes:
+            zabbix_cache.invalidate_for_write(m)
+        try:
+            results = await zabbix_auth.request_batch([items[pos] for pos in forward])
+        finally:
+            for m in writes:
+                zabbix_cache.invalidate_for_write(m)
+        for pos, data in zip(forward, results):
+            responses[pos] = data
+    return [{**data, "jsonrpc": "2.0", "id": item.get("id")} for item, data in zip(items, responses)]
 
 # Routes
 @app.post("/api/zabbix-proxy")
@@ -97,29 +151,42 @@ async def zabbix_proxy(request: Request):
     try:
         body = await request.json()
         target_url = settings.ZABBIX_URL
+        method = body.get("method", "") if isinstance(body, dict) else ""
 
-        # ── Injetar credenciais reais no user.login ──────────────────────
-        # O frontend nunca recebe as senhas reais (GET /api/config retorna ***),
-        # então o proxy as injeta aqui a partir do .env.
-        method = body.get("method", "")
-        if method == "user.login":
-            if not settings.ZABBIX_USER or not settings.ZABBIX_PASSWORD:
+        # ── Sessão Zabbix gerenciada pelo backend ──────────────────────────
+        # O frontend nunca recebe as senhas reais (GET /api/config retorna ***).
+        # Em vez de abrir uma sessão Zabbix por navegador, o proxy responde o
+        # user.login localmente e injeta o token compartilhado em cada chamada.
+        if method in ("user.login", "user.logout"):
+            if not zabbix_auth.configured:
                 raise HTTPException(
                     status_code=400,
                     detail="Credenciais Zabbix não configuradas. Preencha ZABBIX_USER e ZABBIX_PASSWORD no .env."
                 )
-            # Suporta Zabbix 6.0+ (usa "username", não "user")
-            body["params"] = {
-                "username": settings.ZABBIX_USER,
-                "password": settings.ZABBIX_PASSWORD,
-            }
-            print(f"[Zabbix Proxy] user.login → injetando credenciais do .env para {settings.ZABBIX_USER}")
-
-        async with httpx.AsyncClient(verify=False) as client:
-            response = await client.post(target_url, json=body, timeout=30.0)
-            return response.json()
+            if method == "user.login":
+                await zabbix_auth.token()
+            return {"jsonrpc": "2.0", "result": SERVER_MANAGED_TOKEN if method == "user.login" else True, "id": body.get("id")}
+
+        # Batch JSON-RPC (lista): token injetado em cada item; leituras avulsas passam pelo cache
+        if isinstance(body, list):
+            return await _zabbix_proxy_batch(body)
+        if not isinstance(body, dict):
+            raise HTTPException(status_code=400, detail="Payload JSON-RPC inválido")
+
+        async def upstream():
+            return await zabbix_auth.request(body)
+
+        data = await zabbix_cache.fetch(method, body.get("params"), upstream)
+        if isinstance(data, dict):
+            # Resposta pode ter vindo de outra requisição: devolve o id desta
+            data = {**data, "id": body.get("id")}
+        return data
     except HTTPException:
         raise
+    except ZabbixAPIError as e:
+        # Falha no login do backend: devolve no formato JSON-RPC que o frontend já trata
+        print(f"Zabbix Auth Error: {e}")
+        return {"jsonrpc": "2.0", "error": e.error, "id": body.get("id") if isinstance(body, dict) else None}
     except httpx.ConnectError as e:
         print(f"Zabbix Connection Error: {e}")
         raise HTTPException(status_code=502, detail=f"Failed to connect to Zabbix: {str(e)}")
@@ -127,31 +194,19 @@ async def zabbix_proxy(request: Request):
         print(f"Zabbix Timeout: {e}")
         raise HTTPException(status_code=504, detail="Zabbix connection timed out")
     except Exception as e:
-        import traceback
         print(f"Proxy Error accessing {target_url}: {repr(e)}")
         traceback.print_exc()
         raise HTTPException(status_code=500, detail=f"Proxy Error: {str(e)}")
 
-@app.post("/api/ssh-execute")
-async def ssh_execute(req: SSHCommandRequest, bg_tasks: BackgroundTasks):
-    # Use provided credentials or fallback to config if placeholder is sent
-    user = req.username
-    if not user or user == "***configurado***":
-        user = settings.SSH_USER
+def _simulated_results(commands: List[str]) -> List[dict]:
+    """Saídas fictícias usadas quando não há credenciais SSH configuradas."""
+    results = []
+    for cmd in commands:
+        output = f"[SIMULATION] Output for: {cmd}\n> Command executed successfully."
         
-    pwd = req.password
-    if not pwd or pwd == "***configurado***":
-        pwd = settings.SSH_PASSWORD
-    
-    # Simulation Mode (No credentials)
-    if not user or not pwd:
-        results = []
-        for cmd in req.commands:
-            output = f"[SIMULATION] Output for: {cmd}\n> Command executed successfully."
-            
-            # Mock Data for specific commands
-            if "running-config" in cmd or "current-configuration" in cmd:
-                output = """
+        # Mock Data for specific commands
+        if "running-config" in cmd or "current-configuration" in cmd:
+            output = """
 !
 version 15.2
 service timestamps debug datetime msec
@@ -196,8 +251,8 @@ ip default-gateway 192.168.1.1
 !
 end
 """
-            elif "show interfaces status" in cmd:
-                output = """
+        elif "show interfaces status" in cmd:
+            output = """
 Port      Name               Status       Vlan       Duplex  Speed Type
 Gi1/0/1   Link_WAN_Vivo      connected    10         a-full  a-1000 10/100/1000BaseTX
 Gi1/0/2   Link_WAN_Claro     connected    20         a-full  a-1000 10/100/1000BaseTX
@@ -206,135 +261,213 @@ Gi1/0/4   PC_Gerencia        disabled     80           auto    auto 10/100/1000B
 Gi1/0/5                      notconnect   1            auto    auto 10/100/1000BaseTX
 Gi1/0/48  Uplink_Core        connected    trunk      a-full  a-1000 10/100/1000BaseTX
 """
-            elif "show ip interface brief" in cmd:
-                output = """
+        elif "show ip interface brief" in cmd:
+            output = """
 Interface              IP-Address      OK? Method Status                Protocol
 GigabitEthernet1/0/1   unassigned      YES unset  up                    up      
 GigabitEthernet1/0/2   unassigned      YES unset  up                    up      
 Vlan1                  unassigned      YES unset  administratively down down    
 Vlan100                192.168.1.254   YES manual up                    up      
 """
-            
-            results.append({
-                "command": cmd,
-                "output": output,
-                "success": True
-            })
-            
+        
+        results.append({
+            "command": cmd,
+            "output": output,
+            "success": True
+        })
+    return results
+
+def _resolve_ssh_credentials(username: Optional[str], password: Optional[str]):
+    # Use provided credentials or fallback to config if placeholder is sent
+    user = username
+    if not user or user == "***configurado***":
+        user = settings.SSH_USER
+
+    pwd = password
+    if not pwd or pwd == "***configurado***":
+        pwd = settings.SSH_PASSWORD
+    return user, pwd
+
+@app.post("/api/ssh-execute")
+async def ssh_execute(req: SSHCommandRequest):
+    user, pwd = _resolve_ssh_credentials(req.username, req.password)
+
+    # Simulation Mode (No credentials)
+    if not user or not pwd:
+        results = _simulated_results(req.commands)
+
         # Dispatch pro-active AI analysis
-        from fastapi import BackgroundTasks
+        session = _start_ai_analysis(req.host, results, user, pwd)
+        return {"success": True, "results": results, "insight_session": session}
+
+    # Real Execution using pooled Shell sessions, em thread do pool SSH (não bloqueia o event loop)
+    print(f"Connecting to {req.host} (Shell Mode, pooled)...")
+
+    results, error = await ssh_executor.run(_run_ssh_commands, req.host, user, pwd, req.commands, req.timeout)
+    if error:
         if results:
-            bg_tasks.add_task(run_proactive_ai_analysis, req.host, results, user, pwd)
-        
-        return {"success": True, "results": results}
+            return {"success": False, "error": f"Connection lost: {str(error)}", "results": results}
+        return {"success": False, "error": f"Connection failed: {str(error)}", "results": []}
 
-    # Real Execution using Shell (Faster & More Reliable)
+    # Dispatch pro-active AI analysis
+    session = _start_ai_analysis(req.host, results, user, pwd)
+    return {"success": True, "results": results, "insight_session": session}
+
+def _run_ssh_commands(host: str, user: str, pwd: str, commands: List[str], timeout: Optional[float] = None):
+    """
+    Bloqueante: roda os comandos numa sessão do pool. Deve ser chamado via ssh_executor.
+    Retorna (results, error) preservando os resultados parciais se a conexão cair.
+    """
     results = []
-    client = paramiko.SSHClient()
-    client.set_missing_host_key_policy(paramiko.AutoAddPolicy())
-    
     try:
-        # DEBUG: Log credential source (never log the actual password)
-        user_source = "request" if (req.username and req.username != "***configurado***") else ".env"
-        pwd_source = "request" if (req.password and req.password != "***configurado***") else ".env"
-        print(f"Connecting to {req.host} (Shell Mode)...")
-        print(f"  [DEBUG] User: '{user}' (from {user_source}), Password length: {len(pwd) if pwd else 0} (from {pwd_source})")
-        client.connect(req.host, username=user, password=pwd, timeout=20, banner_timeout=20, allow_agent=False, look_for_keys=False)
-        
-        # Open Shell
-        chan = client.invoke_shell()
-        chan.settimeout(5.0)
-        
-        # Clear initial banner/motd aggressively
-        time.sleep(0.5)
-        while chan.recv_ready():
-            chan.recv(9999)
-            
-        # Disable paging - Send ONLY 'terminal length 0' as it's standard for Cisco IOS
-        chan.send("terminal length 0\n")
-        time.sleep(0.2)
+        with ssh_pool.session(host, user, pwd) as sess:
+            for i, cmd in enumerate(commands):
+                print(f"[{host}] [{i+1}/{len(commands)}] Executing: {cmd}")
+                results.append({
+                    "command": cmd,
+                    "output": _clean_command_output(cmd, sess.run(cmd, timeout)),
+                    "success": True
+                })
+        return results, None
+    except Exception as e:
+        print(f"Connection Error ({host}): {repr(e)}")
+        return results, e
 
-        # --- ADICIONADO: Desabilitar paginação para Huawei (VRP) ---
-        chan.send("screen-length 0 temporary\n")
-        time.sleep(0.2)
-            
-        # Clear output from paging commands
-        while chan.recv_ready():
-            chan.recv(9999)
+class SSHBulkRequest(BaseModel):
+    hosts: Optional[List[str]] = None          # IPs/hostnames alvo
+    store_ids: Optional[List[str]] = None      # Lojas (host group no Zabbix) → IPs das interfaces
+    host_filter: Optional[str] = None          # Substring no nome do host Zabbix (ex: "SW")
+    username: Optional[str] = None
+    password: Optional[str] = None
+    commands: List[str]
+    timeout: Optional[float] = None
+    format: str = "ndjson"                     # "ndjson" | "sse"
 
-        for i, cmd in enumerate(req.commands):
-            print(f"[{i+1}/{len(req.commands)}] Executing: {cmd}")
-            
-            # Send command
-            # Encode to latin-1 to avoid character corruption on legacy devices
-            try:
-                chan.send(cmd.encode('latin-1') + b"\n")
-            except UnicodeEncodeError:
-                # Fallback to utf-8 if latin-1 fails (unlikely for standard chars, but possible for emojis etc)
-                chan.send(cmd.encode('utf-8') + b"\n")
-            
-            # Read output
-            output_buffer = b""
-            start_time = time.time()
-            
-            # Wait for data to start coming (fast polling)
-            while not chan.recv_ready():
-                if time.time() - start_time > 3: # 3s timeout for start of output
+# Limites do fan-out: global (todas as requisições bulk) e por equipamento
+BULK_GLOBAL_SEMAPHORE = asyncio.Semaphore(settings.SSH_BULK_MAX_PARALLEL)
+BULK_TARGET_SEMAPHORES: "weakref.WeakValueDictionary[str, asyncio.Semaphore]" = weakref.WeakValueDictionary()
+
+def _bulk_target_semaphore(host: str) -> asyncio.Semaphore:
+    sem = BULK_TARGET_SEMAPHORES.get(host)
+    if sem is None:
+        sem = asyncio.Semaphore(settings.SSH_POOL_MAX_PER_HOST)
+        BULK_TARGET_SEMAPHORES[host] = sem
+    return sem
+
+async def _resolve_store_targets(store_ids: List[str], host_filter: Optional[str] = None) -> List[dict]:
+    """Resolve lojas (host groups do Zabbix) para [{host, name, store_id}] via interfaces dos hosts."""
+    needle = host_filter.lower() if host_filter else None
+    return [
+        {"host": h["ip"], "name": h["name"], "store_id": h["store_id"]}
+        for h in await zabbix_monitor.store_hosts(store_ids)
+        if not needle or needle in (h.get("name") or "").lower()
+    ]
+
+@app.post("/api/ssh-execute/bulk")
+async def ssh_execute_bulk(req: SSHBulkRequest, request: Request):
+    """
+    Executa os mesmos comandos em vários equipamentos com paralelismo limitado.
+    Os resultados são enviados por host assim que cada um termina (NDJSON ou SSE).
+    """
+    user, pwd = _resolve_ssh_credentials(req.username, req.password)
+
+    targets = [{"host": h, "name": h, "store_id": None} for h in (req.hosts or [])]
+    if req.store_ids:
+        try:
+            targets += await _resolve_store_targets(req.store_ids, req.host_filter)
+        except Exception as e:
+            raise HTTPException(status_code=502, detail=f"Falha ao resolver lojas no Zabbix: {e}")
+    # Remove alvos duplicados mantendo a ordem
+    seen = set()
+    targets = [t for t in targets if not (t["host"] in seen or seen.add(t["host"]))]
+    if not targets:
+        raise HTTPException(status_code=400, detail="Nenhum host alvo informado ou resolvido")
+
+    async def run_target(target: dict) -> dict:
+        started = time.time()
+        if not user or not pwd:
+            results, error = _simulated_results(req.commands), None
+        else:
+            async with _bulk_target_semaphore(target["host"]), BULK_GLOBAL_SEMAPHORE:
+                results, error = await ssh_executor.run(_run_ssh_commands, target["host"], user, pwd, req.commands, req.timeout)
+        return {
+            **target,
+            "success": error is None,
+            "error": str(error) if error else None,
+            "results": results,
+            "elapsed_ms": round((time.time() - started) * 1000),
+        }
+
+    def encode(event: str, payload: dict) -> str:
+        if req.format == "sse":
+            return f"event: {event}\ndata: {json.dumps(payload)}\n\n"
+        return json.dumps({"type": event, **payload}) + "\n"
+
+    async def stream():
+        tasks = [asyncio.create_task(run_target(t)) for t in targets]
+        ok = 0
+        try:
+            yield encode("start", {"total": len(targets)})
+            for fut in asyncio.as_completed(tasks):
+                result = await fut
+                ok += result["success"]
+                yield encode("result", result)
+                if await request.is_disconnected():
                     break
-                time.sleep(0.01)
-                
-            # Read until silence (heuristic - optimized)
-            last_data_time = time.time()
-            while True:
-                if chan.recv_ready():
-                    data = chan.recv(8192) # Larger buffer
-                    output_buffer += data
-                    last_data_time = time.time()
-                else:
-                    # If no data for 0.1s, assume command finished (very aggressive)
-                    if time.time() - last_data_time > 0.1:
-                        break
-                    # Global timeout per command (e.g. 5s)
-                    if time.time() - start_time > 5:
-                        break
-                    time.sleep(0.01) # Fast polling
-            
-            # Decode and clean output
-            full_output = output_buffer.decode('utf-8', errors='replace')
-            
-            # Remove the echoed command from the output
-            clean_output = full_output.replace(f"{cmd}\r\n", "").replace(f"{cmd}\n", "").strip()
-            
-            # Remove artifacts like 'rminal length 0' or similar if they appear at the start
-            if "terminal length 0" in clean_output or "rminal length 0" in clean_output:
-                lines = clean_output.splitlines()
-                clean_output = "\n".join([l for l in lines if "terminal length 0" not in l and "rminal length 0" not in l]).strip()
-
-            # Remove the trailing prompt if present (heuristic: ends with # or >)
-            lines = clean_output.splitlines()
-            if lines and (lines[-1].strip().endswith('#') or lines[-1].strip().endswith('>')):
-                clean_output = "\n".join(lines[:-1]).strip()
-            
-            results.append({
-                "command": cmd,
-                "output": clean_output,
-                "success": True
-            })
-            
-        client.close()
-        
-        # Dispatch pro-active AI analysis
-        from fastapi import BackgroundTasks
-        if results:
-            bg_tasks.add_task(run_proactive_ai_analysis, req.host, results, user, pwd)
-            
-        return {"success": True, "results": results}
-        
-    except Exception as e:
-        print(f"Connection Error: {repr(e)}")
-        if results:
-            return {"success": False, "error": f"Connection lost: {str(e)}", "results": results}
-        return {"success": False, "error": f"Connection failed: {str(e)}", "results": []}
+            yield encode("done", {"total": len(targets), "succeeded": ok, "failed": len(targets) - ok})
+        finally:
+            # Cliente desconectou ou terminou: cancela quem ainda espera vaga
+            for t in tasks:
+                t.cancel()
+
+    media_type = "text/event-stream" if req.format == "sse" else "application/x-ndjson"
+    return StreamingResponse(stream(), media_type=media_type)
+
+@app.get("/api/metrics/upstream")
+async def upstream_metrics():
+    return http_clients.stats()
+
+@app.get("/api/metrics/zabbix-cache")
+async def zabbix_cache_metrics():
+    return {**zabbix_cache.stats(), "auth": zabbix_auth.stats()}
+
+@app.get("/api/metrics/poller")
+async def poller_metrics():
+    return {**problem_poller.stats(), "state_store": state_store.stats(), "flap": flap_detector.stats()}
+
+@app.get("/api/metrics/notifications")
+async def notification_metrics():
+    return {**notification_dispatcher.stats(), "dead_letter_recent": list(notification_dispatcher.dead_letter)[-20:]}
+
+@app.get("/api/metrics/startup")
+async def startup_metrics(modules: bool = False, top: int = 25):
+    """
+    Tempo do import ao app pronto por fase. modules=true inclui o perfil -X importtime
+    (gerado num processo separado na primeira chamada).
+    """
+    data = startup_profile.stats()
+    if modules:
+        data["import_profile"] = await asyncio.to_thread(startup_profile.import_profile, max(1, top))
+    return data
+
+@app.get("/api/ssh-pool/stats")
+async def ssh_pool_stats():
+    return {**ssh_pool.stats(), "executor": ssh_executor.stats()}
+
+def _clean_command_output(cmd: str, full_output: str) -> str:
+    # Remove the echoed command from the output
+    clean_output = full_output.replace(f"{cmd}\r\n", "").replace(f"{cmd}\n", "").strip()
+
+    # Remove artifacts like 'rminal length 0' or similar if they appear at the start
+    if "terminal length 0" in clean_output or "rminal length 0" in clean_output:
+        lines = clean_output.splitlines()
+        clean_output = "\n".join([l for l in lines if "terminal length 0" not in l and "rminal length 0" not in l]).strip()
+
+    # Remove the trailing prompt if present (heuristic: ends with # or >)
+    lines = clean_output.splitlines()
+    if lines and (lines[-1].strip().endswith('#') or lines[-1].strip().endswith('>')):
+        clean_output = "\n".join(lines[:-1]).strip()
+    return clean_output
 
 class AIAnalysisRequest(BaseModel):
     host: str
@@ -346,65 +479,32 @@ class AIAnalysisRequest(BaseModel):
     config_templates: dict[str, str] | None = None
     knowledge_base: dict[str, Any] | None = None
 
-# Armazenamento em memória (cache temporal) para Insights da IA
-AI_INSIGHTS = {}
+def _start_ai_analysis(host: str, results: list, user: str, pwd: str) -> Optional[str]:
+    """
+    Enfileira a análise proativa e devolve a sessão em que o insight será publicado
+    (None se a fila de análises estiver cheia).
+    """
+    if not results or not settings.PLAI_API_KEY:
+        return None
+    return ai_analysis_queue.submit(host, results, user, pwd)
 
 def _execute_single_ssh_command(host: str, user: str, pwd: str, cmd: str) -> str:
-    import paramiko
-    import time
-    client = paramiko.SSHClient()
-    client.set_missing_host_key_policy(paramiko.AutoAddPolicy())
     try:
-        client.connect(host, username=user, password=pwd, timeout=15, banner_timeout=15, allow_agent=False, look_for_keys=False)
-        chan = client.invoke_shell()
-        chan.settimeout(10.0)
-        time.sleep(0.5)
-        while chan.recv_ready(): chan.recv(9999)
-        
-        chan.send("terminal length 0\n")
-        time.sleep(0.2)
-        chan.send("screen-length 0 temporary\n")
-        time.sleep(0.2)
-        while chan.recv_ready(): chan.recv(9999)
-        
-        chan.send(cmd + "\n")
-        output_buffer = b""
-        start_time = time.time()
-        
-        while True:
-            if chan.recv_ready():
-                chunk = chan.recv(4096)
-                if not chunk: break
-                output_buffer += chunk
-            else:
-                if time.time() - start_time > 15: break
-                if chan.exit_status_ready(): break
-                time.sleep(0.1)
-                
-        clean = output_buffer.decode('utf-8', errors='replace')
-        lines = clean.splitlines()
-        if lines and (lines[-1].strip().endswith('#') or lines[-1].strip().endswith('>')):
-            lines = lines[:-1]
-        
-        return "\n".join(lines).strip()
+        with ssh_pool.session(host, user, pwd) as sess:
+            return _clean_command_output(cmd, sess.run(cmd))
     except Exception as e:
         return f"Falha ao executar comando secundário: {e}"
-    finally:
-        client.close()
 
-async def run_proactive_ai_analysis(host: str, results: list, user: str = None, pwd: str = None):
+async def run_proactive_ai_analysis(session: str, host: str, results: list, user: str = None, pwd: str = None):
     """
-    Background worker that runs right after any SSH command finishes.
+    Runs in an ai_analysis_queue worker right after any SSH command finishes.
     Queries the PLAI API and can execute follow-up queries via <EXECUTE> tags.
+    Progress and the final insight are published to the session in ai_insights.
     """
     if not settings.PLAI_API_KEY:
         return
         
     try:
-        import httpx
-        import re
-        import asyncio
-        
         input_text = (
             f"Você é um bot autônomo de Troubleshooting de Redes analisando o host {host}.\n"
             f"Foram identificados os seguintes logs originais:\n\n"
@@ -432,86 +532,115 @@ async def run_proactive_ai_analysis(host: str, results: list, user: str = None,
                 r = "SISTEMA/REDE: " if msg['role'] == "user" else "SEU RETORNO ANTERIOR: "
                 prompt += f"{r}\n{msg['content']}\n\n"
                 
-            async with httpx.AsyncClient() as client:
-                resp = await client.post(
-                    "https://plai-api-core.cencosud.ai/api/assistant",
-                    headers={
-                        "Content-Type": "application/json",
-                        "x-api-key": settings.PLAI_API_KEY,
-                        "x-agent-id": settings.PLAI_AGENT_ID
-                    },
-                    json={"input": prompt},
-                    timeout=60.0
-                )
+            resp = await http_clients.plai_post(prompt, timeout=60.0)
+            
+            if 200 <= resp.status_code < 300:
+                data = resp.json()
+                analysis = data.get('response') or data.get('output') or data.get('text') or str(data)
                 
-                if 200 <= resp.status_code < 300:
-                    data = resp.json()
-                    analysis = data.get('response') or data.get('output') or data.get('text') or str(data)
+                match = re.search(r"<EXECUTE>(.*?)</EXECUTE>", analysis, re.IGNORECASE)
+                
+                if match and user and pwd:
+                    cmd_to_run = match.group(1).strip()
+                    # Validação de segurança simples
+                    if any(x in cmd_to_run.lower() for x in ['conf t', 'configure', 'write', 'erase', 'reload', 'clear']):
+                        messages.append({"role": "assistant", "content": analysis})
+                        messages.append({"role": "user", "content": f"Comando negado por políticas corporativas: {cmd_to_run}. Comandos perigosos bloqueados. Prossiga a análise com o que você tem."})
+                        continue
+                        
+                    print(f"[{host}] Agente IA solicitou: {cmd_to_run}")
                     
-                    match = re.search(r"<EXECUTE>(.*?)</EXECUTE>", analysis, re.IGNORECASE)
+                    # Avisar UI que estamos executando
+                    ai_insights.publish(session, "investigating",
+                                        message=f"⏳ Solicitando execução de comando extra: `{cmd_to_run}`")
                     
-                    if match and user and pwd:
-                        cmd_to_run = match.group(1).strip()
-                        # Validação de segurança simples
-                        if any(x in cmd_to_run.lower() for x in ['conf t', 'configure', 'write', 'erase', 'reload', 'clear']):
-                            messages.append({"role": "assistant", "content": analysis})
-                            messages.append({"role": "user", "content": f"Comando negado por políticas corporativas: {cmd_to_run}. Comandos perigosos bloqueados. Prossiga a análise com o que você tem."})
-                            continue
-                            
-                        print(f"[{host}] Agente IA solicitou: {cmd_to_run}")
-                        
-                        # Avisar UI que estamos executando
-                        AI_INSIGHTS[host] = {
-                            "status": "investigating",
-                            "message": f"⏳ Solicitando execução de comando extra: `{cmd_to_run}`"
-                        }
-                        
-                        loop = asyncio.get_event_loop()
-                        cmd_out = await loop.run_in_executor(None, _execute_single_ssh_command, host, user, pwd, cmd_to_run)
-                        print(f"[{host}] Resultado lido (primeiros caracteres):\n{cmd_out[:300]}...\n")
-                        
-                        # Avisar UI que recebemos resultado
-                        AI_INSIGHTS[host] = {
-                            "status": "investigating",
-                            "message": f"✅ Resultado de `{cmd_to_run}` recebido. Analisando..."
-                        }
-                        
-                        messages.append({"role": "assistant", "content": analysis})
-                        messages.append({"role": "user", "content": f"Saída adicional recebida do comando '{cmd_to_run}' executado no equipamento:\n{cmd_out}\nO que você conclui agora? Se achar necessário, você tem mais {max_iterations - iteration - 1} chance(s) de usar <EXECUTE>."})
-                    else:
-                        # Chegou na conclusão ou não tinha credenciais
-                        print(f"[{host}] Agente IA concluiu a análise!")
-                        AI_INSIGHTS[host] = {
-                            "status": "completed",
-                            "timestamp": time.time(),
-                            "insight": analysis
-                        }
-                        break
+                    cmd_out = await ssh_executor.run(_execute_single_ssh_command, host, user, pwd, cmd_to_run)
+                    print(f"[{host}] Resultado lido (primeiros caracteres):\n{cmd_out[:300]}...\n")
+                    
+                    # Avisar UI que recebemos resultado
+                    ai_insights.publish(session, "investigating",
+                                        message=f"✅ Resultado de `{cmd_to_run}` recebido. Analisando...")
+                    
+                    messages.append({"role": "assistant", "content": analysis})
+                    messages.append({"role": "user", "content": f"Saída adicional recebida do comando '{cmd_to_run}' executado no equipamento:\n{cmd_out}\nO que você conclui agora? Se achar necessário, você tem mais {max_iterations - iteration - 1} chance(s) de usar <EXECUTE>."})
                 else:
+                    # Chegou na conclusão ou não tinha credenciais
+                    print(f"[{host}] Agente IA concluiu a análise!")
+                    ai_insights.publish(session, "completed", insight=analysis)
                     break
+            else:
+                ai_insights.publish(session, "failed", message=f"PLAI respondeu HTTP {resp.status_code}")
+                break
+        else:
+            ai_insights.publish(session, "failed", message="Análise encerrada sem conclusão")
 
     except Exception as e:
         print(f"Background AI tasks failed: {e}")
+        ai_insights.publish(session, "failed", message=f"Falha na análise: {e}")
 
-@app.get("/api/ai-insights/{host}")
-async def get_ai_insights(host: str):
-    insight = AI_INSIGHTS.get(host)
-    if insight:
-        import time
-        if insight.get("status") == "investigating":
-            msg = insight.get("message")
-            if msg:
-                # Limpa a mensagem pra não mandar repetido no polling de 2s
-                insight["message"] = None 
-                return {"has_insight": False, "status": "investigating", "message": msg}
-            return {"has_insight": False, "status": "investigating"}
-            
-        elif insight.get("status") == "completed":
-            if time.time() - insight.get("timestamp", time.time()) < 600:
-                del AI_INSIGHTS[host]
-                return {"has_insight": True, "insight": insight["insight"]}
-                
-    return {"has_insight": False}
+ai_analysis_queue.runner = run_proactive_ai_analysis
+
+@app.get("/api/ai-insights/{session}")
+async def get_ai_insights(session: str):
+    """Estado atual da análise de uma sessão (para quem não usa o stream)."""
+    data = ai_insights.get(session)
+    if data is None:
+        raise HTTPException(status_code=404, detail="Sessão de insight inexistente ou expirada")
+    return data
+
+@app.delete("/api/ai-insights/{session}")
+async def cancel_ai_insights(session: str):
+    """Cancela a análise da sessão, ainda na fila ou em andamento."""
+    if not ai_analysis_queue.cancel(session):
+        raise HTTPException(status_code=404, detail="Nenhuma análise ativa para esta sessão")
+    return {"success": True}
+
+@app.get("/api/ai-insights/{session}/stream")
+async def stream_ai_insights(session: str, request: Request):
+    """
+    SSE com o andamento da análise: investigating (mensagens), e por fim completed
+    (com o insight) ou failed. Reconexões do EventSource retomam pelo Last-Event-ID.
+    """
+    try:
+        last_id = int(request.headers.get("last-event-id") or 0)
+    except ValueError:
+        last_id = 0
+    sub = ai_insights.subscribe(session, last_id)
+    if sub is None:
+        raise HTTPException(status_code=404, detail="Sessão de insight inexistente ou expirada")
+    queue, done = sub
+    if done and queue.empty():
+        # Nada a entregar: 204 faz o EventSource parar de reconectar
+        return Response(status_code=204)
+
+    async def stream():
+        try:
+            while True:
+                if done and queue.empty():
+                    return
+                try:
+                    event_id, event, payload = await asyncio.wait_for(queue.get(), timeout=15.0)
+                except asyncio.TimeoutError:
+                    if await request.is_disconnected():
+                        return
+                    yield ": keep-alive\n\n"
+                    continue
+                yield f"id: {event_id}\nevent: {event}\ndata: {json.dumps(payload)}\n\n"
+                if event != "investigating":
+                    return
+        finally:
+            ai_insights.unsubscribe(session, queue)
+
+    return StreamingResponse(stream(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+@app.get("/api/metrics/ai-insights")
+async def ai_insights_metrics():
+    return ai_insights.stats()
+
+@app.get("/api/metrics/ai-jobs")
+async def ai_jobs_metrics():
+    return ai_analysis_queue.stats()
 
 class ZabbixAckIARequest(BaseModel):
     host: str
@@ -524,8 +653,6 @@ async def zabbix_ack_ia(req: ZabbixAckIARequest):
         raise HTTPException(status_code=400, detail="PLAI_API_KEY not configured")
 
     try:
-        import httpx
-        
         system_context = (
             "Você é um engenheiro de rede resumindo um problema para o Acknowledge do Zabbix.\n"
             "Seja EXTREMAMENTE conciso (máx. 150 caracteres). Use tom técnico."
@@ -537,29 +664,19 @@ async def zabbix_ack_ia(req: ZabbixAckIARequest):
             
         final_input = f"[INSTRUCTIONS]\n{system_context}\n\n[USER QUERY]\n{user_msg}"
 
-        async with httpx.AsyncClient() as client:
-            response = await client.post(
-                "https://plai-api-core.cencosud.ai/api/assistant",
-                headers={
-                    "Content-Type": "application/json",
-                    "x-api-key": settings.PLAI_API_KEY,
-                    "x-agent-id": settings.PLAI_AGENT_ID
-                },
-                json={"input": final_input},
-                timeout=45.0
-            )
-            
-            if not (200 <= response.status_code < 300):
-                raise HTTPException(status_code=response.status_code, detail=f"PLAI API Error: {response.text}")
-                
-            data = response.json()
-            ack_msg = data.get('response') or data.get('output') or data.get('text') or str(data)
-            
-            # Limpar formatações de markdown desnecessárias
-            ack_msg = ack_msg.replace('**', '').replace('```', '').replace('\\n', ' ').strip()
-            
-            return {"success": True, "ack_message": ack_msg}
+        response = await http_clients.plai_post(final_input, timeout=45.0)
+        
+        if not (200 <= response.status_code < 300):
+            raise HTTPException(status_code=response.status_code, detail=f"PLAI API Error: {response.text}")
             
+        data = response.json()
+        ack_msg = data.get('response') or data.get('output') or data.get('text') or str(data)
+        
+        # Limpar formatações de markdown desnecessárias
+        ack_msg = ack_msg.replace('**', '').replace('```', '').replace('\\n', ' ').strip()
+        
+        return {"success": True, "ack_message": ack_msg}
+        
     except Exception as e:
         print(f"Zabbix Ack IA Error: {e}")
         raise HTTPException(status_code=500, detail=str(e))
@@ -570,8 +687,6 @@ async def ai_analyze(req: AIAnalysisRequest):
         raise HTTPException(status_code=400, detail="PLAI_API_KEY not configured")
 
     try:
-        import httpx
-        
         # Construct System Context with Persona and Data
         system_context = (
             f"Estou analisando o host: {req.host}\n"
@@ -631,38 +746,33 @@ async def ai_analyze(req: AIAnalysisRequest):
             
         final_input = f"[INSTRUCTIONS]\n{system_context}\n\n[USER QUERY]\n{user_msg}"
 
-        async with httpx.AsyncClient() as client:
-            response = await client.post(
-                "https://plai-api-core.cencosud.ai/api/assistant",
-                headers={
-                    "Content-Type": "application/json",
-                    "x-api-key": settings.PLAI_API_KEY,
-                    "x-agent-id": settings.PLAI_AGENT_ID
-                },
-                json={
-                    "input": final_input
-                },
-                timeout=60.0
-            )
-            
-            if not (200 <= response.status_code < 300):
-                raise HTTPException(status_code=response.status_code, detail=f"PLAI API Error: {response.text}")
-                
-            data = response.json()
-            analysis = data.get('response') or data.get('output') or data.get('text') or str(data)
-            
-            return {"success": True, "analysis": analysis}
+        response = await http_clients.plai_post(final_input, timeout=60.0)
+        
+        if not (200 <= response.status_code < 300):
+            raise HTTPException(status_code=response.status_code, detail=f"PLAI API Error: {response.text}")
             
+        data = response.json()
+        analysis = data.get('response') or data.get('output') or data.get('text') or str(data)
+        
+        return {"success": True, "analysis": analysis}
+        
     except Exception as e:
         print(f"AI Analysis Error: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.get("/api/stores/search")
-async def search_stores(q: str = ""):
-    lojas = carregar_lojas_excel()
-    query = q.lower()
-    results = [l for l in lojas if query in l['id'].lower() or query in l['nome'].lower()]
-    return {"stores": results}
+async def search_stores(q: str = "", circuit: str = "", operator: str = "",
+                        limit: Optional[int] = None, offset: int = 0):
+    """
+    Busca lojas por id/nome (q), circuito e operadora WAN (substring, termos combinados).
+    limit/offset paginam; total é o número de lojas encontradas.
+    """
+    if store_inventory.needs_reload():
+        # Planilha mudou (ou primeira consulta): relê fora do event loop
+        await asyncio.to_thread(store_inventory.refresh)
+    offset = max(0, offset)
+    total, stores = store_inventory.search(q, circuit, operator, limit=limit, offset=offset)
+    return {"stores": stores, "total": total, "offset": offset, "limit": limit}
 
 @app.get("/api/config")
 async def get_config():
@@ -743,28 +853,57 @@ async def save_notification_config(config: dict):
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.post("/api/notifications/test")
-async def test_notification():
+async def test_notification(channel: Optional[str] = None):
     """
-    Send a test notification
+    Send a test notification (para todos os canais ou só para ?channel=nome)
     """
-    success = notification_service.send_notification(
+    success = await notification_service.send_notification(
         "Teste de Notificação",
         "Se você está vendo isso, o Webhook está funcionando corretamente! 🚀",
-        "info"
+        "info",
+        channel=channel
     )
     if success:
         return {"success": True, "message": "Test notification sent"}
     else:
         raise HTTPException(status_code=500, detail="Failed to send notification. Check logs/URL.")
 
-from services.topology import topology_service
-from services.discovery import discovery_service
+@app.get("/api/notifications/channels")
+async def list_notification_channels():
+    """Tabela de roteamento em uso (sem as URLs completas dos webhooks)"""
+    return {"channels": [
+        {
+            "name": c.name,
+            "type": c.type,
+            "host": urlsplit(c.url).netloc,
+            "levels": sorted(c.levels) if c.levels else None,
+            "min_severity": c.min_severity,
+            "hosts": c.hosts.pattern if c.hosts else None,
+            "host_groups": sorted(c.host_groups) if c.host_groups else None,
+            "tags": [f"{t}:{v}" if v is not None else t for t, v in c.tags] if c.tags else None,
+        }
+        for c in notification_service.routing.channels
+    ]}
 
 @app.get("/api/topology")
-async def get_topology(store_id: Optional[str] = None, mode: str = "mock"):
+async def get_topology(store_id: Optional[str] = None, mode: str = "mock", refresh: bool = False):
     """
     Returns the network topology graph (nodes and edges).
+    mode=realtime: descoberta CDP/LLDP a partir dos equipamentos da loja no Zabbix
+    (resultado em cache por loja; refresh=true força nova varredura).
     """
+    if mode == "realtime":
+        if not store_id:
+            raise HTTPException(status_code=400, detail="mode=realtime requer store_id")
+        if not settings.SSH_USER or not settings.SSH_PASSWORD:
+            raise HTTPException(
+                status_code=400,
+                detail="Credenciais SSH não configuradas. Preencha SSH_USER e SSH_PASSWORD no .env."
+            )
+        try:
+            return await topology_service.get_realtime_topology(store_id, refresh=refresh)
+        except ZabbixAPIError as e:
+            raise HTTPException(status_code=502, detail=f"Zabbix: {e}")
     try:
         data = topology_service.get_topology_data(store_id, mode)
         return data
@@ -779,15 +918,11 @@ class DiscoverRequest(BaseModel):
     password: Optional[str] = None        # Sobrescreve SSH_PASSWORD do .env
     max_hops: int = 1                     # 0=só seed, 1=vizinhos diretos, 2=2 níveis
     include_types: Optional[List[str]] = None  # Filtra tipos; None = todos
+    cache_mode: str = "auto"              # auto=usa cache no TTL | refresh=reconsulta só o que mudou | full=ignora cache
 
 
-@app.post("/api/topology/discover")
-async def topology_discover(req: DiscoverRequest):
-    """
-    Realiza descoberta automática de topologia via CDP/LLDP a partir de um IP seed.
-    Classifica automaticamente dispositivos em: switch | ap | firewall | router.
-    Retorna nós e arestas prontos para renderizar no vis.js.
-    """
+def _discover_args(req: DiscoverRequest) -> dict:
+    """Valida o pedido de descoberta e monta os argumentos de discovery_service.discover."""
     user = req.username
     if not user or user == "***configurado***":
         user = settings.SSH_USER
@@ -802,22 +937,28 @@ async def topology_discover(req: DiscoverRequest):
             detail="Credenciais SSH não configuradas. Preencha SSH_USER e SSH_PASSWORD no .env."
         )
 
-    import asyncio
+    if req.cache_mode not in CACHE_MODES:
+        raise HTTPException(status_code=400, detail=f"cache_mode deve ser um de: {', '.join(CACHE_MODES)}")
 
-    include = set(req.include_types) if req.include_types else None
+    return {
+        "host": req.seed_ip,
+        "username": user,
+        "password": pwd,
+        "max_hops": max(0, min(req.max_hops, 3)),  # limita a 3 hops
+        "include_types": set(req.include_types) if req.include_types else None,
+        "cache_mode": req.cache_mode,
+    }
 
-    # Rodamos em thread separada para não bloquear o event loop do FastAPI
-    loop = asyncio.get_event_loop()
-    result = await loop.run_in_executor(
-        None,
-        lambda: discovery_service.discover(
-            host=req.seed_ip,
-            username=user,
-            password=pwd,
-            max_hops=max(0, min(req.max_hops, 3)),  # limita a 3 hops
-            include_types=include,
-        )
-    )
+
+@app.post("/api/topology/discover")
+async def topology_discover(req: DiscoverRequest):
+    """
+    Realiza descoberta automática de topologia via CDP/LLDP a partir de um IP seed.
+    Classifica automaticamente dispositivos em: switch | ap | firewall | router.
+    Retorna nós e arestas prontos para renderizar no vis.js.
+    """
+    # Coordenação da BFS fora do event loop; as consultas de cada nível rodam no pool da descoberta
+    result = await ssh_executor.run(discovery_service.discover, **_discover_args(req))
 
     if not result["success"] and not result.get("nodes"):
         raise HTTPException(status_code=502, detail=result.get("error", "Discovery failed"))
@@ -828,13 +969,84 @@ async def topology_discover(req: DiscoverRequest):
         "nodes": result.get("nodes", []),
         "edges": result.get("edges", []),
         "error": result.get("error"),  # pode ter erro parcial mas nós descobertos
+        "timings": result.get("timings", []),  # tempo por dispositivo (connect/comandos/total)
+        "elapsed_ms": result.get("elapsed_ms"),
+        "cache": result.get("cache"),            # hits/misses desta descoberta
     }
 
 
+@app.post("/api/topology/discover/stream")
+async def topology_discover_stream(req: DiscoverRequest, request: Request):
+    """
+    Mesma descoberta de /api/topology/discover, enviada por SSE conforme avança:
+    node-added / node-updated / edge-added a cada dispositivo consultado, device-scanned
+    ou device-failed com o tempo gasto, level no início de cada hop e done com o resumo.
+    Se o cliente desconecta, a descoberta é cancelada (nada novo entra no pool).
+    """
+    args = _discover_args(req)
+    loop = asyncio.get_running_loop()
+    queue: asyncio.Queue = asyncio.Queue()
+    cancel = threading.Event()
+
+    def on_event(event: str, payload: dict):
+        # Chamado na thread da descoberta
+        loop.call_soon_threadsafe(queue.put_nowait, (event, payload))
+
+    def encode(event: str, payload: dict) -> str:
+        return f"event: {event}\ndata: {json.dumps(payload)}\n\n"
+
+    async def stream():
+        task = asyncio.create_task(
+            ssh_executor.run(discovery_service.discover, **args, on_event=on_event, cancel=cancel)
+        )
+        task.add_done_callback(lambda _: queue.put_nowait(None))
+        try:
+            yield encode("start", {"seed_ip": req.seed_ip, "max_hops": args["max_hops"]})
+            while True:
+                try:
+                    item = await asyncio.wait_for(queue.get(), timeout=1.0)
+                except asyncio.TimeoutError:
+                    if await request.is_disconnected():
+                        return
+                    continue
+                if item is None:
+                    break
+                yield encode(*item)
+            result = task.result()
+            yield encode("done", {
+                "success": result["success"],
+                "cancelled": result.get("cancelled", False),
+                "error": result.get("error"),
+                "nodes": len(result.get("nodes", [])),
+                "edges": len(result.get("edges", [])),
+                "elapsed_ms": result.get("elapsed_ms"),
+                "cache": result.get("cache"),
+            })
+        finally:
+            # Cliente desconectou ou terminou: para de enfileirar novos dispositivos
+            cancel.set()
+
+    return StreamingResponse(stream(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+
+@app.get("/api/topology/discover/cache")
+async def topology_discover_cache_stats():
+    return discovery_service.cache.stats()
+
+
+@app.delete("/api/topology/discover/cache")
+async def topology_discover_cache_clear(ip: Optional[str] = None):
+    """Descarta o cache de um IP (ou de todos) para forçar nova consulta CDP/LLDP."""
+    discovery_service.cache.invalidate(ip)
+    await asyncio.to_thread(discovery_service.cache.save)
+    return {"success": True, "cleared": ip or "all"}
+
+
 # Static Files - Mount LAST to avoid conflicts
 app.mount("/", StaticFiles(directory=".", html=True), name="static")
 
 if __name__ == "__main__":
+    import uvicorn  # só quando iniciado direto; "uvicorn main:app" já o tem carregado
     print("Starting FastAPI Server on port 3020")
-    carregar_lojas_excel()
     uvicorn.run("main:app", host="0.0.0.0", port=3020, reload=True)
@@ -0,0 +1,78 @@
+"""
+Montagem do grafo da descoberta num campus sintético: GraphBuilder (índices por id)
+contra as checagens antigas com listas + any() do _discover_recursive.
+
+    python scripts/bench_discovery_graph.py [dispositivos]
+
+Campus: 2 cores, 100 distribuições e o resto de acesso, cada acesso ligado a duas
+distribuições; cada vizinhança é vista dos dois lados (CDP/LLDP dos dois switches).
+"""
+import os
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.chdir(ROOT)
+
+from services.discovery import DiscoveryService, GraphBuilder  # noqa: E402
+
+
+def campus(devices: int):
+    cores = [f"CORE{i}" for i in range(2)]
+    dist = [f"DIST{i:03d}" for i in range(100)]
+    access = [f"ACC{i:05d}" for i in range(devices - len(cores) - len(dist))]
+    # IP único por dispositivo: o GraphBuilder também deduplica por IP
+    ips = {name: f"10.{i >> 16 & 255}.{i >> 8 & 255}.{i & 255}" for i, name in enumerate(cores + dist + access, 1)}
+    observations = []    # (quem viu, vizinho)
+    for d in dist:
+        for c in cores:
+            observations += [(c, d), (d, c)]
+    for i, a in enumerate(access):
+        for d in (dist[i % len(dist)], dist[(i + 1) % len(dist)]):
+            observations += [(d, a), (a, d)]
+    return observations, ips
+
+
+def build_indexed(observations, ips):
+    svc = DiscoveryService.__new__(DiscoveryService)   # só o _add_neighbor; sem pool de threads
+    graph = GraphBuilder()
+    for seen_by, other in observations:
+        graph.add_node(seen_by, ip=ips[seen_by], type="switch")
+        svc._add_neighbor(graph, seen_by, {
+            "id": other, "ip": ips[other], "model": "cisco WS-C2960X", "capabilities": "Switch",
+            "type": "switch", "local_interface": "Gi0/1", "remote_interface": "Gi0/2"})
+    return graph.to_vis()
+
+
+def build_lists(observations):
+    # Checagens do _discover_recursive original: varredura linear a cada vizinho
+    nodes, edges = [], []
+    for seen_by, other in observations:
+        if not any(n["id"] == seen_by for n in nodes):
+            nodes.append({"id": seen_by})
+        if not any(n["id"] == other for n in nodes):
+            nodes.append({"id": other})
+        edge_id, rev_edge_id = f"{seen_by}--{other}", f"{other}--{seen_by}"
+        if not any(e["id"] in [edge_id, rev_edge_id] for e in edges):
+            edges.append({"id": edge_id})
+    return nodes, edges
+
+
+def timed(fn, *args):
+    started = time.perf_counter()
+    result = fn(*args)
+    return time.perf_counter() - started, result
+
+
+if __name__ == "__main__":
+    devices = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    observations, ips = campus(devices)
+    print(f"{devices} dispositivos, {len(observations)} observações de vizinhança")
+    for n in (2000, 5000, 10000):
+        t_old, (nodes, edges) = timed(build_lists, observations[:n])
+        t_new, _ = timed(build_indexed, observations[:n], ips)
+        print(f"  primeiras {n:>6} obs: listas/any {t_old * 1000:8.0f} ms   GraphBuilder {t_new * 1000:6.1f} ms"
+              f"   ({len(nodes)} nós, {len(edges)} links)")
+    t_new, (nodes, edges) = timed(build_indexed, observations, ips)
+    print(f"  campus inteiro: GraphBuilder {t_new * 1000:.0f} ms -> {len(nodes)} nós, {len(edges)} links")
@@ -0,0 +1,80 @@
+"""
+Busca no inventário de lojas: índices de prefixo/n-grama (services.inventory) contra a
+varredura linear antiga do /api/stores/search ("q in id or q in nome" em todas as lojas).
+
+    python scripts/bench_inventory_search.py [lojas] [repetições]
+
+Inventário sintético no formato do info_lojas.xlsx (Loja + WAN1/WAN2 operadora,
+circuito e banda); não lê a planilha nem grava snapshot.
+"""
+import os
+import random
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.chdir(ROOT)
+
+from services.inventory import StoreInventory, _Snapshot  # noqa: E402
+
+OPERATORS = ["Claro/EBT", "BRDigital", "WCS", "Vivo", "TIM", "Oi", "Algar", "Embratel"]
+PREFIXES = ["GG", "LJ", "SP", "RJ", "MG", "PR", "RS", "BA"]
+
+
+def stores(n: int):
+    rnd = random.Random(42)
+    result = []
+    for i in range(n):
+        store_id = f"{PREFIXES[i % len(PREFIXES)]}{i // len(PREFIXES):04d}"
+        store = {"id": store_id, "nome": f"Loja {store_id}"}
+        for wan in ("wan1", "wan2"):
+            store[f"operador_{wan}"] = rnd.choice(OPERATORS)
+            store[f"circuito_{wan}"] = f"{rnd.choice(['SPO/IP/', 'BRE', 'ZZ'])}{rnd.randrange(10 ** 8):08d}"
+            store[f"banda_{wan}"] = rnd.choice(["50mbps", "100mbps", "200mbps"])
+        result.append(store)
+    rnd.shuffle(result)
+    return result
+
+
+def legacy_search(lojas, q: str):
+    query = q.lower()
+    return [l for l in lojas if query in l["id"].lower() or query in l["nome"].lower()]
+
+
+def timed(fn, repeat: int) -> float:
+    started = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter() - started) / repeat
+
+
+if __name__ == "__main__":
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 12000
+    repeat = int(sys.argv[2]) if len(sys.argv) > 2 else 200
+    lojas = stores(n)
+
+    inventory = StoreInventory("bench-inexistente.xlsx")
+    started = time.perf_counter()
+    inventory._data = _Snapshot(list(lojas), None)
+    inventory._loaded = True
+    print(f"{n} lojas; índices montados em {(time.perf_counter() - started) * 1000:.0f} ms, "
+          f"{inventory.stats()['grams']} n-gramas")
+
+    sample = inventory.all()[n // 3]
+    queries = [
+        ("prefixo curto", {"q": "g"}),
+        ("prefixo do id", {"q": sample["id"][:4]}),
+        ("id completo", {"q": sample["id"]}),
+        ("substring (n-grama)", {"q": sample["id"][2:5]}),
+        ("sem resultado", {"q": "xyz9"}),
+        ("circuito", {"circuit": sample["circuito_wan1"][-6:]}),
+        ("operadora + prefixo", {"q": sample["id"][:3], "operator": "vivo"}),
+    ]
+    print(f"  {'consulta':<22} {'total':>6} {'antigo':>10} {'novo (limit=50)':>16}")
+    for label, params in queries:
+        total, _ = inventory.search(limit=50, **params)
+        t_new = timed(lambda: inventory.search(limit=50, **params), repeat)
+        old = f"{timed(lambda: legacy_search(lojas, params['q']), repeat) * 1000:7.3f} ms" if "q" in params \
+            and len(params) == 1 else "        -"
+        print(f"  {label:<22} {total:>6} {old:>10} {t_new * 1000:13.3f} ms")
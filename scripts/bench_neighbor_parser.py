@@ -0,0 +1,141 @@
+"""
+Parser de vizinhos CDP/LLDP sobre o corpus de tests/fixtures: parser de uma passada
+(services.neighbor_parser) contra o _parse_neighbors/classify_device antigos, com
+re.search por campo em cada bloco.
+
+    python scripts/bench_neighbor_parser.py [repetições]
+
+Além de cada saída capturada, mede uma saída CDP "grande" (os blocos do IOS repetidos
+até ~150 vizinhos, como num core de loja grande).
+"""
+import glob
+import os
+import re
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.chdir(ROOT)
+
+from services.neighbor_parser import DEVICE_PATTERNS, classify_device, parse_neighbors  # noqa: E402
+
+FIXTURES = os.path.join(ROOT, "tests", "fixtures")
+
+
+def legacy_parse(output: str):
+    # DiscoveryService._parse_neighbors original
+    neighbors = []
+    for block in re.split(r'[-]{5,}', output):
+        if not block.strip():
+            continue
+        device = {}
+        m = re.search(r'Device ID:\s*(.+)', block)
+        if m:
+            device["id"] = m.group(1).strip().split("(")[0].strip()
+        for pat in [r'IP(?:v4)? address:\s*(\d[\d.]+)', r'IP Address:\s*(\d[\d.]+)']:
+            m = re.search(pat, block, re.IGNORECASE)
+            if m:
+                device["ip"] = m.group(1).strip()
+                break
+        m = re.search(r'Platform:\s*(.*?),', block)
+        if m:
+            device["model"] = m.group(1).strip()
+        m = re.search(r'Capabilities:\s*(.+)', block)
+        if m:
+            device["capabilities"] = m.group(1).strip()
+        m = re.search(r'Interface:\s*([^,]+)', block)
+        if m:
+            device["local_interface"] = m.group(1).strip()
+        m = re.search(r'Port ID \(outgoing port\):\s*(.+)', block)
+        if m:
+            device["remote_interface"] = m.group(1).strip()
+        if "id" in device:
+            neighbors.append(device)
+    if not neighbors:
+        for block in re.split(r'(?=Port\s+\w+\s+has\s+\d+|Peer\s+information|System name)', output):
+            if not block.strip():
+                continue
+            device = {}
+            m = re.search(r'System name\s*:\s*(.+)', block)
+            if m:
+                device["id"] = m.group(1).strip()
+            m = re.search(r'System capability\s*:\s*(.+)', block)
+            if m:
+                device["capabilities"] = m.group(1).strip()
+            m = re.search(r'(?:Management address|IP address)\s*:\s*(\d[\d.]+)', block, re.IGNORECASE)
+            if m:
+                device["ip"] = m.group(1).strip()
+            m = re.search(r'System description\s*:\s*(.+)', block)
+            if m:
+                device["model"] = m.group(1).strip()[:50]
+            m = re.search(r'Neighbor interface\s*:\s*(.+)', block)
+            if m:
+                device["remote_interface"] = m.group(1).strip()
+            m = re.search(r'Local interface\s*:\s*(.+)', block)
+            if m:
+                device["local_interface"] = m.group(1).strip()
+            if "id" in device:
+                neighbors.append(device)
+    return neighbors
+
+
+def legacy_classify(device_id: str, platform: str, capabilities: str = "") -> str:
+    # classify_device original: upper() de cada padrão a cada chamada
+    text = f"{device_id} {platform} {capabilities}".upper()
+    caps_lower = capabilities.lower()
+    if "trans-bridge" in caps_lower or "wlan-access-point" in caps_lower or "access point" in caps_lower:
+        return "ap"
+    if "router" in caps_lower and "switch" not in caps_lower:
+        return "router"
+    if "switch" in caps_lower and "router" not in caps_lower:
+        return "switch"
+    for device_type, patterns in DEVICE_PATTERNS.items():
+        for pattern in patterns:
+            if pattern.upper() in text:
+                return device_type
+    if re.search(r'\bFG[T\-]', device_id, re.IGNORECASE):
+        return "firewall"
+    return "unknown"
+
+
+def corpus():
+    outputs = {}
+    for path in sorted(glob.glob(os.path.join(FIXTURES, "*_detail_*.txt"))):
+        with open(path, encoding="utf-8") as f:
+            outputs[os.path.basename(path)] = f.read()
+    blocks = outputs["cdp_detail_ios.txt"].split("\n\nTotal")[0]
+    outputs["cdp_detail_ios x50 (sintético)"] = blocks * 50
+    return outputs
+
+
+def per_call(fn, arg, repeat: int) -> float:
+    started = time.perf_counter()
+    for _ in range(repeat):
+        fn(arg)
+    return (time.perf_counter() - started) / repeat
+
+
+if __name__ == "__main__":
+    repeat = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    outputs = corpus()
+    print(f"parse por saída (média de {repeat} chamadas)")
+    print(f"  {'saída':<32} {'vizinhos':>8} {'antigo':>11} {'novo':>11}")
+    for name, output in outputs.items():
+        n = repeat if len(output) < 20000 else max(1, repeat // 50)
+        t_old = per_call(legacy_parse, output, n)
+        t_new = per_call(parse_neighbors, output, n)
+        print(f"  {name:<32} {len(parse_neighbors(output)):>8} {t_old * 1e6:>8.1f} µs {t_new * 1e6:>8.1f} µs"
+              f"   ({len(legacy_parse(output))} no antigo)")
+
+    # Classificação: vizinhos do corpus mais ids sem capabilities (cai no fallback por palavras-chave)
+    samples = [(n["id"], n.get("model", ""), n.get("capabilities", ""))
+               for output in outputs.values() for n in parse_neighbors(output)]
+    samples += [("LJ0421-CAM-01", "Axis Q6135", "Host"), ("FGT60F-LOJA12", "", ""), ("AR-LOJA-01", "Huawei AR651", "")]
+    for label, fn in (("antigo", legacy_classify), ("novo", classify_device)):
+        started = time.perf_counter()
+        for _ in range(repeat // 10 or 1):
+            for args in samples:
+                fn(*args)
+        elapsed = time.perf_counter() - started
+        print(f"classify_device {label:<6}: {elapsed / ((repeat // 10 or 1) * len(samples)) * 1e6:.2f} µs por vizinho")
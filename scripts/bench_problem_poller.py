@@ -0,0 +1,153 @@
+"""
+Payload e latência por ciclo do polling de problemas: leitura completa antiga
+(problem.get output=extend + selectAcknowledges), resync do poller e ciclos
+incrementais por cursor de eventid.
+
+    python scripts/bench_problem_poller.py [problemas_abertos] [ciclos]
+
+Sobe um Zabbix JSON-RPC falso em 127.0.0.1 com N problemas abertos; a cada ciclo
+surge um problema novo e outro se recupera.
+"""
+import asyncio
+import json
+import os
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.chdir(ROOT)
+
+EVENTS = []     # {"eventid", "objectid", "value", ...} em ordem de eventid
+OPEN = {}       # eventid -> evento de problema ainda aberto
+
+
+def _add(objectid: int, value: int):
+    event = {"eventid": str(len(EVENTS) + 1), "objectid": str(objectid), "value": value, "severity": "4",
+             "name": f"Interface Gi0/{objectid % 48} down", "clock": str(1700000000 + len(EVENTS))}
+    EVENTS.append(event)
+    if value == 1:
+        OPEN[event["eventid"]] = event
+    else:
+        for eid in [eid for eid, e in OPEN.items() if e["objectid"] == event["objectid"]]:
+            del OPEN[eid]
+
+
+def _hosts(objectid: str):
+    return [{"hostid": objectid, "host": f"sw-{objectid}", "name": f"LOJA{objectid}-SW01"}]
+
+
+def _extend(e: dict) -> dict:
+    # Campos que o problem.get devolve com output=extend (Zabbix 6.x)
+    return {"eventid": e["eventid"], "source": "0", "object": "0", "objectid": e["objectid"], "clock": e["clock"],
+            "ns": "0", "r_eventid": "0", "r_clock": "0", "r_ns": "0", "correlationid": "0", "userid": "0",
+            "name": e["name"], "acknowledged": "0", "severity": e["severity"], "opdata": "", "suppressed": "0",
+            "urls": [], "acknowledges": []}
+
+
+def _result(body: dict):
+    method, params = body["method"], body.get("params", {})
+    if method == "user.login":
+        return "token"
+    if method == "problem.get":
+        rows = sorted(OPEN.values(), key=lambda e: -int(e["eventid"]))
+        if params.get("output") == "extend":
+            return [_extend(e) for e in rows]
+        if "eventid_till" in params:
+            rows = [e for e in rows if int(e["eventid"]) <= int(params["eventid_till"])]
+        fields = params.get("output") or []
+        return [{k: e.get(k, "0") for k in fields} for e in rows[:params.get("limit", len(rows))]]
+    if method == "trigger.get":
+        ids = params.get("triggerids") or {e["objectid"] for e in OPEN.values()}
+        return [{"triggerid": t, "description": "", "priority": "4", "hosts": _hosts(t)} for t in ids]
+    if method == "event.get":
+        rows = EVENTS
+        if "value" in params:
+            rows = [e for e in rows if e["value"] == params["value"]]
+        if "objectids" in params:
+            wanted = set(params["objectids"])
+            rows = [e for e in rows if e["objectid"] in wanted]
+        if "eventid_from" in params:
+            rows = [e for e in rows if int(e["eventid"]) >= int(params["eventid_from"])]
+        rows = sorted(rows, key=lambda e: int(e["eventid"]), reverse=params.get("sortorder") == "DESC")
+        return [{**e, "hosts": _hosts(e["objectid"]), "tags": []} for e in rows[:params.get("limit", len(rows))]]
+    return []
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True   # cabeçalho e corpo em writes separados: sem isso o delayed ACK soma ~40 ms
+    sent = [0]
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        if isinstance(body, list):
+            resp = [{"jsonrpc": "2.0", "result": _result(b), "id": b["id"]} for b in body]
+        else:
+            resp = {"jsonrpc": "2.0", "result": _result(body), "id": body.get("id")}
+        data = json.dumps(resp).encode()
+        _Handler.sent[0] += len(data)
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, *args):
+        pass
+
+
+async def bench(open_problems: int, ticks: int):
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    os.environ.update(ZABBIX_URL=f"http://127.0.0.1:{server.server_port}/api_jsonrpc.php",
+                      ZABBIX_USER="bench", ZABBIX_PASSWORD="bench")
+    from services.http_clients import http_clients
+    from services.problem_poller import IncrementalProblemPoller
+    from services.zabbix_auth import zabbix_auth
+
+    for i in range(1, open_problems + 1):
+        _add(i, 1)
+    await http_clients.start()
+    poller = IncrementalProblemPoller(severity=4, resync_every=10 ** 6)
+    samples = {"legacy": [], "full": [], "incremental": []}
+
+    async def measure(mode, coro):
+        before = _Handler.sent[0]
+        started = time.perf_counter()
+        await coro
+        samples[mode].append((time.perf_counter() - started, _Handler.sent[0] - before))
+
+    async def legacy():
+        # Ciclo antigo: todos os problemas com output=extend, mais os hosts dos triggers
+        problems = await zabbix_auth.call("problem.get", {"output": "extend", "selectAcknowledges": "extend",
+                                                          "severity": "4", "recent": "true"})
+        await zabbix_auth.call("trigger.get", {"triggerids": [p["objectid"] for p in problems],
+                                               "selectHosts": ["hostid", "host", "name"]})
+
+    await zabbix_auth.token()
+    await measure("full", poller.poll())
+    for tick in range(ticks):
+        _add(open_problems + 1 + tick, 1)
+        _add(tick + 1, 0)
+        await measure("legacy", legacy())
+        await measure("incremental", poller.poll())
+    for _ in range(3):
+        poller.reset()
+        await measure("full", poller.poll())
+    await http_clients.close()
+    server.shutdown()
+
+    print(f"{open_problems} problemas abertos, {ticks} ciclos (1 novo + 1 recuperado por ciclo)")
+    for mode in ("legacy", "full", "incremental"):
+        lat = sorted(s[0] for s in samples[mode])
+        size = sum(s[1] for s in samples[mode]) / len(samples[mode])
+        print(f"  {mode:<12} {len(lat):>3} ciclos  payload médio {size / 1024:9.1f} KB  "
+              f"latência p50 {lat[len(lat) // 2] * 1000:7.1f} ms  máx {lat[-1] * 1000:7.1f} ms")
+
+
+if __name__ == "__main__":
+    asyncio.run(bench(int(sys.argv[1]) if len(sys.argv) > 1 else 2000,
+                      int(sys.argv[2]) if len(sys.argv) > 2 else 20))
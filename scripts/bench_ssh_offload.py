@@ -0,0 +1,148 @@
+"""
+Carga do /api/ssh-execute: N sessões SSH lentas em paralelo enquanto um endpoint
+barato é consultado em loop; mede p50/p99 desse endpoint.
+
+    python scripts/bench_ssh_offload.py [sessões] [--inline]
+
+Sobe um servidor SSH falso (paramiko) em 127.0.0.1 que devolve a saída em blocos
+com atraso. --inline roda o trabalho SSH direto no event loop (como antes do
+ssh_executor) para comparação.
+"""
+import asyncio
+import multiprocessing
+import os
+import socket
+import sys
+import threading
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.chdir(ROOT)
+
+import httpx     # noqa: E402
+import paramiko  # noqa: E402
+
+PROMPT = b"SW-BENCH#"
+OUTPUT = "\r\n".join(f"line {i} " + "x" * 60 for i in range(3000)).encode()
+CHUNK = 20000
+CHUNK_DELAY = 0.3    # segundos entre blocos: ~1 s por comando
+
+
+class _Server(paramiko.ServerInterface):
+    def check_auth_password(self, username, password):
+        return paramiko.AUTH_SUCCESSFUL
+
+    def get_allowed_auths(self, username):
+        return "password"
+
+    def check_channel_request(self, kind, chanid):
+        return paramiko.OPEN_SUCCEEDED
+
+    def check_channel_shell_request(self, channel):
+        return True
+
+    def check_channel_pty_request(self, *args):
+        return True
+
+
+def _shell(chan):
+    chan.sendall(b"Banner\r\n" + PROMPT)
+    buf = b""
+    while True:
+        try:
+            data = chan.recv(1024)
+        except Exception:
+            return
+        if not data:
+            return
+        buf += data
+        while b"\n" in buf:
+            line, buf = buf.split(b"\n", 1)
+            cmd = line.strip()
+            chan.sendall(cmd + b"\r\n")
+            if cmd.startswith(b"show"):
+                for i in range(0, len(OUTPUT), CHUNK):
+                    chan.sendall(OUTPUT[i:i + CHUNK])
+                    time.sleep(CHUNK_DELAY)
+            chan.sendall(b"\r\n" + PROMPT)
+
+
+def _serve(port_out):
+    key = paramiko.RSAKey.generate(2048)
+    sock = socket.socket()
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind(("127.0.0.1", 0))
+    sock.listen(200)
+    port_out.send(sock.getsockname()[1])
+
+    def handle(conn):
+        transport = paramiko.Transport(conn)
+        transport.add_server_key(key)
+        transport.start_server(server=_Server())
+        chan = transport.accept(20)
+        if chan is not None:
+            _shell(chan)
+
+    while True:
+        conn, _ = sock.accept()
+        threading.Thread(target=handle, args=(conn,), daemon=True).start()
+
+
+async def bench(sessions: int, inline: bool):
+    # Servidor em outro processo: o handshake/saída dele não disputa o GIL com o app medido
+    parent, child = multiprocessing.Pipe()
+    server = multiprocessing.Process(target=_serve, args=(child,), daemon=True)
+    server.start()
+    port = parent.recv()
+    # Todas as conexões do pool vão para o servidor falso
+    connect = paramiko.SSHClient.connect
+    paramiko.SSHClient.connect = lambda self, host, **kw: connect(self, "127.0.0.1", port=port, **kw)
+
+    import main
+    from services.ssh_executor import ssh_executor
+    if inline:
+        async def run_inline(fn, *args, **kwargs):
+            return fn(*args, **kwargs)
+        ssh_executor.run = run_inline
+
+    latencies = []
+    async with main.app.router.lifespan_context(main.app):
+        transport = httpx.ASGITransport(app=main.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=120) as client:
+            stop = asyncio.Event()
+
+            async def probe():
+                while not stop.is_set():
+                    started = time.perf_counter()
+                    await client.get("/api/ssh-pool/stats")
+                    latencies.append(time.perf_counter() - started)
+                    await asyncio.sleep(0.02)
+
+            async def ssh(i):
+                r = await client.post("/api/ssh-execute", json={
+                    "host": f"10.0.{i // 250}.{i % 250 + 1}", "username": "bench", "password": "bench",
+                    "commands": ["show long"]})
+                return r.json().get("success", False)
+
+            started = time.perf_counter()
+            prober = asyncio.create_task(probe())
+            results = await asyncio.gather(*[ssh(i) for i in range(sessions)])
+            total = time.perf_counter() - started
+            stop.set()
+            await prober
+
+    server.terminate()
+    latencies.sort()
+
+    def pct(p):
+        return latencies[min(len(latencies) - 1, int(len(latencies) * p))] * 1000
+
+    print(f"{'inline' if inline else 'ssh_executor'}: {sum(results)}/{sessions} sessões ok em {total:.1f}s; "
+          f"endpoint consultado {len(latencies)}x, p50 {pct(0.50):.1f} ms, p99 {pct(0.99):.1f} ms, "
+          f"máx {latencies[-1] * 1000:.1f} ms")
+
+
+if __name__ == "__main__":
+    args = [a for a in sys.argv[1:] if not a.startswith("--")]
+    asyncio.run(bench(int(args[0]) if args else 50, "--inline" in sys.argv))
@@ -0,0 +1,144 @@
+import asyncio
+import secrets
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Set, Tuple
+from config import settings
+
+# Estados finais: depois deles a sessão não recebe mais eventos
+TERMINAL_STATUSES = ("completed", "failed")
+
+
+class _Session:
+    __slots__ = ("host", "status", "insight", "created_at", "updated_at", "events", "next_id", "subscribers")
+
+    def __init__(self, host: str):
+        self.host = host
+        self.status = "pending"
+        self.insight: Optional[str] = None
+        self.created_at = self.updated_at = time.time()
+        self.events: List[Tuple[int, str, Dict[str, Any]]] = []
+        self.next_id = 1
+        self.subscribers: Set[asyncio.Queue] = set()
+
+
+class AIInsightStore:
+    """
+    Insights da análise proativa da IA, um por execução SSH (sessão), não por host:
+    dois operadores no mesmo equipamento não consomem o insight um do outro.
+    Entregues por push (SSE) a quem está inscrito; o histórico de eventos da sessão
+    permite retomar a conexão (Last-Event-ID). Sessões expiram por TTL desde a última
+    atualização e, acima de max_entries, sai a menos recente (LRU).
+    Usado só no event loop.
+    """
+
+    def __init__(self, ttl: int = 600, max_entries: int = 500, max_events: int = 50):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.max_events = max_events
+        self._sessions: "OrderedDict[str, _Session]" = OrderedDict()
+        self._stats = {"created": 0, "published": 0, "expired": 0, "evicted": 0}
+
+    def create(self, host: str) -> str:
+        self._evict()
+        session_id = secrets.token_urlsafe(12)
+        self._sessions[session_id] = _Session(host)
+        self._stats["created"] += 1
+        while len(self._sessions) > self.max_entries:
+            _, old = self._sessions.popitem(last=False)
+            self._close(old, "evicted")
+            self._stats["evicted"] += 1
+        return session_id
+
+    def publish(self, session_id: str, status: str, message: Optional[str] = None,
+                insight: Optional[str] = None):
+        """Registra um evento da sessão (status investigating/completed/failed) e empurra aos inscritos."""
+        session = self._sessions.get(session_id)
+        if session is None or session.status in TERMINAL_STATUSES:
+            return
+        session.status = status
+        session.updated_at = time.time()
+        if insight is not None:
+            session.insight = insight
+        payload = {"status": status, "host": session.host}
+        if message is not None:
+            payload["message"] = message
+        if insight is not None:
+            payload["insight"] = insight
+        event = (session.next_id, status, payload)
+        session.next_id += 1
+        session.events.append(event)
+        del session.events[:-self.max_events]
+        self._sessions.move_to_end(session_id)
+        self._stats["published"] += 1
+        for queue in session.subscribers:
+            queue.put_nowait(event)
+
+    def get(self, session_id: str) -> Optional[Dict[str, Any]]:
+        self._evict()
+        session = self._sessions.get(session_id)
+        if session is None:
+            return None
+        return {
+            "host": session.host,
+            "status": session.status,
+            "has_insight": session.insight is not None,
+            "insight": session.insight,
+            "messages": [p["message"] for _, _, p in session.events if "message" in p],
+            "updated_at": session.updated_at,
+        }
+
+    def subscribe(self, session_id: str, last_event_id: int = 0) -> Optional[Tuple[asyncio.Queue, bool]]:
+        """
+        (fila de eventos, encerrada?) ou None se a sessão não existe/expirou. A fila já
+        vem com os eventos posteriores a last_event_id; encerrada indica que não virão
+        outros além desses.
+        """
+        self._evict()
+        session = self._sessions.get(session_id)
+        if session is None:
+            return None
+        queue: asyncio.Queue = asyncio.Queue()
+        for event in session.events:
+            if event[0] > last_event_id:
+                queue.put_nowait(event)
+        done = session.status in TERMINAL_STATUSES
+        if not done:
+            session.subscribers.add(queue)
+        return queue, done
+
+    def unsubscribe(self, session_id: str, queue: asyncio.Queue):
+        session = self._sessions.get(session_id)
+        if session is not None:
+            session.subscribers.discard(queue)
+
+    def _evict(self):
+        # Ordem do OrderedDict = última atualização: as expiradas estão no começo
+        cutoff = time.time() - self.ttl
+        while self._sessions:
+            session_id, session = next(iter(self._sessions.items()))
+            if session.updated_at >= cutoff:
+                break
+            del self._sessions[session_id]
+            self._close(session, "expired")
+            self._stats["expired"] += 1
+
+    @staticmethod
+    def _close(session: _Session, reason: str):
+        # Inscritos recebem um evento final e encerram o stream
+        for queue in session.subscribers:
+            queue.put_nowait((session.next_id, reason, {"status": reason, "host": session.host}))
+        session.subscribers.clear()
+
+    def stats(self) -> dict:
+        self._evict()
+        return {
+            "sessions": len(self._sessions),
+            "max_entries": self.max_entries,
+            "ttl": self.ttl,
+            "subscribers": sum(len(s.subscribers) for s in self._sessions.values()),
+            **self._stats,
+        }
+
+
+ai_insights = AIInsightStore(ttl=settings.AI_INSIGHTS_TTL, max_entries=settings.AI_INSIGHTS_MAX_ENTRIES)
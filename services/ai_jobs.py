@@ -0,0 +1,173 @@
+import asyncio
+import time
+from collections import deque
+from typing import Awaitable, Callable, Dict, List, Optional
+from config import settings
+from .ai_insights import ai_insights
+from .metrics import percentiles
+
+
+class _Job:
+    __slots__ = ("session", "host", "results", "user", "pwd", "enqueued_at", "started_at", "task")
+
+    def __init__(self, session: str, host: str, results: list, user: Optional[str], pwd: Optional[str]):
+        self.session = session
+        self.host = host
+        self.results = results
+        self.user = user
+        self.pwd = pwd
+        self.enqueued_at = time.monotonic()
+        self.started_at: Optional[float] = None
+        self.task: Optional[asyncio.Task] = None
+
+
+class AIAnalysisQueue:
+    """
+    Fila das análises proativas da IA (cada uma faz até 3 chamadas ao PLAI e
+    sessões SSH extras). Um número fixo de workers limita o que roda em paralelo;
+    por host fica no máximo uma análise pendente, e uma nova substitui a que ainda
+    não começou. Acima de queue_max pendentes a análise é recusada (backpressure).
+    Análises pendentes ou em andamento podem ser canceladas pela sessão.
+    """
+
+    def __init__(self, workers: int = 4, queue_max: int = 100, timeout: float = 180.0):
+        self.workers = workers
+        self.queue_max = queue_max
+        self.timeout = timeout
+        # Executa a análise: (session, host, results, user, pwd). Definido pelo main.py.
+        self.runner: Optional[Callable[..., Awaitable[None]]] = None
+        self._queue: Optional[asyncio.Queue] = None
+        self._tasks: List[asyncio.Task] = []
+        self._pending: Dict[str, _Job] = {}     # host -> job ainda não iniciado
+        self._running: Dict[str, _Job] = {}     # session -> job em andamento
+        self._wait = deque(maxlen=500)
+        self._run = deque(maxlen=500)
+        self._stats = {"enqueued": 0, "superseded": 0, "rejected": 0, "cancelled": 0,
+                       "completed": 0, "failed": 0, "timeouts": 0}
+
+    @property
+    def running(self) -> bool:
+        return self._queue is not None
+
+    def start(self):
+        if self.running:
+            return
+        self._queue = asyncio.Queue()
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+        print(f"[AIJobs] Started ({self.workers} workers, até {self.queue_max} pendentes)")
+
+    async def stop(self):
+        if not self.running:
+            return
+        for job in self._pending.values():
+            ai_insights.publish(job.session, "failed", message="Análise cancelada: servidor reiniciando")
+        self._pending.clear()
+        # Cancelar o worker também cancela a análise que ele aguarda
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        self._queue = None
+
+    def submit(self, host: str, results: list, user: Optional[str], pwd: Optional[str]) -> Optional[str]:
+        """
+        Enfileira a análise e devolve a sessão do ai_insights em que ela será publicada,
+        ou None se a fila estiver cheia (ou parada).
+        """
+        if not self.running or self.runner is None:
+            self._stats["rejected"] += 1
+            return None
+        previous = self._pending.get(host)
+        if previous is None and len(self._pending) >= self.queue_max:
+            self._stats["rejected"] += 1
+            print(f"[AIJobs] Fila cheia ({self.queue_max}); análise de {host} recusada")
+            return None
+        session = ai_insights.create(host)
+        self._pending[host] = _Job(session, host, results, user, pwd)
+        self._stats["enqueued"] += 1
+        if previous is not None:
+            # O host já tem entrada na fila: o worker pega o job mais recente
+            self._stats["superseded"] += 1
+            ai_insights.publish(previous.session, "failed",
+                                message="Análise substituída por uma execução mais recente no mesmo host")
+        else:
+            self._queue.put_nowait(host)
+        return session
+
+    def cancel(self, session: str) -> bool:
+        """Cancela uma análise pendente ou em andamento. False se não há job ativo com essa sessão."""
+        for host, job in self._pending.items():
+            if job.session == session:
+                del self._pending[host]
+                self._stats["cancelled"] += 1
+                ai_insights.publish(session, "failed", message="Análise cancelada")
+                return True
+        job = self._running.get(session)
+        if job is None or job.task is None or job.task.done():
+            return False
+        job.task.cancel()
+        return True
+
+    async def _worker(self):
+        while True:
+            host = await self._queue.get()
+            job = self._pending.pop(host, None)
+            if job is None:
+                # Cancelado enquanto esperava
+                continue
+            job.started_at = time.monotonic()
+            self._wait.append(job.started_at - job.enqueued_at)
+            self._running[job.session] = job
+            job.task = asyncio.create_task(self.runner(job.session, job.host, job.results, job.user, job.pwd))
+            outcome = None
+            try:
+                await asyncio.wait_for(asyncio.shield(job.task), timeout=self.timeout)
+            except asyncio.TimeoutError:
+                job.task.cancel()
+                await asyncio.gather(job.task, return_exceptions=True)
+                outcome = "timeouts"
+                ai_insights.publish(job.session, "failed",
+                                    message=f"Análise excedeu {self.timeout:.0f}s e foi interrompida")
+            except asyncio.CancelledError:
+                if not job.task.cancelled():
+                    # O próprio worker foi cancelado (shutdown)
+                    job.task.cancel()
+                    await asyncio.gather(job.task, return_exceptions=True)
+                    ai_insights.publish(job.session, "failed", message="Análise cancelada: servidor reiniciando")
+                    raise
+                outcome = "cancelled"
+                ai_insights.publish(job.session, "failed", message="Análise cancelada")
+            except Exception as e:
+                print(f"[AIJobs] Análise de {host} falhou: {e}")
+                ai_insights.publish(job.session, "failed", message=f"Falha na análise: {e}")
+            finally:
+                self._running.pop(job.session, None)
+                self._run.append(time.monotonic() - job.started_at)
+            if outcome is None:
+                state = ai_insights.get(job.session)
+                outcome = "completed" if state and state["status"] == "completed" else "failed"
+            self._stats[outcome] += 1
+
+    def stats(self) -> dict:
+        now = time.monotonic()
+        return {
+            "running": self.running,
+            "workers": self.workers,
+            "queue_max": self.queue_max,
+            "timeout": self.timeout,
+            "pending": len(self._pending),
+            "in_progress": len(self._running),
+            **self._stats,
+            "wait_ms": percentiles(self._wait),
+            "run_ms": percentiles(self._run),
+            "jobs": [
+                {"session": j.session, "host": j.host, "state": state,
+                 "age_ms": round((now - (j.started_at if state == "running" else j.enqueued_at)) * 1000, 1)}
+                for state, jobs in (("queued", self._pending.values()), ("running", self._running.values()))
+                for j in jobs
+            ],
+        }
+
+
+ai_analysis_queue = AIAnalysisQueue(workers=settings.AI_JOB_WORKERS, queue_max=settings.AI_JOB_QUEUE_MAX,
+                                    timeout=settings.AI_JOB_TIMEOUT)
@@ -1,63 +1,17 @@
-import paramiko
-import re
+import threading
 import time
 import logging
-from typing import List, Dict, Any, Optional, Set
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from typing import Any, Callable, Dict, List, Optional, Set, Tuple
+from config import settings
+from .discovery_cache import DiscoveryCache
+from .neighbor_parser import (DEVICE_PATTERNS, classify_device, count_neighbors, detect_vendor,
+                              is_command_error, parse_neighbors, parse_version)
+from .ssh_pool import PooledSession
+from .ssh_reader import prompt_hostname
 
 logger = logging.getLogger(__name__)
 
-# ─── Classificação de dispositivos por palavras-chave ─────────────────────────
-DEVICE_PATTERNS = {
-    "firewall": [
-        "FortiGate", "Fortinet", "ASA", "Cisco ASA", "Palo Alto", "PA-", "PAN-",
-        "FGT", "FG-", "pfSense", "checkpoint"
-    ],
-    "ap": [
-        "AIR-", "Aironet", "AP-", "WAP", "UAP", "Unifi", "Aruba AP", "IAP-",
-        "C9120", "C9130", "C9115", "LAP", "WLC", "Air-",
-        "Huawei AP", "AirEngine", "AP6", "AP7",
-    ],
-    "router": [
-        "ISR", "ASR", "C8", "7500", "7200", "C1111", "C1100", "C2900",
-        "MX", "SRX", "EX-Router",
-    ],
-    "switch": [
-        "C2960", "C3750", "C3850", "C9200", "C9300", "C9400", "WS-C", "CAT",
-        "S5700", "S6700", "S3700", "S2700", "CE6800", "CloudEngine",
-        "FortiSwitch", "FSW", "FS-",
-    ],
-}
-
-
-def classify_device(device_id: str, platform: str, capabilities: str = "") -> str:
-    """
-    Determina o tipo do dispositivo com base no ID, plataforma e capabilities CDP/LLDP.
-    Retorna: 'switch' | 'ap' | 'firewall' | 'router' | 'unknown'
-    """
-    text = f"{device_id} {platform} {capabilities}".upper()
-
-    # Capabilities CDP são a forma mais confiável
-    caps_lower = capabilities.lower()
-    if "trans-bridge" in caps_lower or "wlan-access-point" in caps_lower or "access point" in caps_lower:
-        return "ap"
-    if "router" in caps_lower and "switch" not in caps_lower:
-        return "router"
-    if "switch" in caps_lower and "router" not in caps_lower:
-        return "switch"
-
-    # Fallback por palavras-chave no modelo/hostname
-    for device_type, patterns in DEVICE_PATTERNS.items():
-        for pattern in patterns:
-            if pattern.upper() in text:
-                return device_type
-
-    # FortiGate pelo hostname (FG*)
-    if re.search(r'\bFG[T\-]', device_id, re.IGNORECASE):
-        return "firewall"
-
-    return "unknown"
-
-
 def color_for_type(device_type: str) -> dict:
     """Retorna cores vis.js para cada tipo de dispositivo."""
     palette = {
@@ -70,15 +24,257 @@ def color_for_type(device_type: str) -> dict:
     return palette.get(device_type, palette["unknown"])
 
 
+class GraphBuilder:
+    """
+    Grafo da descoberta indexado por id: nós num dict e arestas não-direcionadas
+    por chave canônica (par ordenado), ambos com dedup O(1). Um dispositivo visto
+    por vários vizinhos tem os atributos mesclados (o primeiro valor não vazio
+    vence). O formato vis.js só é gerado no final, em to_vis().
+    Também indexa por IP: o mesmo equipamento anunciado com outro nome (domínio no
+    CDP, hostname do prompt, nome no Zabbix) vira o mesmo nó.
+    """
+
+    def __init__(self, track_changes: bool = False):
+        self.nodes: Dict[str, Dict[str, Any]] = {}
+        self.edges: Dict[Tuple[str, str], Dict[str, Any]] = {}
+        self._by_ip: Dict[str, str] = {}
+        # Só na descoberta em streaming: o que mudou desde o último drain_changes()
+        self._track = track_changes
+        self._new_nodes: Dict[str, None] = {}
+        self._changed_nodes: Dict[str, None] = {}
+        self._changed_edges: Dict[Tuple[str, str], None] = {}
+
+    def node_for_ip(self, ip: str) -> Optional[str]:
+        return self._by_ip.get(ip) if ip else None
+
+    def add_node(self, node_id: str, **attrs) -> Dict[str, Any]:
+        node = self.nodes.get(node_id)
+        if node is None:
+            node = self.nodes[node_id] = {"id": node_id}
+            if self._track:
+                self._new_nodes[node_id] = None
+        for key, value in attrs.items():
+            if not value:
+                continue
+            current = node.get(key)
+            # "unknown" de uma fonte é substituído pelo tipo reconhecido de outra
+            if not current or (key == "type" and current == "unknown"):
+                node[key] = value
+                if self._track:
+                    self._changed_nodes[node_id] = None
+        if node.get("ip"):
+            self._by_ip.setdefault(node["ip"], node_id)
+        return node
+
+    def set_cached(self, node_id: str, cached: bool):
+        # Fora do add_node porque False também é informação (consultado agora, não veio do cache)
+        self.nodes[node_id]["cached"] = cached
+        if self._track:
+            self._changed_nodes[node_id] = None
+
+    def add_edge(self, a: str, b: str, label: str = "", detailed: bool = True):
+        """detailed=False é a aresta pai→filho da BFS (sem label/fonte no vis.js)."""
+        if a == b:
+            return
+        key = (a, b) if a <= b else (b, a)
+        edge = self.edges.get(key)
+        if edge is None:
+            # Mantém a direção da primeira vez que a ligação foi vista
+            self.edges[key] = {"from": a, "to": b, "label": label, "detailed": detailed}
+        elif (detailed and not edge["detailed"]) or (label and not edge["label"]):
+            edge["detailed"] = edge["detailed"] or detailed
+            edge["label"] = edge["label"] or label
+        else:
+            return
+        if self._track:
+            self._changed_edges[key] = None
+
+    def drain_changes(self) -> Tuple[List[Dict], List[Dict], List[Dict]]:
+        """(nós novos, nós alterados, arestas novas/alteradas) no formato vis.js, e zera o acumulado."""
+        added = [self.vis_node(n) for n in self._new_nodes]
+        updated = [self.vis_node(n) for n in self._changed_nodes if n not in self._new_nodes]
+        edges = [self.vis_edge(self.edges[k]) for k in self._changed_edges]
+        self._new_nodes, self._changed_nodes, self._changed_edges = {}, {}, {}
+        return added, updated, edges
+
+    def vis_node(self, node_id: str) -> Dict[str, Any]:
+        n = self.nodes[node_id]
+        n_type = n.get("type") or "unknown"
+        data = {
+            "ip": n.get("ip", ""),
+            "model": n.get("model") or "Desconhecido",
+            "type": n_type,
+            "status": "UP",
+        }
+        title = f"IP: {n.get('ip') or '?'}\nModelo: {n.get('model') or '?'}\n"
+        if n.get("neighbor"):
+            # Visto via CDP/LLDP de um vizinho: inclui as interfaces da ligação
+            title += f"Interface: {n.get('local_interface') or '?'}\n"
+            data["local_interface"] = n.get("local_interface", "")
+            data["remote_interface"] = n.get("remote_interface", "")
+        if "cached" in n:
+            # Dispositivo consultado: True se o resultado veio do cache de descoberta
+            data["cached"] = n["cached"]
+        return {
+            "id": node_id,
+            "label": DiscoveryService._short_name(node_id),
+            "group": n_type,
+            "color": color_for_type(n_type),
+            "font": {"color": "#ffffff"},
+            "title": f"{title}Tipo: {n_type}",
+            "data": data,
+        }
+
+    @staticmethod
+    def vis_edge(e: Dict[str, Any]) -> Dict[str, Any]:
+        edge = {"from": e["from"], "to": e["to"], "id": f"{e['from']}--{e['to']}"}
+        if e["detailed"]:
+            edge["label"] = e["label"]
+            edge["font"] = {"size": 10, "color": "#9ca3af"}
+        return edge
+
+    def to_vis(self) -> Tuple[List[Dict], List[Dict]]:
+        return [self.vis_node(n) for n in self.nodes], [self.vis_edge(e) for e in self.edges.values()]
+
+
+class DiscoveryCancelled(Exception):
+    """A descoberta foi cancelada (ex.: cliente do streaming desconectou)."""
+
+
+class _VisitedSet:
+    """Conjunto de IPs já reservados para consulta, compartilhado pelos workers."""
+
+    def __init__(self):
+        self._seen: Set[str] = set()
+        self._lock = threading.Lock()
+
+    def claim(self, ip: str) -> bool:
+        """True só para o primeiro worker que reservar o IP."""
+        with self._lock:
+            if ip in self._seen:
+                return False
+            self._seen.add(ip)
+            return True
+
+    def __len__(self):
+        return len(self._seen)
+
+
+# Comandos de vizinhos por fabricante, na ordem de tentativa (None = não identificado)
+NEIGHBOR_COMMANDS = {
+    "cisco": ("show cdp neighbors detail", "show lldp neighbors detail"),
+    "huawei": ("display lldp neighbor detail",),
+    None: ("show cdp neighbors detail", "display lldp neighbor detail", "show lldp neighbors detail"),
+}
+NEIGHBOR_COUNT_COMMANDS = {
+    "cisco": ("show cdp neighbors", "show lldp neighbors"),
+    "huawei": ("display lldp neighbor brief",),
+    None: ("show cdp neighbors", "display lldp neighbor brief", "show lldp neighbors"),
+}
+VERSION_COMMANDS = {"cisco": "show version", "huawei": "display version"}
+
+
+class _DeviceShell:
+    """
+    Uma sessão interativa (mesmo PromptReader do console) por dispositivo, aberta
+    só quando a descoberta precisa falar com ele. O fabricante sai do prompt e da
+    primeira resposta de versão; daí em diante só vão os comandos dele.
+    Não usa o ssh_pool: uma descoberta grande passa por milhares de IPs uma única vez.
+    """
+
+    def __init__(self, host: str, username: str, password: str, timing: Dict):
+        self.host = host
+        self.username = username
+        self.password = password
+        self.timing = timing
+        self.session: Optional[PooledSession] = None
+        self.hostname: Optional[str] = None
+        self.vendor: Optional[str] = None
+        self._version: Optional[str] = None
+        self._connect_error: Optional[Exception] = None
+
+    def _open(self) -> PooledSession:
+        if self._connect_error is not None:
+            # Não repete conexão/login que já falhou (refresh → consulta completa)
+            raise self._connect_error
+        if self.session is None:
+            started = time.perf_counter()
+            try:
+                self.session = PooledSession(self.host, self.username, self.password, connect_timeout=15)
+            except Exception as e:
+                self._connect_error = e
+                raise
+            self.timing["connect_ms"] = round((time.perf_counter() - started) * 1000, 1)
+            self.hostname = prompt_hostname(self.session.prompt) or None
+            self.vendor = detect_vendor(self.session.prompt)
+        return self.session
+
+    def run(self, cmd: str, timeout: float) -> str:
+        lines = self._open().run(cmd, timeout=timeout).replace("\r", "").split("\n")
+        # Sem o eco do comando e o prompt final (a contagem pela saída resumida os veria como linhas)
+        if lines and lines[0].strip() == cmd:
+            lines = lines[1:]
+        if lines and self.hostname and prompt_hostname(lines[-1]) == self.hostname:
+            lines.pop()
+        return "\n".join(lines)
+
+    def version(self) -> str:
+        """show/display version conforme o prompt; se o comando não existir, tenta o do outro fabricante."""
+        if self._version is None:
+            self._open()
+            started = time.perf_counter()
+            guess = self.vendor or "cisco"
+            out = self.run(VERSION_COMMANDS[guess], timeout=15)
+            if is_command_error(out):
+                other = "huawei" if guess == "cisco" else "cisco"
+                retry = self.run(VERSION_COMMANDS[other], timeout=15)
+                out = "" if is_command_error(retry) else retry
+            self.vendor = detect_vendor(self.session.prompt, out)
+            self.timing["vendor"] = self.vendor
+            self.timing["commands_ms"] = round((time.perf_counter() - started) * 1000, 1)
+            self._version = out
+        return self._version
+
+    def fail(self, error: Exception, record: bool = True):
+        # Sessão com erro não é reaproveitada nem para o comando seguinte
+        if record:
+            self.timing["error"] = str(error)
+            logger.warning(f"[Discovery] SSH failed for {self.host}: {error}")
+        self.close()
+
+    def close(self):
+        if self.session is not None:
+            self.session.close()
+            self.session = None
+
+
 class DiscoveryService:
 
     INCLUDE_TYPES = {"switch", "ap", "firewall", "router"}  # Filtra somente estes
 
-    def __init__(self):
-        pass  # Cada chamada cria seu próprio client para ser thread-safe
+    def __init__(self, max_workers: int = 16, cache: Optional[DiscoveryCache] = None):
+        # Pool compartilhado entre descobertas: limita as sessões SSH simultâneas do backend
+        self.max_workers = max_workers
+        self.cache = cache or DiscoveryCache(settings.DISCOVERY_CACHE_PATH, settings.DISCOVERY_CACHE_TTL,
+                                             settings.DISCOVERY_CACHE_MAX_ENTRIES)
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._executor_lock = threading.Lock()
+
+    @property
+    def executor(self) -> ThreadPoolExecutor:
+        with self._executor_lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="discovery")
+            return self._executor
+
+    def shutdown(self):
+        with self._executor_lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=False, cancel_futures=True)
+                self._executor = None
 
     # ──────────────────────────────────────────────────────────────────────────
-    # Ponto de entrada principal: descoberta recursiva a partir de um seed IP
+    # Ponto de entrada principal: descoberta em largura (BFS) a partir de um seed IP
     # ──────────────────────────────────────────────────────────────────────────
     def discover(
         self,
@@ -87,290 +283,274 @@ class DiscoveryService:
         password: str,
         max_hops: int = 1,           # 0 = só o seed; 1 = seed + vizinhos diretos
         include_types: Optional[Set[str]] = None,
+        cache_mode: str = "auto",    # auto | refresh | full (ver _cached_probe)
+        on_event: Optional[Callable[[str, Dict[str, Any]], None]] = None,
+        cancel: Optional[threading.Event] = None,
     ) -> Dict[str, Any]:
         """
         Conecta ao dispositivo seed e descobre vizinhos via CDP/LLDP.
-        Retorna grafo de nós e arestas prontos para vis.js.
+        Cada nível (hop) é consultado em paralelo no pool; o próximo nível só
+        começa quando o atual termina. Retorna grafo de nós e arestas prontos
+        para vis.js, mais o tempo gasto em cada dispositivo e se veio do cache.
         """
-        include_types = include_types or self.INCLUDE_TYPES
-        visited_ips: Set[str] = set()
-        nodes: List[Dict] = []
-        edges: List[Dict] = []
+        return self.discover_many([(host, None)], username, password, max_hops, include_types, cache_mode,
+                                  on_event=on_event, cancel=cancel)
 
+    def discover_many(
+        self,
+        seeds: List[Tuple[str, Optional[str]]],
+        username: str,
+        password: str,
+        max_hops: int = 1,
+        include_types: Optional[Set[str]] = None,
+        cache_mode: str = "auto",
+        on_event: Optional[Callable[[str, Dict[str, Any]], None]] = None,
+        cancel: Optional[threading.Event] = None,
+    ) -> Dict[str, Any]:
+        """
+        Mesma BFS com vários seeds [(ip, nome conhecido ou None)] no nível 0 (ex.: os
+        equipamentos de uma loja). Os seeds compartilham o conjunto de visitados e o
+        grafo, então quem aparece a partir de mais de um seed é consultado uma vez só.
+
+        Streaming: com on_event, cada dispositivo é incorporado ao grafo assim que
+        termina (ordem de conclusão, não a do frontier) e gera node-added/node-updated/
+        edge-added/device-scanned/device-failed. cancel interrompe a descoberta: o que
+        ainda está na fila do pool é cancelado e nenhum nível novo começa.
+        """
+        include_types = include_types or self.INCLUDE_TYPES
+        visited = _VisitedSet()
+        graph = GraphBuilder(track_changes=on_event is not None)
+        timings: List[Dict] = []
+        started = time.perf_counter()
+
+        # (ip, parent_id, id já conhecido pelo CDP/LLDP do vizinho)
+        frontier: List[Tuple[str, Optional[str], Optional[str]]] = [
+            (ip, None, name) for ip, name in seeds if visited.claim(ip)
+        ]
         try:
-            self._discover_recursive(
-                host=host,
-                username=username,
-                password=password,
-                parent_id=None,
-                visited=visited_ips,
-                nodes=nodes,
-                edges=edges,
-                current_hop=0,
-                max_hops=max_hops,
-                include_types=include_types,
-            )
-            return {"success": True, "nodes": nodes, "edges": edges}
+            for hop in range(max_hops + 1):
+                if not frontier:
+                    break
+                if cancel is not None and cancel.is_set():
+                    raise DiscoveryCancelled()
+                if on_event:
+                    on_event("level", {"hop": hop, "devices": len(frontier)})
+                expand = hop < max_hops
+                futures = [
+                    self.executor.submit(self._probe, ip, username, password, hop, expand,
+                                         hop + 1 < max_hops, include_types, visited, cache_mode)
+                    for ip, _, _ in frontier
+                ]
+                next_frontier = []
+                if on_event is None and cancel is None:
+                    # Monta o grafo na ordem do frontier: resultado determinístico mesmo em paralelo
+                    completed = zip(frontier, futures)
+                else:
+                    completed = self._completed(dict(zip(futures, frontier)), cancel)
+                for (ip, parent_id, known_id), future in completed:
+                    probe = future.result()
+                    timings.append(probe["timing"])
+                    node_id = self._add_probe(graph, probe, ip, parent_id, known_id)
+                    for neighbor, claimed in probe["neighbors"]:
+                        n_id = self._add_neighbor(graph, node_id, neighbor)
+                        if claimed:
+                            next_frontier.append((neighbor["ip"], n_id, n_id))
+                    if on_event:
+                        self._emit_probe(on_event, graph, probe["timing"])
+                frontier = next_frontier
+            nodes, edges = graph.to_vis()
+            return {"success": True, "nodes": nodes, "edges": edges, **self._summary(timings, cache_mode, started)}
+        except DiscoveryCancelled:
+            logger.info(f"[Discovery] Cancelada após {len(timings)} dispositivo(s)")
+            nodes, edges = graph.to_vis()
+            return {"success": False, "cancelled": True, "error": "descoberta cancelada", "nodes": nodes,
+                    "edges": edges, **self._summary(timings, cache_mode, started)}
         except Exception as e:
             logger.error(f"[Discovery] Falha geral: {e}")
-            return {"success": False, "error": str(e), "nodes": nodes, "edges": edges}
+            nodes, edges = graph.to_vis()
+            return {"success": False, "error": str(e), "nodes": nodes, "edges": edges,
+                    **self._summary(timings, cache_mode, started)}
+        finally:
+            self.cache.save()
 
-    def _discover_recursive(
-        self,
-        host: str,
-        username: str,
-        password: str,
-        parent_id: Optional[str],
-        visited: Set[str],
-        nodes: List,
-        edges: List,
-        current_hop: int,
-        max_hops: int,
-        include_types: Set[str],
-    ):
-        if host in visited:
-            return
-        visited.add(host)
-
-        # ── Conectar e rodar CDP/LLDP ──────────────────────────────────────
-        output, seed_id, seed_model, seed_caps = self._run_neighbors_command(host, username, password)
-        
-        seed_type = classify_device(seed_id or host, seed_model or "", seed_caps or "")
-        
-        # Adicionar o próprio nó seed (sempre, independente de filtro)
-        node_id = seed_id or host
-        if not any(n["id"] == node_id for n in nodes):
-            color = color_for_type(seed_type)
-            nodes.append({
-                "id": node_id,
-                "label": self._short_name(node_id),
-                "group": seed_type,
-                "color": color,
-                "font": {"color": "#ffffff"},
-                "title": f"IP: {host}\nModelo: {seed_model or '?'}\nTipo: {seed_type}",
-                "data": {
-                    "ip": host,
-                    "model": seed_model or "Desconhecido",
-                    "type": seed_type,
-                    "status": "UP",
-                }
-            })
-
-        if parent_id and parent_id != node_id:
-            edges.append({"from": parent_id, "to": node_id, "id": f"{parent_id}--{node_id}"})
-
-        if not output or current_hop >= max_hops:
-            return
+    @staticmethod
+    def _completed(pending: Dict[Future, Tuple], cancel: Optional[threading.Event]):
+        """(item do frontier, future) na ordem de conclusão, conferindo o cancelamento a cada 0,5 s."""
+        waiting = set(pending)
+        while waiting:
+            done, waiting = wait(waiting, timeout=0.5, return_when=FIRST_COMPLETED)
+            if cancel is not None and cancel.is_set():
+                for f in waiting:
+                    f.cancel()
+                raise DiscoveryCancelled()
+            for f in done:
+                yield pending[f], f
 
-        # ── Parsear vizinhos ───────────────────────────────────────────────
-        neighbors = self._parse_neighbors(output)
-        logger.info(f"[Discovery] {host} → {len(neighbors)} vizinhos encontrados")
+    @staticmethod
+    def _emit_probe(on_event: Callable[[str, Dict[str, Any]], None], graph: GraphBuilder, timing: Dict):
+        added, updated, edges = graph.drain_changes()
+        for node in added:
+            on_event("node-added", node)
+        for node in updated:
+            on_event("node-updated", node)
+        for edge in edges:
+            on_event("edge-added", edge)
+        on_event("device-failed" if "error" in timing else "device-scanned", timing)
 
-        for neighbor in neighbors:
-            n_id = neighbor.get("id", "")
-            n_ip = neighbor.get("ip", "")
-            n_model = neighbor.get("model", "")
-            n_caps = neighbor.get("capabilities", "")
-            n_type = classify_device(n_id, n_model, n_caps)
+    @staticmethod
+    def _summary(timings: List[Dict], cache_mode: str, started: float) -> Dict[str, Any]:
+        hits = sum(1 for t in timings if t.get("cached"))
+        return {
+            "timings": timings,
+            "elapsed_ms": round((time.perf_counter() - started) * 1000, 1),
+            "cache": {"mode": cache_mode, "hits": hits, "misses": len(timings) - hits},
+        }
+
+    def _probe(self, host: str, username: str, password: str, hop: int, expand: bool,
+               recurse: bool, include_types: Set[str], visited: "_VisitedSet", mode: str = "auto") -> Dict[str, Any]:
+        """
+        Roda num worker: SSH + parse dos vizinhos de um dispositivo (ou o resultado
+        do cache). Os vizinhos com IP que ainda não foram visitados são reservados
+        aqui mesmo (claim) para o próximo nível.
+        """
+        timing = {"ip": host, "hop": hop}
+        started = time.perf_counter()
+        shell = _DeviceShell(host, username, password, timing)
+        try:
+            entry = self._cached_probe(shell, mode)
+            timing["cached"] = entry is not None
+            if entry is not None:
+                seed_id, seed_model, seed_caps, parsed = entry["id"], entry["model"], entry["caps"], entry["neighbors"]
+            else:
+                output, seed_id, seed_model, seed_caps = self._run_neighbors_command(shell)
+                parsed = parse_neighbors(output)
+                for neighbor in parsed:
+                    neighbor["type"] = classify_device(neighbor.get("id", ""), neighbor.get("model", ""), neighbor.get("capabilities", ""))
+                # Falha de SSH não entra no cache (senão o dispositivo "some" até o TTL vencer)
+                if "error" not in timing:
+                    self.cache.put(host, seed_id, seed_model, seed_caps, parsed)
+        finally:
+            shell.close()
 
-            # Filtrar por tipo de dispositivo desejado
-            if n_type not in include_types:
-                logger.debug(f"[Discovery] Ignorando {n_id} (tipo={n_type})")
-                continue
+        neighbors = []
+        if expand:
+            logger.info(f"[Discovery] {host} → {len(parsed)} vizinhos encontrados")
+            for neighbor in parsed:
+                # Filtrar por tipo de dispositivo desejado
+                if neighbor["type"] not in include_types:
+                    logger.debug(f"[Discovery] Ignorando {neighbor.get('id')} (tipo={neighbor['type']})")
+                    continue
+                n_ip = neighbor.get("ip", "")
+                neighbors.append((neighbor, bool(recurse and n_ip and visited.claim(n_ip))))
 
-            # Adicionar nó vizinho se ainda não existe
-            if not any(n["id"] == n_id for n in nodes):
-                color = color_for_type(n_type)
-                nodes.append({
-                    "id": n_id,
-                    "label": self._short_name(n_id),
-                    "group": n_type,
-                    "color": color,
-                    "font": {"color": "#ffffff"},
-                    "title": f"IP: {n_ip or '?'}\nModelo: {n_model or '?'}\nInterface: {neighbor.get('local_interface', '?')}\nTipo: {n_type}",
-                    "data": {
-                        "ip": n_ip,
-                        "model": n_model or "Desconhecido",
-                        "type": n_type,
-                        "status": "UP",
-                        "local_interface": neighbor.get("local_interface", ""),
-                        "remote_interface": neighbor.get("remote_interface", ""),
-                    }
-                })
-
-            edge_id = f"{node_id}--{n_id}"
-            rev_edge_id = f"{n_id}--{node_id}"
-            if not any(e["id"] in [edge_id, rev_edge_id] for e in edges):
-                label = neighbor.get("local_interface", "")
-                edges.append({
-                    "id": edge_id,
-                    "from": node_id,
-                    "to": n_id,
-                    "label": label,
-                    "font": {"size": 10, "color": "#9ca3af"},
-                })
-
-            # Recursão nos vizinhos que têm IP
-            if n_ip and n_ip not in visited and current_hop + 1 < max_hops:
-                self._discover_recursive(
-                    host=n_ip,
-                    username=username,
-                    password=password,
-                    parent_id=n_id,
-                    visited=visited,
-                    nodes=nodes,
-                    edges=edges,
-                    current_hop=current_hop + 1,
-                    max_hops=max_hops,
-                    include_types=include_types,
-                )
+        timing["neighbors"] = len(neighbors)
+        timing["total_ms"] = round((time.perf_counter() - started) * 1000, 1)
+        return {"id": seed_id, "model": seed_model, "caps": seed_caps, "cached": entry is not None,
+                "neighbors": neighbors, "timing": timing}
+
+    def _cached_probe(self, shell: "_DeviceShell", mode: str) -> Optional[Dict]:
+        """
+        auto: usa a entrada se estiver dentro do TTL.
+        refresh: além do TTL, confere a contagem de vizinhos (comando curto) e só
+                 reconsulta o detalhe se mudou -- na mesma sessão da conferência.
+        full: ignora o cache (mas grava o resultado novo).
+        """
+        if mode == "full":
+            return None
+        entry = self.cache.get(shell.host)
+        if entry is None:
+            self.cache.record("misses")
+            return None
+        if not self.cache.is_fresh(entry):
+            self.cache.record("stale")
+            self.cache.record("misses")
+            return None
+        if mode == "refresh":
+            count = self._count_neighbors(shell)
+            if count is None or count != entry["neighbor_count"]:
+                self.cache.record("changed")
+                self.cache.record("misses")
+                return None
+            self.cache.record("validated")
+        self.cache.record("hits")
+        return entry
+
+    def _add_probe(self, graph: GraphBuilder, probe: Dict, host: str,
+                   parent_id: Optional[str], known_id: Optional[str]) -> str:
+        seed_id, seed_model = probe["id"], probe["model"]
+        # Nó já no grafo com este IP (anunciado por um vizinho) > nome conhecido > hostname do prompt > IP
+        node_id = graph.node_for_ip(host) or known_id or (seed_id if seed_id and seed_id != host else host)
+        seed_type = classify_device(node_id, seed_model or "", probe["caps"] or "")
+
+        # O próprio nó entra sempre, independente de filtro
+        graph.add_node(node_id, ip=host, model=seed_model, type=seed_type)
+        graph.set_cached(node_id, probe["cached"])
+        if parent_id:
+            graph.add_edge(parent_id, node_id, detailed=False)
+        return node_id
+
+    def _add_neighbor(self, graph: GraphBuilder, node_id: str, neighbor: Dict) -> str:
+        n_id = graph.node_for_ip(neighbor.get("ip", "")) or neighbor.get("id", "")
+        graph.add_node(
+            n_id,
+            ip=neighbor.get("ip", ""),
+            model=neighbor.get("model", ""),
+            type=neighbor["type"],
+            local_interface=neighbor.get("local_interface", ""),
+            remote_interface=neighbor.get("remote_interface", ""),
+            neighbor=True,
+        )
+        graph.add_edge(node_id, n_id, label=neighbor.get("local_interface", ""))
+        return n_id
 
     # ──────────────────────────────────────────────────────────────────────────
     # SSH helpers
     # ──────────────────────────────────────────────────────────────────────────
-    def _run_neighbors_command(self, host: str, username: str, password: str):
+    def _run_neighbors_command(self, shell: "_DeviceShell"):
         """
-        Conecta via SSH e tenta: show cdp neighbors detail → show lldp neighbors detail
-        Retorna (output, seed_hostname, seed_model, seed_capabilities)
+        Numa única sessão interativa: show/display version (hostname, modelo e
+        capabilities + fabricante) e só o comando de vizinhos desse fabricante.
+        Retorna (output, seed_hostname, seed_model, seed_capabilities);
+        falhas ficam em timing["error"].
         """
-        ssh = paramiko.SSHClient()
-        ssh.set_missing_host_key_policy(paramiko.AutoAddPolicy())
         output = ""
-        seed_id = host
-        seed_model = ""
-        seed_caps = ""
-
+        seed_id, seed_model, seed_caps = shell.host, "", ""
         try:
-            ssh.connect(host, username=username, password=password,
-                        timeout=15, look_for_keys=False, allow_agent=False,
-                        banner_timeout=15)
-
-            # Tentar obter hostname do dispositivo
-            try:
-                _, stdout, _ = ssh.exec_command("show version | include cisco|Cisco|Huawei|hostname", timeout=5)
-                version_out = stdout.read().decode("utf-8", errors="replace")
-                h_match = re.search(r"hostname\s+(\S+)", version_out, re.IGNORECASE)
-                if h_match:
-                    seed_id = h_match.group(1)
-                m_match = re.search(r"(Cisco|Huawei)\s+([\w\-]+)", version_out, re.IGNORECASE)
-                if m_match:
-                    seed_model = f"{m_match.group(1)} {m_match.group(2)}"
-            except Exception:
-                pass
-
-            # CDP
-            try:
-                _, stdout, _ = ssh.exec_command("show cdp neighbors detail", timeout=15)
-                cdp_out = stdout.read().decode("utf-8", errors="replace")
-                if cdp_out and "Invalid input" not in cdp_out and len(cdp_out) > 20:
-                    output = cdp_out
-            except Exception:
-                pass
-
-            # LLDP como fallback (Huawei, FortiSwitch, etc.)
-            if not output or len(output) < 30:
-                try:
-                    _, stdout, _ = ssh.exec_command("display lldp neighbor detail", timeout=15)
-                    lldp_out = stdout.read().decode("utf-8", errors="replace")
-                    if lldp_out and len(lldp_out) > 20:
-                        output = lldp_out
-                except Exception:
-                    pass
-
-            # LLDP Cisco como último fallback
-            if not output or len(output) < 30:
-                try:
-                    _, stdout, _ = ssh.exec_command("show lldp neighbors detail", timeout=15)
-                    lldp_cisco = stdout.read().decode("utf-8", errors="replace")
-                    if lldp_cisco and len(lldp_cisco) > 20:
-                        output = lldp_cisco
-                except Exception:
-                    pass
-
+            hostname, seed_model, seed_caps = parse_version(shell.version())
+            # O prompt já traz o hostname; "hostname X" na saída só vale como reserva
+            seed_id = shell.hostname or hostname or seed_id
+            started = time.perf_counter()
+            for cmd in NEIGHBOR_COMMANDS.get(shell.vendor, NEIGHBOR_COMMANDS[None]):
+                out = shell.run(cmd, timeout=30)
+                if len(out) > 30 and not is_command_error(out):
+                    output = out
+                    break
+            shell.timing["commands_ms"] = round(shell.timing.get("commands_ms", 0) + (time.perf_counter() - started) * 1000, 1)
         except Exception as e:
-            logger.warning(f"[Discovery] SSH failed for {host}: {e}")
-        finally:
-            try:
-                ssh.close()
-            except Exception:
-                pass
-
+            shell.fail(e)
         return output, seed_id, seed_model, seed_caps
 
-    def _parse_neighbors(self, output: str) -> List[Dict[str, Any]]:
+    def _count_neighbors(self, shell: "_DeviceShell") -> Optional[int]:
         """
-        Parseia saídas de 'show cdp neighbors detail' ou 'display lldp neighbor detail'.
-        Retorna lista de dicts com id, ip, model, capabilities, local_interface, remote_interface.
+        Contagem de vizinhos pela saída resumida (bem menor que o detail).
+        None se não deu para determinar — o chamador reconsulta por completo.
         """
-        neighbors = []
-
-        # ── CDP Cisco ──────────────────────────────────────────────────────
-        # Separa por bloco (Device ID: ...)
-        cdp_blocks = re.split(r'[-]{5,}', output)
-        for block in cdp_blocks:
-            if not block.strip():
-                continue
-            device = {}
-
-            m = re.search(r'Device ID:\s*(.+)', block)
-            if m:
-                device["id"] = m.group(1).strip().split("(")[0].strip()
-
-            for pat in [r'IP(?:v4)? address:\s*(\d[\d.]+)', r'IP Address:\s*(\d[\d.]+)']:
-                m = re.search(pat, block, re.IGNORECASE)
-                if m:
-                    device["ip"] = m.group(1).strip()
-                    break
-
-            m = re.search(r'Platform:\s*(.*?),', block)
-            if m:
-                device["model"] = m.group(1).strip()
-
-            m = re.search(r'Capabilities:\s*(.+)', block)
-            if m:
-                device["capabilities"] = m.group(1).strip()
-
-            m = re.search(r'Interface:\s*([^,]+)', block)
-            if m:
-                device["local_interface"] = m.group(1).strip()
-
-            m = re.search(r'Port ID \(outgoing port\):\s*(.+)', block)
-            if m:
-                device["remote_interface"] = m.group(1).strip()
-
-            if "id" in device:
-                neighbors.append(device)
-
-        # ── LLDP Huawei (display lldp neighbor detail) ────────────────────
-        # Só processar se não encontrou nada via CDP
-        if not neighbors:
-            huawei_blocks = re.split(r'(?=Port\s+\w+\s+has\s+\d+|Peer\s+information|System name)', output)
-            for block in huawei_blocks:
-                if not block.strip():
+        started = time.perf_counter()
+        try:
+            for cmd in NEIGHBOR_COUNT_COMMANDS.get(shell.vendor, NEIGHBOR_COUNT_COMMANDS[None]):
+                out = shell.run(cmd, timeout=15)
+                if not out or is_command_error(out):
                     continue
-                device = {}
-                m = re.search(r'System name\s*:\s*(.+)', block)
-                if m:
-                    device["id"] = m.group(1).strip()
-                m = re.search(r'System capability\s*:\s*(.+)', block)
-                if m:
-                    device["capabilities"] = m.group(1).strip()
-                m = re.search(r'(?:Management address|IP address)\s*:\s*(\d[\d.]+)', block, re.IGNORECASE)
-                if m:
-                    device["ip"] = m.group(1).strip()
-                m = re.search(r'System description\s*:\s*(.+)', block)
-                if m:
-                    device["model"] = m.group(1).strip()[:50]
-                m = re.search(r'Neighbor interface\s*:\s*(.+)', block)
-                if m:
-                    device["remote_interface"] = m.group(1).strip()
-                m = re.search(r'Local interface\s*:\s*(.+)', block)
-                if m:
-                    device["local_interface"] = m.group(1).strip()
-                if "id" in device:
-                    neighbors.append(device)
-
-        return neighbors
+                count = count_neighbors(out)
+                if count is not None:
+                    return count
+            return None
+        except Exception as e:
+            # A consulta completa (mesma sessão, ou nova conexão) decide o erro final
+            shell.fail(e, record=False)
+            return None
+        finally:
+            shell.timing["check_ms"] = round((time.perf_counter() - started) * 1000, 1)
 
     @staticmethod
     def _short_name(name: str) -> str:
@@ -381,4 +561,4 @@ class DiscoveryService:
         return name[:20] if len(name) > 20 else name
 
 
-discovery_service = DiscoveryService()
+discovery_service = DiscoveryService(max_workers=settings.DISCOVERY_MAX_WORKERS)
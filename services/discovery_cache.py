@@ -0,0 +1,131 @@
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# Modos de uso do cache na descoberta
+CACHE_MODES = ("auto", "refresh", "full")
+
+
+class DiscoveryCache:
+    """
+    Resultado da consulta CDP/LLDP por IP (hostname, modelo, capabilities e vizinhos
+    já parseados), com TTL e despejo LRU. Persistido em JSON para sobreviver a restarts:
+    a tabela de vizinhos muda pouco e reconsultar tudo a cada abertura do mapa é caro.
+    """
+
+    def __init__(self, path: str, ttl: int = 3600, max_entries: int = 5000):
+        self.path = path
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._write_lock = threading.Lock()   # uma gravação do arquivo por vez, na ordem dos snapshots
+        self._loaded = False
+        self._dirty = False
+        self._stats = {"hits": 0, "misses": 0, "stale": 0, "validated": 0, "changed": 0, "evictions": 0}
+
+    def _ensure_loaded(self):
+        # Chamado com o lock: carrega o arquivo na primeira consulta
+        if self._loaded:
+            return
+        self._loaded = True
+        if not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            for entry in data.get("entries", []):
+                self._entries[entry["ip"]] = entry
+            logger.info(f"[DiscoveryCache] {len(self._entries)} dispositivos carregados de {self.path}")
+        except Exception as e:
+            logger.warning(f"[DiscoveryCache] Ignorando cache inválido em {self.path}: {e}")
+            self._entries.clear()
+
+    def get(self, ip: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            self._ensure_loaded()
+            entry = self._entries.get(ip)
+            if entry is not None:
+                self._entries.move_to_end(ip)
+            return entry
+
+    def is_fresh(self, entry: Dict[str, Any]) -> bool:
+        return time.time() - entry["fetched_at"] < self.ttl
+
+    def put(self, ip: str, device_id: str, model: str, caps: str, neighbors: List[Dict[str, Any]]):
+        entry = {
+            "ip": ip,
+            "id": device_id,
+            "model": model,
+            "caps": caps,
+            "neighbors": neighbors,
+            "neighbor_count": len(neighbors),
+            "fetched_at": time.time(),
+        }
+        with self._lock:
+            self._ensure_loaded()
+            self._entries[ip] = entry
+            self._entries.move_to_end(ip)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self._stats["evictions"] += 1
+            self._dirty = True
+
+    def record(self, outcome: str):
+        with self._lock:
+            self._stats[outcome] += 1
+
+    def invalidate(self, ip: Optional[str] = None):
+        with self._lock:
+            self._ensure_loaded()
+            if ip is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(ip, None)
+            self._dirty = True
+
+    def save(self):
+        """
+        Grava o arquivo se algo mudou (escrita atômica via arquivo temporário próprio).
+        Descobertas simultâneas salvam em paralelo: o _write_lock serializa snapshot e
+        gravação, então um snapshot mais antigo nunca substitui um mais novo.
+        """
+        with self._write_lock:
+            with self._lock:
+                if not self._dirty:
+                    return
+                data = {"saved_at": time.time(), "entries": list(self._entries.values())}
+                self._dirty = False
+            tmp = None
+            try:
+                with tempfile.NamedTemporaryFile("w", encoding="utf-8", dir=os.path.dirname(self.path) or ".",
+                                                 prefix=os.path.basename(self.path) + ".", suffix=".tmp",
+                                                 delete=False) as f:
+                    tmp = f.name
+                    json.dump(data, f)
+                os.replace(tmp, self.path)
+            except Exception as e:
+                logger.error(f"[DiscoveryCache] Erro salvando {self.path}: {e}")
+                if tmp and os.path.exists(tmp):
+                    os.remove(tmp)
+                with self._lock:
+                    self._dirty = True
+
+    def stats(self) -> dict:
+        with self._lock:
+            self._ensure_loaded()
+            total = self._stats["hits"] + self._stats["misses"]
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "ttl": self.ttl,
+                **self._stats,
+                "hit_rate": round(self._stats["hits"] / total, 3) if total else None,
+            }
@@ -0,0 +1,180 @@
+import asyncio
+import httpx
+import time
+from collections import deque
+from typing import Dict, Optional
+from urllib.parse import urlsplit
+from config import settings
+from services.metrics import percentiles
+
+try:
+    import h2  # noqa: F401  (HTTP/2 opcional: pip install httpx[http2])
+    HAS_HTTP2 = True
+except ImportError:
+    HAS_HTTP2 = False
+
+PLAI_API_URL = "https://plai-api-core.cencosud.ai/api/assistant"
+
+# Timeouts por método JSON-RPC do Zabbix (segundos); demais usam o padrão
+ZABBIX_METHOD_TIMEOUTS = {
+    "apiinfo.version": 5.0,
+    "user.login": 10.0,
+    "hostgroup.get": 15.0,
+    "host.get": 30.0,
+    "item.get": 30.0,
+    "problem.get": 30.0,
+    "event.get": 30.0,
+    "event.acknowledge": 15.0,
+    "history.get": 60.0,
+    "trend.get": 60.0,
+}
+ZABBIX_DEFAULT_TIMEOUT = 30.0
+
+
+def zabbix_timeout(method: str) -> float:
+    return ZABBIX_METHOD_TIMEOUTS.get(method, ZABBIX_DEFAULT_TIMEOUT)
+
+
+class _UpstreamStats:
+    def __init__(self, samples: int = 500):
+        self.requests = 0
+        self.errors = 0
+        self.in_flight = 0
+        self.latencies = deque(maxlen=samples)
+
+    def snapshot(self) -> dict:
+        return {
+            "requests": self.requests,
+            "errors": self.errors,
+            "in_flight": self.in_flight,
+            "latency_ms": percentiles(self.latencies),
+        }
+
+
+class _LazyTransport(httpx.AsyncBaseTransport):
+    """
+    Transporte criado só na primeira requisição, fora do event loop: o import do
+    httpcore (~150 ms) e o contexto TLS com o bundle de CAs não pesam no startup.
+    """
+
+    def __init__(self, **kwargs):
+        self._kwargs = kwargs
+        self._transport: Optional[httpx.AsyncHTTPTransport] = None
+        self._lock = asyncio.Lock()
+
+    @property
+    def _pool(self):
+        # Para HTTPClients.stats(), igual ao transporte real
+        return getattr(self._transport, "_pool", None)
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        if self._transport is None:
+            async with self._lock:
+                if self._transport is None:
+                    self._transport = await asyncio.to_thread(httpx.AsyncHTTPTransport, **self._kwargs)
+        return await self._transport.handle_async_request(request)
+
+    async def aclose(self):
+        if self._transport is not None:
+            await self._transport.aclose()
+
+
+class HTTPClients:
+    """
+    Cliente httpx único, com vida igual à da aplicação, para o Zabbix e a PLAI.
+    A origem do Zabbix é montada num transporte próprio (verify=False, certificado
+    interno); as demais origens usam o transporte padrão com verificação TLS.
+    Mantém conexões keep-alive entre requisições e registra latência por upstream.
+    """
+
+    def __init__(self):
+        self._client: Optional[httpx.AsyncClient] = None
+        self._transports: Dict[str, httpx.AsyncBaseTransport] = {}
+        self._stats: Dict[str, _UpstreamStats] = {}
+
+    def _build(self) -> httpx.AsyncClient:
+        http2 = settings.HTTP2_ENABLED and HAS_HTTP2
+        if settings.HTTP2_ENABLED and not HAS_HTTP2:
+            print("[HTTP] HTTP2_ENABLED, mas o pacote 'h2' não está instalado; usando HTTP/1.1")
+        limits = httpx.Limits(
+            max_connections=settings.HTTP_MAX_CONNECTIONS,
+            max_keepalive_connections=settings.HTTP_MAX_KEEPALIVE,
+            keepalive_expiry=settings.HTTP_KEEPALIVE_EXPIRY,
+        )
+        zabbix = urlsplit(settings.ZABBIX_URL)
+        self._transports = {
+            "zabbix": _LazyTransport(verify=False, http2=http2, limits=limits),
+            "default": _LazyTransport(http2=http2, limits=limits),
+        }
+        return httpx.AsyncClient(
+            transport=self._transports["default"],
+            mounts={f"all://{zabbix.netloc}": self._transports["zabbix"]},
+            timeout=ZABBIX_DEFAULT_TIMEOUT,
+        )
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        # Criado no lifespan; a criação preguiçosa cobre uso fora dele (scripts/testes)
+        if self._client is None or self._client.is_closed:
+            self._client = self._build()
+        return self._client
+
+    async def start(self):
+        _ = self.client
+
+    async def close(self):
+        if self._client is not None and not self._client.is_closed:
+            await self._client.aclose()
+        self._client = None
+
+    async def post(self, upstream: str, url: str, **kwargs) -> httpx.Response:
+        """POST com métricas de latência/erros agrupadas por upstream (ex: 'zabbix', 'plai')."""
+        stats = self._stats.setdefault(upstream, _UpstreamStats())
+        stats.requests += 1
+        stats.in_flight += 1
+        started = time.perf_counter()
+        try:
+            return await self.client.post(url, **kwargs)
+        except Exception:
+            stats.errors += 1
+            raise
+        finally:
+            stats.in_flight -= 1
+            stats.latencies.append(time.perf_counter() - started)
+
+    async def zabbix_post(self, body) -> httpx.Response:
+        method = body.get("method", "") if isinstance(body, dict) else ""
+        return await self.post("zabbix", settings.ZABBIX_URL, json=body, timeout=zabbix_timeout(method))
+
+    async def plai_post(self, prompt: str, timeout: float = 60.0) -> httpx.Response:
+        return await self.post(
+            "plai", PLAI_API_URL,
+            headers={
+                "Content-Type": "application/json",
+                "x-api-key": settings.PLAI_API_KEY,
+                "x-agent-id": settings.PLAI_AGENT_ID
+            },
+            json={"input": prompt},
+            timeout=timeout,
+        )
+
+    def stats(self) -> dict:
+        pools = {}
+        for name, transport in self._transports.items():
+            # Estrutura interna do httpcore; protegido caso mude entre versões
+            conns = getattr(getattr(transport, "_pool", None), "connections", []) or []
+            idle = sum(1 for c in conns if c.is_idle())
+            pools[name] = {
+                "connections": len(conns),
+                "idle": idle,
+                "active": len(conns) - idle,
+                "max_connections": settings.HTTP_MAX_CONNECTIONS,
+            }
+        return {
+            "http2": settings.HTTP2_ENABLED and HAS_HTTP2,
+            "pools": pools,
+            "upstreams": {name: s.snapshot() for name, s in self._stats.items()},
+        }
+
+
+http_clients = HTTPClients()
@@ -0,0 +1,393 @@
+import json
+import os
+import struct
+import sys
+import threading
+import time
+from array import array
+from bisect import bisect_left
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+from config import settings
+
+# Coluna da planilha -> campo da loja
+COLUMNS = {
+    "WAN1_Operadora": "operador_wan1",
+    "WAN1_Circuito": "circuito_wan1",
+    "WAN1_Banda": "banda_wan1",
+    "WAN2_Operadora": "operador_wan2",
+    "WAN2_Circuito": "circuito_wan2",
+    "WAN2_Banda": "banda_wan2",
+}
+
+# Grupos de busca: q procura em id/nome, circuit nos circuitos e operator nas operadoras
+SEARCH_FIELDS = {
+    "store": ("id", "nome"),
+    "circuit": ("circuito_wan1", "circuito_wan2"),
+    "operator": ("operador_wan1", "operador_wan2"),
+}
+
+MAX_GRAM = 3                # n-gramas de 1 a 3 caracteres
+RELOAD_CHECK_INTERVAL = 2.0  # segundos entre conferências do mtime da planilha
+
+# Snapshot binário: cabeçalho (magic, mtime_ns e tamanho da planilha de origem, nº de lojas,
+# campos, grupos e strings) + tabela de strings + colunas e listas de posições em uint32
+SNAPSHOT_MAGIC = b"LOJASNP1"
+_HEADER = struct.Struct("<8sqqIIII")
+FIELDS = ("id",) + tuple(COLUMNS.values())  # nome é derivado do id
+
+
+class _FieldIndex:
+    """
+    Índice de substring de um grupo de campos: n-grama -> posições das lojas que o
+    contêm, em ordem crescente. Consulta de até 3 caracteres é uma busca direta; acima
+    disso parte do trigrama mais raro e confirma cada candidata no texto.
+    """
+
+    def __init__(self, texts: List[str], grams: Optional[Dict[str, Sequence[int]]] = None):
+        self.texts = texts
+        if grams is not None:
+            # Vindo do snapshot: posições já calculadas (fatias uint32 do arquivo)
+            self.grams = grams
+            return
+        self.grams: Dict[str, Sequence[int]] = {}
+        for pos, text in enumerate(texts):
+            for value in text.split("\n"):
+                for n in range(1, MAX_GRAM + 1):
+                    for i in range(len(value) - n + 1):
+                        postings = self.grams.setdefault(value[i:i + n], [])
+                        # Lojas são percorridas em ordem: basta olhar a última posição
+                        if not postings or postings[-1] != pos:
+                            postings.append(pos)
+
+    def match(self, query: str) -> Sequence[int]:
+        if len(query) <= MAX_GRAM:
+            return self.grams.get(query, [])
+        rarest = None
+        for i in range(len(query) - MAX_GRAM + 1):
+            postings = self.grams.get(query[i:i + MAX_GRAM])
+            if not postings:
+                return []
+            if rarest is None or len(postings) < len(rarest):
+                rarest = postings
+        texts = self.texts
+        return [pos for pos in rarest if query in texts[pos]]
+
+
+class _Snapshot:
+    """Lojas ordenadas por id + índices; trocado inteiro a cada recarga."""
+
+    def __init__(self, stores: List[Dict[str, str]], mtime: Optional[Tuple[int, int]],
+                 grams: Optional[Dict[str, Dict[str, Sequence[int]]]] = None):
+        if grams is None:
+            stores.sort(key=lambda s: s["id"].lower())
+        self.stores = stores
+        self.mtime = mtime
+        # Prefixo do id: com as lojas ordenadas, quem começa com q é um intervalo contíguo
+        self.ids = [s["id"].lower() for s in stores]
+        self.indexes = {
+            group: _FieldIndex(["\n".join(values).lower()
+                                for values in zip(*([s[f] for s in stores] for f in fields))],
+                               grams.get(group) if grams else None)
+            for group, fields in SEARCH_FIELDS.items()
+        }
+
+    def prefix_range(self, query: str) -> Tuple[int, int]:
+        lo = bisect_left(self.ids, query)
+        return lo, bisect_left(self.ids, query + "\uffff", lo)
+
+
+def write_snapshot(path: str, data: _Snapshot):
+    """Grava lojas + índices no formato binário (escrita atômica via arquivo temporário)."""
+    strings: Dict[str, int] = {}
+
+    def sid(text: str) -> int:
+        idx = strings.get(text)
+        if idx is None:
+            idx = strings[text] = len(strings)
+        return idx
+
+    fields = array("I", [sid(f) for f in FIELDS])
+    columns = array("I")
+    for f in FIELDS:
+        columns.extend(sid(store[f]) for store in data.stores)
+    groups = []
+    for group, index in data.indexes.items():
+        grams = list(index.grams)
+        offsets, postings = array("I", [0]), array("I")
+        for gram in grams:
+            postings.extend(index.grams[gram])
+            offsets.append(len(postings))
+        groups.append((sid(group), array("I", [sid(g) for g in grams]), offsets, postings))
+
+    blob = bytearray()
+    str_offsets = array("I", [0])
+    for text in strings:
+        blob += text.encode("utf-8")
+        str_offsets.append(len(blob))
+    blob += b"\0" * (-len(blob) % 4)  # mantém os arrays seguintes alinhados em 4 bytes
+
+    mtime_ns, size = data.mtime or (0, 0)
+    tmp = f"{path}.tmp"
+    with open(tmp, "wb") as f:
+        f.write(_HEADER.pack(SNAPSHOT_MAGIC, mtime_ns, size, len(data.stores), len(FIELDS),
+                             len(groups), len(strings)))
+        for arr in (fields, str_offsets):
+            f.write(arr.tobytes())
+        f.write(blob)
+        f.write(columns.tobytes())
+        for group_sid, gram_sids, offsets, postings in groups:
+            f.write(array("I", [group_sid, len(gram_sids)]).tobytes())
+            f.write(gram_sids.tobytes())
+            f.write(offsets.tobytes())
+            f.write(postings.tobytes())
+    os.replace(tmp, path)
+
+
+def read_snapshot(path: str) -> Tuple[Tuple[int, int], _Snapshot]:
+    """
+    (mtime/tamanho da planilha de origem, snapshot). Os arrays são lidos sem cópia: as
+    listas de posições dos n-gramas são fatias uint32 do próprio buffer do arquivo.
+    """
+    with open(path, "rb") as f:
+        buf = f.read()
+    magic, mtime_ns, size, n_stores, n_fields, n_groups, n_strings = _HEADER.unpack_from(buf)
+    if magic != SNAPSHOT_MAGIC:
+        raise ValueError("formato desconhecido")
+    mv = memoryview(buf)
+    pos = _HEADER.size
+
+    def u32(count: int) -> memoryview:
+        nonlocal pos
+        view = mv[pos:pos + count * 4].cast("I")
+        if len(view) != count:
+            raise ValueError("arquivo truncado")
+        pos += count * 4
+        return view
+
+    field_sids = u32(n_fields)
+    str_offsets = u32(n_strings + 1)
+    blob = bytes(mv[pos:pos + str_offsets[-1]])
+    pos += str_offsets[-1] + (-str_offsets[-1] % 4)
+    strings = [blob[str_offsets[i]:str_offsets[i + 1]].decode("utf-8") for i in range(n_strings)]
+    if tuple(strings[i] for i in field_sids) != FIELDS:
+        raise ValueError("campos diferentes da versão atual")
+
+    columns = {f: [strings[i] for i in u32(n_stores)] for f in FIELDS}
+    stores = []
+    for i, store_id in enumerate(columns["id"]):
+        store = {"id": store_id, "nome": f"Loja {store_id}"}
+        for f in FIELDS[1:]:
+            store[f] = columns[f][i]
+        stores.append(store)
+
+    grams: Dict[str, Dict[str, Sequence[int]]] = {}
+    for _ in range(n_groups):
+        group_sid, n_grams = u32(2)
+        gram_sids = u32(n_grams)
+        offsets = u32(n_grams + 1)
+        postings = u32(offsets[-1])
+        grams[strings[group_sid]] = {
+            strings[g]: postings[offsets[k]:offsets[k + 1]] for k, g in enumerate(gram_sids)
+        }
+    if set(grams) != set(SEARCH_FIELDS):
+        raise ValueError("grupos de busca diferentes da versão atual")
+    source = (mtime_ns, size)
+    return source, _Snapshot(stores, source, grams)
+
+
+class StoreInventory:
+    """
+    Inventário de lojas (info_lojas.xlsx) em memória com busca indexada por id/nome,
+    circuito e operadora. A planilha é relida sozinha quando o mtime muda, então
+    editar o arquivo não exige restart.
+    """
+
+    def __init__(self, path: str, snapshot_path: Optional[str] = None):
+        self.path = path
+        self.snapshot_path = snapshot_path
+        self._data = _Snapshot([], None)
+        self._lock = threading.Lock()
+        self._checked_at = 0.0
+        self._loaded = False
+        self._build_ms = 0.0
+        self._loaded_from: Optional[str] = None  # "snapshot" | "excel" | "json"
+
+    def _file_mtime(self) -> Optional[Tuple[int, int]]:
+        try:
+            st = os.stat(self.path)
+        except OSError:
+            return None
+        return st.st_mtime_ns, st.st_size
+
+    def needs_reload(self) -> bool:
+        """Conferência barata (no máximo um stat a cada RELOAD_CHECK_INTERVAL)."""
+        if not self._loaded:
+            return True
+        now = time.monotonic()
+        if now - self._checked_at < RELOAD_CHECK_INTERVAL:
+            return False
+        self._checked_at = now
+        return self._file_mtime() != self._data.mtime
+
+    def refresh(self):
+        """
+        Carrega o inventário se a planilha mudou desde a última carga (ou se nunca foi
+        carregado). Na primeira carga usa o snapshot binário quando ele corresponde à
+        planilha atual; senão relê o Excel e regrava o snapshot.
+        """
+        with self._lock:
+            source = self._file_mtime()
+            if self._loaded and source == self._data.mtime:
+                return
+            first = not self._loaded
+            self._loaded = True
+            self._checked_at = time.monotonic()
+            if first and self._load_snapshot(source):
+                return
+            if source is None:
+                self._data = _Snapshot([], None)
+                return
+            self._rebuild(source)
+
+    def rebuild(self):
+        """Etapa de build: compila a planilha no snapshot mesmo que ele esteja em dia."""
+        with self._lock:
+            self._loaded = True
+            self._checked_at = time.monotonic()
+            source = self._file_mtime()
+            if source is None:
+                raise FileNotFoundError(self.path)
+            self._rebuild(source)
+
+    def _load_snapshot(self, source: Optional[Tuple[int, int]]) -> bool:
+        if not self.snapshot_path or not os.path.exists(self.snapshot_path):
+            return False
+        if sys.byteorder != "little":
+            return False  # arrays gravados em little-endian
+        started = time.perf_counter()
+        try:
+            built_from, data = read_snapshot(self.snapshot_path)
+        except Exception as e:
+            print(f"[Inventory] Ignorando snapshot inválido em {self.snapshot_path}: {e}")
+            return False
+        if source is not None and built_from != source:
+            print(f"[Inventory] Snapshot desatualizado ({self.path} mudou); relendo a planilha")
+            return False
+        # Sem a planilha (ex.: deploy só com o snapshot) o snapshot vale como está
+        data.mtime = source
+        self._data = data
+        self._build_ms = round((time.perf_counter() - started) * 1000, 1)
+        self._loaded_from = "snapshot"
+        print(f"[Inventory] {len(data.stores)} lojas carregadas de {self.snapshot_path} em {self._build_ms} ms")
+        return True
+
+    def _rebuild(self, source: Tuple[int, int]):
+        # Chamado com o lock
+        started = time.perf_counter()
+        try:
+            stores = self._read_stores()
+        except Exception as e:
+            # Mantém a versão anterior; tenta de novo quando o arquivo mudar outra vez
+            print(f"[Inventory] Erro lendo {self.path}: {e}")
+            self._data.mtime = source
+            return
+        self._data = _Snapshot(stores, source)
+        self._build_ms = round((time.perf_counter() - started) * 1000, 1)
+        self._loaded_from = "json" if self.path.lower().endswith(".json") else "excel"
+        print(f"[Inventory] {len(stores)} lojas carregadas de {self.path} em {self._build_ms} ms")
+        if self.snapshot_path and sys.byteorder == "little":
+            try:
+                write_snapshot(self.snapshot_path, self._data)
+            except Exception as e:
+                print(f"[Inventory] Erro gravando snapshot {self.snapshot_path}: {e}")
+
+    def _read_stores(self) -> List[Dict[str, str]]:
+        if self.path.lower().endswith(".json"):
+            return self._read_json()
+        # pandas/openpyxl só entram no caminho de rebuild (centenas de ms só de import)
+        import pandas as pd
+        df = pd.read_excel(self.path, dtype=str).fillna("")
+        ids = df["Loja"].astype(str).str.strip() if "Loja" in df else []
+        columns = {field: (df[col].astype(str).tolist() if col in df else [""] * len(df))
+                   for col, field in COLUMNS.items()}
+        stores = []
+        for i, store_id in enumerate(ids):
+            if not store_id:
+                continue
+            store = {"id": store_id, "nome": f"Loja {store_id}"}
+            for field, values in columns.items():
+                store[field] = values[i]
+            stores.append(store)
+        return stores
+
+    def _read_json(self) -> List[Dict[str, str]]:
+        # lojas_data.json: a planilha exportada como lista de registros (mesmas colunas, null se vazio)
+        with open(self.path, encoding="utf-8") as f:
+            rows = json.load(f)
+        stores = []
+        for row in rows:
+            store_id = str(row.get("Loja") or "").strip()
+            if not store_id:
+                continue
+            store = {"id": store_id, "nome": f"Loja {store_id}"}
+            for col, field in COLUMNS.items():
+                value = row.get(col)
+                store[field] = "" if value is None else str(value)
+            stores.append(store)
+        return stores
+
+    def all(self) -> List[Dict[str, str]]:
+        return self._data.stores
+
+    def search(self, q: str = "", circuit: str = "", operator: str = "",
+               limit: Optional[int] = None, offset: int = 0) -> Tuple[int, List[Dict[str, str]]]:
+        """
+        (total, página) das lojas que contêm cada termo informado (substring, sem
+        diferenciar maiúsculas). Ordem por id, com as lojas cujo id começa com q primeiro.
+        """
+        data = self._data
+        criteria = [(group, term.strip().lower()) for group, term in
+                    (("store", q), ("circuit", circuit), ("operator", operator)) if term and term.strip()]
+
+        if not criteria:
+            matches: Any = range(len(data.stores))
+        else:
+            lists = sorted((data.indexes[group].match(term) for group, term in criteria), key=len)
+            matches = lists[0]
+            for other in lists[1:]:
+                if not matches:
+                    break
+                keep = set(other)
+                matches = [pos for pos in matches if pos in keep]
+            query = q.strip().lower()
+            if query and matches:
+                lo, hi = data.prefix_range(query)
+                if lo < hi:
+                    matches = ([pos for pos in matches if lo <= pos < hi]
+                               + [pos for pos in matches if not lo <= pos < hi])
+
+        end = None if limit is None else offset + max(0, limit)
+        return len(matches), [data.stores[pos] for pos in matches[offset:end]]
+
+    def stats(self) -> dict:
+        data = self._data
+        return {
+            "path": self.path,
+            "snapshot_path": self.snapshot_path,
+            "loaded_from": self._loaded_from,
+            "stores": len(data.stores),
+            "grams": sum(len(idx.grams) for idx in data.indexes.values()),
+            "build_ms": self._build_ms,
+            "mtime": data.mtime[0] / 1e9 if data.mtime else None,
+        }
+
+
+store_inventory = StoreInventory(settings.STORE_INVENTORY_PATH, settings.STORE_INVENTORY_SNAPSHOT)
+
+
+if __name__ == "__main__":
+    # Build do snapshot: python -m services.inventory [info_lojas.xlsx | lojas_data.json]
+    # (sem argumento usa STORE_INVENTORY_PATH; o servidor só aproveita o snapshot da mesma fonte)
+    inventory = StoreInventory(sys.argv[1], settings.STORE_INVENTORY_SNAPSHOT) if len(sys.argv) > 1 else store_inventory
+    inventory.rebuild()
+    print(inventory.stats())
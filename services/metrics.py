@@ -0,0 +1,11 @@
+from typing import Dict, Iterable, Optional
+
+
+def percentiles(samples: Iterable[float]) -> Dict[str, Optional[float]]:
+    """p50/p95/p99 em ms de amostras em segundos (nearest-rank); None sem amostras."""
+    ordered = sorted(samples)
+
+    def pct(p):
+        return round(ordered[min(len(ordered) - 1, int(len(ordered) * p))] * 1000, 1) if ordered else None
+
+    return {"p50": pct(0.50), "p95": pct(0.95), "p99": pct(0.99)}
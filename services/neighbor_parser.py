@@ -0,0 +1,363 @@
+import re
+from typing import Any, Dict, List, Optional, Tuple
+
+# ─── Classificação de dispositivos por palavras-chave ─────────────────────────
+DEVICE_PATTERNS = {
+    "firewall": [
+        "FortiGate", "Fortinet", "ASA", "Cisco ASA", "Palo Alto", "PA-", "PAN-",
+        "FGT", "FG-", "pfSense", "checkpoint"
+    ],
+    "ap": [
+        "AIR-", "Aironet", "AP-", "WAP", "UAP", "Unifi", "Aruba AP", "IAP-",
+        "C9120", "C9130", "C9115", "LAP", "WLC", "Air-",
+        "Huawei AP", "AirEngine", "AP6", "AP7",
+    ],
+    "router": [
+        "ISR", "ASR", "C8", "7500", "7200", "C1111", "C1100", "C2900",
+        "MX", "SRX", "EX-Router",
+    ],
+    "switch": [
+        "C2960", "C3750", "C3850", "C9200", "C9300", "C9400", "WS-C", "CAT",
+        "S5700", "S6700", "S3700", "S2700", "CE6800", "CloudEngine", "N9K", "Nexus",
+        "FortiSwitch", "FSW", "FS-",
+    ],
+}
+
+# Matcher pré-montado: (PADRÃO, tipo) já em maiúsculas e na ordem de prioridade,
+# então cada chamada só faz um upper() do texto e buscas de substring em C.
+# (Uma alternação única em regex mediu mais lenta que isso no CPython para ~50 literais curtos.)
+_KEYWORDS: Tuple[Tuple[str, str], ...] = tuple(
+    (pattern.upper(), device_type)
+    for device_type, patterns in DEVICE_PATTERNS.items()
+    for pattern in patterns
+)
+_FORTIGATE_ID = re.compile(r'\bFG[T\-]', re.IGNORECASE)
+# LLDP anuncia switch como "Bridge"; Trans-Bridge/Source-Route-Bridge são do CDP
+_LLDP_BRIDGE = re.compile(r'(?<![\w-])bridge')
+
+
+def classify_device(device_id: str, platform: str, capabilities: str = "") -> str:
+    """
+    Determina o tipo do dispositivo com base no ID, plataforma e capabilities CDP/LLDP.
+    Retorna: 'switch' | 'ap' | 'firewall' | 'router' | 'unknown'
+    """
+    # Capabilities CDP são a forma mais confiável
+    caps_lower = capabilities.lower()
+    if "trans-bridge" in caps_lower or "wlan-access-point" in caps_lower or "access point" in caps_lower:
+        return "ap"
+    is_switch = "switch" in caps_lower or bool(_LLDP_BRIDGE.search(caps_lower))
+    if "router" in caps_lower and not is_switch:
+        return "router"
+    if is_switch and "router" not in caps_lower:
+        return "switch"
+
+    # Fallback por palavras-chave no modelo/hostname
+    text = f"{device_id} {platform} {capabilities}".upper()
+    for pattern, device_type in _KEYWORDS:
+        if pattern in text:
+            return device_type
+
+    # FortiGate pelo hostname (FG*)
+    if _FORTIGATE_ID.search(device_id):
+        return "firewall"
+
+    return "unknown"
+
+
+# ─── CDP (show cdp neighbors detail) ──────────────────────────────────────────
+# Uma passada pelas linhas: a chave antes do ":" é procurada num dict, sem regex por
+# campo. Platform/Interface trazem um segundo campo na mesma linha depois da vírgula.
+# Dentro do bloco vale a primeira ocorrência de cada campo.
+_CDP_FIELDS = {
+    "device id": "id",
+    "ip address": "ip",
+    "ipv4 address": "ip",
+    "platform": "model",
+    "capabilities": "capabilities",
+    "interface": "local_interface",
+    "port id (outgoing port)": "remote_interface",
+}
+_CDP_SAME_LINE = {
+    "model": ("Capabilities:", "capabilities"),
+    "local_interface": ("Port ID (outgoing port):", "remote_interface"),
+}
+_IP_VALUE = re.compile(r"\d[\d.]+")
+
+
+def _parse_cdp(output: str) -> List[Dict[str, Any]]:
+    neighbors = []
+    device: Dict[str, Any] = {}
+    for line in output.splitlines():
+        key, sep, value = line.partition(":")
+        if not sep:
+            if line.startswith("-----"):
+                if "id" in device:
+                    neighbors.append(device)
+                device = {}
+            continue
+        field = _CDP_FIELDS.get(key.strip().lower())
+        if field is None or field in device:
+            continue
+        value = value.strip()
+        if field == "id":
+            device["id"] = value.split("(")[0].strip()
+        elif field == "ip":
+            ip = _IP_VALUE.match(value)
+            if ip:
+                device["ip"] = ip.group(0)
+        elif field in _CDP_SAME_LINE:
+            first, comma, rest = value.partition(",")
+            if field == "model" and not comma:
+                continue
+            device[field] = first.strip()
+            label, second = _CDP_SAME_LINE[field]
+            _, found, second_value = rest.partition(label)
+            if found and second not in device:
+                device[second] = second_value.strip()
+        else:
+            device[field] = value
+    if "id" in device:
+        neighbors.append(device)
+    return neighbors
+
+
+# ─── LLDP (linhas "Chave : valor") ────────────────────────────────────────────
+_KEY_VALUE = re.compile(r"^\s*([A-Za-z][A-Za-z ()\-]*?)\s*:\s*(.*?)\s*$", re.MULTILINE)
+
+# display lldp neighbor detail (Huawei VRP) e display lldp neighbor-information verbose (H3C Comware)
+_HUAWEI_PORT_HEADER = re.compile(
+    r"^\s*(?:(?:Port\s+)?(\S+)\s+has\s+\d+\s+neighbors?|LLDP neighbor-information of port \d+\[([^\]]+)\])",
+    re.IGNORECASE,
+)
+_HUAWEI_FIELDS = {
+    "system name": "id",
+    "system description": "model",
+    "system capability": "capabilities",
+    "system capabilities enabled": "capabilities",
+    "management address": "ip",
+    "management address value": "ip",
+    "ip address": "ip",
+    "port id": "remote_interface",
+    "neighbor interface": "remote_interface",
+    "local interface": "local_interface",
+}
+
+
+def _parse_lldp_huawei(output: str) -> List[Dict[str, Any]]:
+    neighbors = []
+    device: Dict[str, Any] = {}
+    port = None
+
+    def flush():
+        if "id" in device:
+            if port and "local_interface" not in device:
+                device["local_interface"] = port
+            neighbors.append(dict(device))
+        device.clear()
+
+    for line in output.splitlines():
+        header = _HUAWEI_PORT_HEADER.match(line)
+        if header:
+            flush()
+            port = header.group(1) or header.group(2)
+            continue
+        m = _KEY_VALUE.match(line)
+        if not m:
+            continue
+        key = " ".join(m.group(1).lower().split())
+        if key in ("neighbor index", "lldp neighbor index", "peer information"):
+            flush()
+            continue
+        field = _HUAWEI_FIELDS.get(key)
+        if field is None:
+            continue
+        value = m.group(2)
+        if field == "id" and "id" in device:
+            # Saída sem "Neighbor index": cada System name abre um vizinho novo
+            flush()
+        if field in device or not value:
+            continue
+        if field == "ip":
+            ip = _IP_VALUE.match(value)
+            if not ip:
+                continue
+            value = ip.group(0)
+        elif field == "model":
+            value = value[:50]
+        device[field] = value
+    flush()
+    return neighbors
+
+
+# show lldp neighbors detail (Cisco IOS/NX-OS): capabilities vêm abreviadas
+_CISCO_LLDP_CAPS = {
+    "B": "Bridge", "R": "Router", "W": "WLAN-Access-Point", "T": "Telephone",
+    "C": "DOCSIS", "P": "Repeater", "S": "Station", "O": "Other",
+}
+_CISCO_LLDP_FIELDS = {
+    "local intf": "local_interface",
+    "port id": "remote_interface",
+    "system name": "id",
+    "enabled capabilities": "capabilities",
+    "ip": "ip",
+}
+
+
+def _parse_lldp_cisco(output: str) -> List[Dict[str, Any]]:
+    neighbors = []
+    device: Dict[str, Any] = {}
+    want_description = False
+
+    for line in output.splitlines():
+        stripped = line.strip()
+        if stripped.startswith("-----"):
+            if "id" in device:
+                neighbors.append(device)
+            device = {}
+            want_description = False
+            continue
+        if want_description and stripped:
+            # System Description: o texto vem na linha seguinte
+            want_description = False
+            device.setdefault("model", stripped[:50])
+            continue
+        m = _KEY_VALUE.match(line)
+        if not m:
+            continue
+        key = " ".join(m.group(1).lower().split())
+        if key == "system description":
+            if m.group(2):
+                device.setdefault("model", m.group(2)[:50])
+            else:
+                want_description = True
+            continue
+        field = _CISCO_LLDP_FIELDS.get(key)
+        if field is None or field in device or not m.group(2):
+            continue
+        value = m.group(2)
+        if field == "ip":
+            ip = _IP_VALUE.match(value)
+            if not ip:
+                continue
+            value = ip.group(0)
+        elif field == "capabilities":
+            value = " ".join(_CISCO_LLDP_CAPS.get(c.strip(), c.strip()) for c in value.split(","))
+        device[field] = value
+    if "id" in device:
+        neighbors.append(device)
+    return neighbors
+
+
+# ─── Seleção do parser pela "impressão digital" da saída ──────────────────────
+_FINGERPRINT = re.compile(
+    r"(?P<cdp>Device ID:)"
+    r"|(?P<lldp_cisco>Local Intf:)"
+    r"|(?P<lldp_huawei>System name\s*:|Neighbor index|has\s+\d+\s+neighbors?)"
+)
+PARSERS = {
+    "cdp": _parse_cdp,
+    "lldp_cisco": _parse_lldp_cisco,
+    "lldp_huawei": _parse_lldp_huawei,
+}
+
+
+def detect_format(output: str) -> Optional[str]:
+    """'cdp' | 'lldp_cisco' | 'lldp_huawei' | None (pelo primeiro marcador encontrado)."""
+    m = _FINGERPRINT.search(output)
+    return m.lastgroup if m else None
+
+
+def parse_neighbors(output: str) -> List[Dict[str, Any]]:
+    """
+    Parseia saídas de 'show cdp neighbors detail', 'display lldp neighbor detail'
+    ou 'show lldp neighbors detail'.
+    Retorna lista de dicts com id, ip, model, capabilities, local_interface, remote_interface.
+    """
+    fmt = detect_format(output) if output else None
+    return PARSERS[fmt](output) if fmt else []
+
+
+# ─── Fabricante / show version ────────────────────────────────────────────────
+_COMMAND_ERROR = re.compile(
+    r"^\s*%?\s*(?:Invalid input|Unrecognized command|Incomplete command|Unknown command|Error:)",
+    re.MULTILINE | re.IGNORECASE,
+)
+_VENDOR_MARKERS = re.compile(r"(?P<huawei>Huawei|VRP|Quidway)|(?P<cisco>Cisco)", re.IGNORECASE)
+_HOSTNAME = re.compile(r"hostname\s+(\S+)", re.IGNORECASE)
+# Do mais específico para o mais genérico; o primeiro que casar vale
+_MODEL_PATTERNS = (
+    re.compile(r"^Model [Nn]umber\s*:\s*(\S+)", re.MULTILINE),                          # IOS switches
+    re.compile(r"^cisco Nexus\s*\d*\s+(\S+)\s+[Cc]hassis", re.MULTILINE | re.IGNORECASE),  # NX-OS
+    re.compile(r"^cisco\s+(\S+)\s+\(.*?\)\s+processor", re.MULTILINE | re.IGNORECASE),     # IOS / IOS-XE
+    re.compile(r"^(?:HUAWEI|Quidway)\s+([\w\-]+)\s.*uptime", re.MULTILINE | re.IGNORECASE),  # VRP
+)
+_LEGACY_MODEL = re.compile(r"(Cisco|Huawei)\s+([\w\-]+)", re.IGNORECASE)
+_VERSION_CAPS = (
+    (re.compile(r"Switch Ports Model|Switch uptime|Nexus|CloudEngine", re.IGNORECASE), "Switch"),
+    (re.compile(r"Router uptime", re.IGNORECASE), "Router"),
+)
+
+
+def is_command_error(output: str) -> bool:
+    """Resposta de comando não suportado (Cisco "% Invalid input", VRP "Error: Unrecognized command")."""
+    return bool(_COMMAND_ERROR.search(output))
+
+
+def detect_vendor(prompt: str, version_output: str = "") -> Optional[str]:
+    """
+    'cisco' | 'huawei' | None. A saída do show/display version decide; sem ela,
+    o formato do prompt ("<SW>"/"[SW]" é VRP, "SW#"/"SW>" é IOS).
+    """
+    m = _VENDOR_MARKERS.search(version_output or "")
+    if m:
+        return m.lastgroup
+    prompt = (prompt or "").strip()
+    if prompt.startswith(("<", "[")):
+        return "huawei"
+    if prompt.endswith(("#", ">")):
+        return "cisco"
+    return None
+
+
+def parse_version(output: str) -> Tuple[Optional[str], str, str]:
+    """(hostname ou None, "Fabricante Modelo" ou "", capabilities ou "") do show/display version."""
+    h = _HOSTNAME.search(output)
+    vendor = _VENDOR_MARKERS.search(output)
+    model = ""
+    for pattern in _MODEL_PATTERNS:
+        m = pattern.search(output)
+        if m:
+            model = f"{'Huawei' if vendor and vendor.lastgroup == 'huawei' else 'Cisco'} {m.group(1)}"
+            break
+    else:
+        m = _LEGACY_MODEL.search(output)
+        if m:
+            model = f"{m.group(1)} {m.group(2)}"
+    caps = next((c for pattern, c in _VERSION_CAPS if pattern.search(output)), "")
+    return (h.group(1) if h else None), model, caps
+
+
+# ─── Contagem pela saída resumida (show cdp neighbors / lldp brief) ───────────
+_TOTAL_ENTRIES = re.compile(r"Total (?:cdp|lldp)? ?entries displayed\s*:\s*(\d+)", re.IGNORECASE)
+# Cabeçalho da tabela (colunas separadas por espaços); "Device ID:" do detail não conta
+_SUMMARY_HEADER = re.compile(r"\s*(Device[ -]ID|Local Intf|Local Interface)\s{2,}", re.IGNORECASE)
+
+
+def _indent(line: str) -> int:
+    return len(line) - len(line.lstrip())
+
+
+def count_neighbors(output: str) -> Optional[int]:
+    """Número de vizinhos na saída resumida; None se não deu para reconhecer."""
+    m = _TOTAL_ENTRIES.search(output)
+    if m:
+        return int(m.group(1))
+    lines = output.splitlines()
+    header = next((i for i, l in enumerate(lines) if _SUMMARY_HEADER.match(l)), None)
+    if header is None:
+        return None
+    # Um vizinho por Device ID: com ID longo o IOS/NX-OS quebra a linha e os demais
+    # campos vêm na linha seguinte, recuada além da coluna do cabeçalho.
+    column = _indent(lines[header])
+    return sum(1 for l in lines[header + 1:]
+               if l.strip() and not l.strip().startswith("-") and _indent(l) <= column)
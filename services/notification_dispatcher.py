@@ -0,0 +1,318 @@
+import asyncio
+import random
+import time
+from collections import deque
+from typing import Awaitable, Callable, Dict, List, Optional
+from config import settings
+from .metrics import percentiles
+from .notification_router import Channel
+from .notifications import notification_service, WEBHOOK_OK_STATUS
+
+# Títulos dos cards de resumo por nível
+DIGEST_TITLES = {
+    "critical": "🔴 {n} alertas críticos",
+    "error": "🟠 {n} alertas de erro",
+    "warning": "🟡 {n} avisos",
+    "info": "✅ {n} notificações",
+}
+
+# Respostas que valem nova tentativa (demais 4xx vão direto para o dead-letter)
+RETRYABLE_STATUS = {408, 425, 429, 500, 502, 503, 504}
+
+
+class Alert:
+    __slots__ = ("title", "message", "level", "ref", "meta", "enqueued_at", "pending", "delivered")
+
+    def __init__(self, title: str, message: str, level: str, ref: Optional[str], meta: Optional[dict]):
+        self.title = title
+        self.message = message
+        self.level = level
+        self.ref = ref                      # ex: eventid, devolvido no on_result
+        self.meta = meta or {}              # severity/host/groups/tags usados nas regras de roteamento
+        self.enqueued_at = time.monotonic()
+        self.pending = 0                    # canais que ainda não terminaram a entrega
+        self.delivered = False              # True se pelo menos um canal entregou
+
+
+class _TokenBucket:
+    """Limite de posts por minuto para um webhook."""
+
+    def __init__(self, per_minute: int):
+        self.rate = per_minute / 60.0
+        self.capacity = max(1, per_minute)
+        self.tokens = float(self.capacity)
+        self.updated = time.monotonic()
+        self.lock = asyncio.Lock()
+
+    async def acquire(self):
+        async with self.lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+
+class _ChannelLane:
+    """Fila, workers e métricas de um canal: um webhook lento não atrasa os outros."""
+
+    def __init__(self, name: str, queue_max: int):
+        self.name = name
+        # Limitada: um webhook lento/fora do ar não acumula entregas sem fim (excedente vai ao dead-letter)
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=queue_max)
+        self.tasks: List[asyncio.Task] = []
+        self.latencies = deque(maxlen=500)
+        self.stats = {"sent": 0, "failed": 0, "retries": 0, "digests": 0, "dropped": 0}
+
+    def snapshot(self) -> dict:
+        return {"workers": len(self.tasks), "queue_depth": self.queue.qsize(), "queue_max": self.queue.maxsize,
+                **self.stats,
+                "latency_ms": percentiles(self.latencies)}
+
+
+class NotificationDispatcher:
+    """
+    Fila de envio de notificações fora do ciclo do scheduler.
+    Cada alerta é roteado pela tabela do notification_service; o que chega dentro
+    da janela de digest é agrupado por canal e nível num único card. Cada canal
+    tem sua própria fila e workers, com limite de taxa por webhook, retry com
+    backoff exponencial e, esgotadas as tentativas, dead-letter.
+    """
+
+    def __init__(self, queue_max: int = 1000):
+        self.queue_max = queue_max
+        self._inbox: Optional[asyncio.Queue] = None
+        self._batcher_task: Optional[asyncio.Task] = None
+        self._lanes: Dict[str, _ChannelLane] = {}
+        self._buckets: Dict[str, _TokenBucket] = {}
+        # Chamado quando todos os canais de um alerta terminaram, com (refs, entregue?)
+        self.on_result: Optional[Callable[[List[str], bool], Awaitable[None]]] = None
+        self.dead_letter = deque(maxlen=100)
+        self._latencies = deque(maxlen=500)
+        self._stats = {"enqueued": 0, "dropped": 0, "unrouted": 0, "sent": 0, "failed": 0,
+                       "retries": 0, "digests": 0, "alerts_in_digests": 0}
+
+    @property
+    def running(self) -> bool:
+        return self._batcher_task is not None
+
+    def start(self):
+        if self.running:
+            return
+        self._inbox = asyncio.Queue(maxsize=self.queue_max)
+        self._batcher_task = asyncio.create_task(self._batcher())
+        print(f"[Dispatcher] Started ({len(notification_service.routing.channels)} canais)")
+
+    async def stop(self, drain_timeout: float = 10.0):
+        if not self.running:
+            return
+        try:
+            # Dá uma chance para o que já está na fila sair antes do shutdown
+            await asyncio.wait_for(self._drain(), timeout=drain_timeout)
+        except asyncio.TimeoutError:
+            print(f"[Dispatcher] Shutdown com {self.depth()} notificações pendentes")
+        tasks = [self._batcher_task] + [t for lane in self._lanes.values() for t in lane.tasks]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._batcher_task = None
+        self._lanes = {}
+
+    async def _drain(self):
+        await self._inbox.join()
+        for lane in list(self._lanes.values()):
+            await lane.queue.join()
+
+    def depth(self) -> int:
+        if not self.running:
+            return 0
+        return self._inbox.qsize() + sum(lane.queue.qsize() for lane in self._lanes.values())
+
+    def enqueue(self, title: str, message: str, level: str = "info",
+                ref: Optional[str] = None, meta: Optional[dict] = None) -> bool:
+        """Não bloqueia: devolve False se o dispatcher estiver parado ou a fila cheia."""
+        if not self.running:
+            print(f"[Dispatcher] Not running; notification dropped: {title}")
+            self._stats["dropped"] += 1
+            return False
+        try:
+            self._inbox.put_nowait(Alert(title, message, level, ref, meta))
+        except asyncio.QueueFull:
+            self._stats["dropped"] += 1
+            self.dead_letter.append({"title": title, "level": level, "ref": ref, "channel": None,
+                                     "error": "queue full", "attempts": 0, "at": time.time()})
+            return False
+        self._stats["enqueued"] += 1
+        return True
+
+    def _lane(self, channel: Channel) -> _ChannelLane:
+        lane = self._lanes.get(channel.name)
+        if lane is None:
+            lane = self._lanes[channel.name] = _ChannelLane(channel.name, settings.NOTIFY_LANE_QUEUE_MAX)
+            workers = channel.workers or settings.NOTIFY_WORKERS
+            lane.tasks = [asyncio.create_task(self._worker(lane)) for _ in range(workers)]
+        return lane
+
+    async def _batcher(self):
+        """Agrupa o que chega dentro da janela de digest, roteia e gera as entregas por canal/nível."""
+        window = settings.NOTIFY_DIGEST_WINDOW
+        while True:
+            first = await self._inbox.get()
+            batch = [first]
+            deadline = time.monotonic() + window
+            while len(batch) < settings.NOTIFY_DIGEST_MAX_ITEMS:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._inbox.get(), timeout=remaining))
+                except asyncio.TimeoutError:
+                    break
+
+            # Mesma tabela para o lote inteiro, mesmo que um reload aconteça no meio
+            routing = notification_service.routing
+            groups: Dict[tuple, List[Alert]] = {}
+            channels: Dict[str, Channel] = {}
+            for alert in batch:
+                routed = routing.route(alert.level, alert.meta)
+                alert.pending = len(routed)
+                if not routed:
+                    print(f"[Notification] Nenhum canal configurado para: {alert.title}")
+                    self._stats["unrouted"] += 1
+                    await self._complete([alert])
+                for channel in routed:
+                    channels[channel.name] = channel
+                    groups.setdefault((channel.name, alert.level), []).append(alert)
+
+            for (name, _), alerts in groups.items():
+                channel = channels[name]
+                lane = self._lane(channel)
+                if len(alerts) >= settings.NOTIFY_DIGEST_THRESHOLD:
+                    await self._put(lane, channel, alerts)
+                else:
+                    for alert in alerts:
+                        await self._put(lane, channel, [alert])
+            for _ in batch:
+                self._inbox.task_done()
+
+    async def _put(self, lane: _ChannelLane, channel: Channel, alerts: List[Alert]):
+        try:
+            lane.queue.put_nowait((channel, alerts))
+        except asyncio.QueueFull:
+            lane.stats["dropped"] += len(alerts)
+            self._stats["dropped"] += len(alerts)
+            print(f"[Dispatcher] Fila do canal {channel.name} cheia; {len(alerts)} alerta(s) para o dead-letter")
+            await self._finish(lane, channel, alerts, False, "channel queue full", 0)
+
+    def _payload(self, channel: Channel, alerts: List[Alert]) -> dict:
+        if len(alerts) == 1:
+            a = alerts[0]
+            return channel.payload(a.title, [(a.title, a.message)], a.level, single=True)
+        level = alerts[0].level
+        title = DIGEST_TITLES.get(level, DIGEST_TITLES["info"]).format(n=len(alerts))
+        return channel.payload(title, [(a.title, a.message) for a in alerts], level)
+
+    async def _worker(self, lane: _ChannelLane):
+        while True:
+            channel, alerts = await lane.queue.get()
+            try:
+                await self._deliver(lane, channel, alerts)
+            except Exception as e:
+                print(f"[Dispatcher] Worker {lane.name} error: {e}")
+            finally:
+                lane.queue.task_done()
+
+    async def _deliver(self, lane: _ChannelLane, channel: Channel, alerts: List[Alert]):
+        label = alerts[0].title if len(alerts) == 1 else f"digest de {len(alerts)} alertas"
+        payload = self._payload(channel, alerts)
+        rate = channel.rate_per_minute or settings.NOTIFY_RATE_PER_MINUTE
+        bucket = self._buckets.get(channel.url)
+        if bucket is None or bucket.capacity != max(1, rate):
+            bucket = self._buckets[channel.url] = _TokenBucket(rate)
+        error = None
+        attempts = 0
+        for attempt in range(settings.NOTIFY_MAX_RETRIES + 1):
+            attempts = attempt + 1
+            await bucket.acquire()
+            delay = None
+            try:
+                response = await notification_service.post_payload(channel, payload)
+                if response.status_code in WEBHOOK_OK_STATUS:
+                    print(f"[Notification] Sent to {channel.name}: {label}")
+                    if len(alerts) > 1:
+                        lane.stats["digests"] += 1
+                        self._stats["digests"] += 1
+                        self._stats["alerts_in_digests"] += len(alerts)
+                    return await self._finish(lane, channel, alerts, True, None, attempts)
+                error = f"HTTP {response.status_code} - {response.text[:200]}"
+                if response.status_code not in RETRYABLE_STATUS:
+                    break
+                retry_after = response.headers.get("Retry-After", "")
+                delay = float(retry_after) if retry_after.isdigit() else None
+            except Exception as e:
+                error = str(e) or type(e).__name__
+
+            if attempt < settings.NOTIFY_MAX_RETRIES:
+                lane.stats["retries"] += 1
+                self._stats["retries"] += 1
+                # Backoff exponencial com jitter: 1s, 2s, 4s... (ou o Retry-After do webhook)
+                await asyncio.sleep(delay if delay is not None else
+                                    settings.NOTIFY_RETRY_BASE_DELAY * 2 ** attempt * random.uniform(0.8, 1.2))
+
+        print(f"[Notification] Failed ({channel.name}) after {attempts} attempts: {label} ({error})")
+        await self._finish(lane, channel, alerts, False, error, attempts)
+
+    async def _finish(self, lane: _ChannelLane, channel: Channel, alerts: List[Alert],
+                      ok: bool, error: Optional[str], attempts: int):
+        now = time.monotonic()
+        for a in alerts:
+            lane.latencies.append(now - a.enqueued_at)
+        if ok:
+            lane.stats["sent"] += len(alerts)
+        else:
+            lane.stats["failed"] += len(alerts)
+            for a in alerts:
+                self.dead_letter.append({"title": a.title, "level": a.level, "ref": a.ref, "channel": channel.name,
+                                         "error": error, "attempts": attempts, "at": time.time()})
+
+        done = []
+        for a in alerts:
+            a.delivered = a.delivered or ok
+            a.pending -= 1
+            if a.pending <= 0:
+                done.append(a)
+        if done:
+            await self._complete(done)
+
+    async def _complete(self, alerts: List[Alert]):
+        """Todos os canais do alerta terminaram: entregue se ao menos um aceitou."""
+        now = time.monotonic()
+        for a in alerts:
+            self._latencies.append(now - a.enqueued_at)
+            self._stats["sent" if a.delivered else "failed"] += 1
+        if not self.on_result:
+            return
+        for delivered in (True, False):
+            refs = [a.ref for a in alerts if a.delivered == delivered and a.ref is not None]
+            if refs:
+                try:
+                    await self.on_result(refs, delivered)
+                except Exception as e:
+                    print(f"[Dispatcher] on_result error: {e}")
+
+    def stats(self) -> dict:
+        return {
+            "running": self.running,
+            "queue_depth": self.depth(),
+            "queue_max": self.queue_max,
+            **self._stats,
+            "dead_letter": len(self.dead_letter),
+            "latency_ms": percentiles(self._latencies),
+            "channels": {name: lane.snapshot() for name, lane in self._lanes.items()},
+        }
+
+
+notification_dispatcher = NotificationDispatcher(queue_max=settings.NOTIFY_QUEUE_MAX)
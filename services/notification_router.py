@@ -0,0 +1,219 @@
+import re
+from datetime import datetime
+from typing import Callable, Dict, FrozenSet, List, NamedTuple, Optional, Pattern, Tuple
+
+LEVEL_COLORS = {"info": "#36a64f", "warning": "#ecb22e", "error": "#e01e5a", "critical": "#ff0000"}
+
+# Severidades do Zabbix aceitas por nome nas regras
+SEVERITY_NAMES = {
+    "not_classified": 0, "information": 1, "warning": 2,
+    "average": 3, "high": 4, "disaster": 5,
+}
+
+# Items de um card: [(título, mensagem)]; single=True é o alerta individual (sem lista)
+Formatter = Callable[[str, List[Tuple[str, str]], str, bool], dict]
+
+
+def _format_teams(title, items, level, single):
+    # Modern Adaptive Card Format
+    # Note: contentUrl must be omitted as it causes schema validation errors in Power Automate
+    body = [{
+        "type": "TextBlock",
+        "text": title,
+        "size": "Large",
+        "weight": "Bolder",
+        "color": "Attention" if level in ["error", "critical"] else "Good"
+    }]
+    for item_title, message in items:
+        if not single:
+            body.append({"type": "TextBlock", "text": item_title, "weight": "Bolder", "wrap": True, "separator": True})
+        body.append({"type": "TextBlock", "text": message, "wrap": True})
+    body.append({
+        "type": "FactSet",
+        "facts": [
+            {"title": "Level", "value": level.upper()},
+            {"title": "Time", "value": datetime.now().strftime("%H:%M:%S")}
+        ] + ([] if single else [{"title": "Alertas", "value": str(len(items))}])
+    })
+    return {
+        "type": "message",
+        "attachments": [
+            {
+                "contentType": "application/vnd.microsoft.card.adaptive",
+                "content": {
+                    "$schema": "http://adaptivecards.io/schemas/adaptive-card.json",
+                    "type": "AdaptiveCard",
+                    "version": "1.4",
+                    "body": body
+                }
+            }
+        ]
+    }
+
+
+def _format_discord(title, items, level, single):
+    if single:
+        return {"content": f"**{title}**\n{items[0][1]}"}
+    lines = "\n\n".join(f"**{t}**\n{m}" for t, m in items)
+    # Limite de 2000 caracteres por mensagem no Discord
+    return {"content": f"**{title}**\n\n{lines}"[:2000]}
+
+
+def _format_slack(title, items, level, single):
+    # Slack / Generic
+    color = LEVEL_COLORS.get(level, LEVEL_COLORS["info"])
+    ts = datetime.now().timestamp()
+    if single:
+        attachments = [{"color": color, "title": title, "text": items[0][1], "footer": "Network Monitor", "ts": ts}]
+    else:
+        attachments = [{"color": color, "title": title, "footer": "Network Monitor", "ts": ts}]
+        attachments += [{"color": color, "title": t, "text": m} for t, m in items]
+    return {"attachments": attachments}
+
+
+FORMATTERS: Dict[str, Formatter] = {
+    "teams": _format_teams,
+    "discord": _format_discord,
+    "slack": _format_slack,
+}
+
+
+def webhook_kind(url: str) -> str:
+    # Detect Microsoft Teams Webhook (Workflows / Power Automate)
+    # Common domains: office.com, webhook.office.com, logic.azure.com (Power Automate)
+    if any(x in url for x in ["office.com", "webhook.office", "logic.azure.com", "workflows"]):
+        return "teams"
+    if "discord" in url:
+        return "discord"
+    return "slack"
+
+
+class Channel(NamedTuple):
+    """Canal de notificação já resolvido: tipo, formatter e regras pré-compilados."""
+    name: str
+    type: str
+    url: str
+    formatter: Formatter
+    levels: Optional[FrozenSet[str]] = None
+    min_severity: Optional[int] = None
+    hosts: Optional[Pattern] = None
+    host_groups: Optional[FrozenSet[str]] = None
+    tags: Optional[Tuple[Tuple[str, Optional[str]], ...]] = None
+    rate_per_minute: Optional[int] = None
+    workers: Optional[int] = None
+
+    def matches(self, level: str, meta: dict) -> bool:
+        # Critérios ausentes valem para tudo; os presentes precisam bater todos (AND)
+        if self.levels is not None and level not in self.levels:
+            return False
+        if self.min_severity is not None and int(meta.get("severity") or 0) < self.min_severity:
+            return False
+        if self.hosts is not None and not self.hosts.search(meta.get("host") or ""):
+            return False
+        if self.host_groups is not None and not self.host_groups.intersection(meta.get("groups") or ()):
+            return False
+        if self.tags is not None:
+            alert_tags = {(t.get("tag"), t.get("value")) for t in meta.get("tags") or ()}
+            alert_names = {tag for tag, _ in alert_tags}
+            if not any((tag, value) in alert_tags if value is not None else tag in alert_names
+                       for tag, value in self.tags):
+                return False
+        return True
+
+    def payload(self, title: str, items: List[Tuple[str, str]], level: str, single: bool = False) -> dict:
+        return self.formatter(title, items, level, single)
+
+
+class RoutingTable:
+    """
+    Tabela de roteamento imutável montada a partir de config.json uma única vez.
+    Um reload gera uma tabela nova e troca a referência; quem já pegou a antiga
+    continua usando-a até terminar.
+    """
+
+    __slots__ = ("channels", "needs_host_groups")
+
+    def __init__(self, channels: Tuple[Channel, ...]):
+        object.__setattr__(self, "channels", channels)
+        object.__setattr__(self, "needs_host_groups", any(c.host_groups is not None for c in channels))
+
+    def __setattr__(self, name, value):
+        raise AttributeError("RoutingTable é imutável; use parse_routing_table para gerar outra")
+
+    def route(self, level: str, meta: dict) -> Tuple[Channel, ...]:
+        return tuple(c for c in self.channels if c.matches(level, meta))
+
+    def get(self, name: str) -> Optional[Channel]:
+        return next((c for c in self.channels if c.name == name), None)
+
+
+def _severity(value) -> Optional[int]:
+    if value is None:
+        return None
+    if isinstance(value, str) and not value.isdigit():
+        return SEVERITY_NAMES[value.strip().lower().replace(" ", "_")]
+    return int(value)
+
+
+def _tag_rules(tags) -> Tuple[Tuple[str, Optional[str]], ...]:
+    # "tag" casa qualquer valor; "tag:valor" casa o par exato
+    rules = []
+    for t in tags:
+        tag, sep, value = str(t).partition(":")
+        rules.append((tag.strip(), value.strip() if sep else None))
+    return tuple(rules)
+
+
+def parse_channel(data: dict, index: int = 0) -> Channel:
+    url = (data.get("url") or data.get("webhook_url") or "").strip()
+    if not url:
+        raise ValueError(f"canal {data.get('name') or index}: url obrigatória")
+    kind = (data.get("type") or "auto").lower()
+    if kind == "auto":
+        kind = webhook_kind(url)
+    if kind not in FORMATTERS:
+        raise ValueError(f"canal {data.get('name') or index}: tipo '{kind}' inválido ({', '.join(FORMATTERS)})")
+
+    rate = data.get("rate_per_minute")
+    if rate is not None and int(rate) <= 0:
+        raise ValueError(f"canal {data.get('name') or index}: rate_per_minute deve ser maior que zero")
+
+    levels = data.get("levels")
+    groups = data.get("host_groups")
+    tags = data.get("tags")
+    return Channel(
+        name=data.get("name") or f"channel-{index}",
+        type=kind,
+        url=url,
+        formatter=FORMATTERS[kind],
+        levels=frozenset(l.lower() for l in levels) if levels else None,
+        min_severity=_severity(data.get("min_severity")),
+        hosts=re.compile(data["hosts"], re.IGNORECASE) if data.get("hosts") else None,
+        host_groups=frozenset(groups) if groups else None,
+        tags=_tag_rules(tags) if tags else None,
+        rate_per_minute=int(rate) if rate is not None else None,
+        workers=max(1, int(data["workers"])) if data.get("workers") else None,
+    )
+
+
+def parse_routing_table(notifications: dict) -> RoutingTable:
+    """
+    notifications.channels = [{name, url, type?, levels?, min_severity?, hosts?, host_groups?, tags?, ...}]
+    Sem "channels", o webhook_url antigo vira um canal "default" que recebe tudo.
+    Canais com erro de configuração são ignorados (e logados) sem derrubar os demais.
+    """
+    notifications = notifications or {}
+    raw = notifications.get("channels")
+    if raw is None:
+        url = notifications.get("webhook_url", "")
+        raw = [{"name": "default", "url": url}] if url else []
+
+    channels = []
+    for i, data in enumerate(raw):
+        if not data.get("enabled", True):
+            continue
+        try:
+            channels.append(parse_channel(data, i))
+        except (ValueError, KeyError, re.error) as e:
+            print(f"[Notification] Canal ignorado: {e}")
+    return RoutingTable(tuple(channels))
@@ -1,109 +1,69 @@
-import requests
+import asyncio
 import json
 import os
-from datetime import datetime
+from typing import Optional
+from .http_clients import http_clients
+from .notification_router import Channel, RoutingTable, parse_routing_table
+
+# Códigos de sucesso dos webhooks
+# 200=OK, 201=Created, 202=Accepted (Common for Workflows), 204=No Content
+WEBHOOK_OK_STATUS = (200, 201, 202, 204)
+
 
 class NotificationService:
     def __init__(self):
         self.config_path = "config.json"
-        self.webhook_url = self._load_webhook_url()
+        self.routing: RoutingTable = self._load_routing()
 
-    def _load_webhook_url(self):
+    def _load_routing(self) -> RoutingTable:
+        data = {}
         if os.path.exists(self.config_path):
             try:
                 with open(self.config_path, "r") as f:
-                    data = json.load(f)
-                    return data.get("notifications", {}).get("webhook_url", "")
-            except:
-                return ""
-        return ""
+                    data = json.load(f).get("notifications", {})
+            except Exception as e:
+                print(f"[Notification] Erro lendo {self.config_path}: {e}")
+        return parse_routing_table(data)
 
     def reload_config(self):
-        self.webhook_url = self._load_webhook_url()
+        # Troca a tabela inteira de uma vez; entregas em andamento seguem com a anterior
+        self.routing = self._load_routing()
+        print(f"[Notification] Canais: {', '.join(c.name for c in self.routing.channels) or 'nenhum'}")
 
-    def send_notification(self, title, message, level="info"):
-        """
-        Sends a notification via Webhook (Slack/Teams compatible format).
-        Level: info, warning, error, critical
-        """
-        if not self.webhook_url:
-            print("[Notification] No Webhook URL configured.")
-            return False
+    @property
+    def webhook_url(self) -> str:
+        # Compatibilidade: URL do primeiro canal (antes só existia um webhook)
+        return self.routing.channels[0].url if self.routing.channels else ""
 
-        color = "#36a64f" # Green
-        if level == "warning": color = "#ecb22e"
-        elif level == "error": color = "#e01e5a"
-        elif level == "critical": color = "#ff0000"
+    async def post_payload(self, channel: Channel, payload: dict, timeout: float = 5.0):
+        """POST no webhook do canal pelo cliente HTTP compartilhado (erros de rede propagam)."""
+        return await http_clients.post(f"webhook:{channel.name}", channel.url, json=payload, timeout=timeout)
 
+    async def send_to_channel(self, channel: Channel, title, message, level="info") -> bool:
         try:
-            # Detect Microsoft Teams Webhook (Workflows / Power Automate)
-            # Common domains: office.com, webhook.office.com, logic.azure.com (Power Automate)
-            if any(x in self.webhook_url for x in ["office.com", "webhook.office", "logic.azure.com", "workflows"]):
-                # Modern Adaptive Card Format
-                # Note: contentUrl must be omitted as it causes schema validation errors in Power Automate
-                payload = {
-                    "type": "message",
-                    "attachments": [
-                        {
-                            "contentType": "application/vnd.microsoft.card.adaptive",
-                            "content": {
-                                "$schema": "http://adaptivecards.io/schemas/adaptive-card.json",
-                                "type": "AdaptiveCard",
-                                "version": "1.4",
-                                "body": [
-                                    {
-                                        "type": "TextBlock",
-                                        "text": title,
-                                        "size": "Large",
-                                        "weight": "Bolder",
-                                        "color": "Attention" if level in ["error", "critical"] else "Good"
-                                    },
-                                    {
-                                        "type": "TextBlock",
-                                        "text": message,
-                                        "wrap": True
-                                    },
-                                    {
-                                        "type": "FactSet",
-                                        "facts": [
-                                            {"title": "Level", "value": level.upper()},
-                                            {"title": "Time", "value": datetime.now().strftime("%H:%M:%S")}
-                                        ]
-                                    }
-                                ]
-                            }
-                        }
-                    ]
-                }
-            # Discord
-            elif "discord" in self.webhook_url:
-                 payload = {"content": f"**{title}**\n{message}"}
-            # Slack / Generic
-            else:
-                payload = {
-                    "attachments": [
-                        {
-                            "color": color,
-                            "title": title,
-                            "text": message,
-                            "footer": "Network Monitor",
-                            "ts": datetime.now().timestamp()
-                        }
-                    ]
-                }
-
-            print(f"[Notification] Sending Payload: {json.dumps(payload, indent=2)}")
-            response = requests.post(self.webhook_url, json=payload, timeout=5)
-            
-            # 200=OK, 201=Created, 202=Accepted (Common for Workflows), 204=No Content
-            if response.status_code in [200, 201, 202, 204]:
-                print(f"[Notification] Sent: {title}")
+            response = await self.post_payload(channel, channel.payload(title, [(title, message)], level, single=True))
+            if response.status_code in WEBHOOK_OK_STATUS:
+                print(f"[Notification] Sent to {channel.name}: {title}")
                 return True
-            else:
-                print(f"[Notification] Failed: {response.status_code} - {response.text}")
-                return False
+            print(f"[Notification] Failed ({channel.name}): {response.status_code} - {response.text[:200]}")
+            return False
         except Exception as e:
-            print(f"[Notification] Error: {e}")
+            print(f"[Notification] Error ({channel.name}): {e}")
+            return False
+
+    async def send_notification(self, title, message, level="info", channel: Optional[str] = None):
+        """
+        Envia um alerta imediatamente (sem fila nem retry) para um canal ou para
+        todos, e devolve True se todos aceitaram. O scheduler usa o notification_dispatcher;
+        isto serve para o teste manual.
+        """
+        channels = self.routing.channels
+        if channel:
+            channels = tuple(c for c in channels if c.name == channel)
+        if not channels:
+            print("[Notification] No Webhook URL configured.")
             return False
+        results = await asyncio.gather(*(self.send_to_channel(c, title, message, level) for c in channels))
+        return all(results)
 
 notification_service = NotificationService()
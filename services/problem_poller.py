@@ -0,0 +1,124 @@
+import asyncio
+import json
+import time
+from collections import deque
+from typing import Dict, List, Optional, Set
+from config import settings
+from .zabbix_monitor import zabbix_monitor
+
+
+class PollResult:
+    def __init__(self, mode: str, new: List[dict], resolved: List[str], active: Optional[Set[str]] = None):
+        self.mode = mode            # "full" | "incremental"
+        self.new = new              # problemas novos (com host)
+        self.resolved = resolved    # eventids normalizados
+        self.active = active        # só no resync: todos os eventids abertos no Zabbix
+
+
+class IncrementalProblemPoller:
+    """
+    Acompanha os problemas ativos do Zabbix por cursor de eventid.
+    A cada ciclo pede só os eventos criados depois do último eventid visto
+    (novos problemas e recuperações); a cada N ciclos faz uma leitura completa
+    do problem.get para corrigir qualquer divergência.
+    """
+
+    def __init__(self, severity: int = 4, resync_every: int = 15):
+        self.severity = severity
+        self.resync_every = resync_every
+        self.cursor: Optional[int] = None
+        self.tracked: Dict[str, str] = {}              # eventid -> triggerid
+        self.by_trigger: Dict[str, Set[str]] = {}      # triggerid -> eventids
+        self._ticks_since_resync = 0
+        self._history = {"full": deque(maxlen=50), "incremental": deque(maxlen=50)}
+
+    def reset(self):
+        self.cursor = None
+
+    async def poll(self) -> PollResult:
+        started = time.perf_counter()
+        if self.cursor is None or self._ticks_since_resync >= self.resync_every:
+            result, payload = await self._full_resync()
+        else:
+            result, payload = await self._incremental()
+            self._ticks_since_resync += 1
+        self._history[result.mode].append({
+            "latency_ms": round((time.perf_counter() - started) * 1000, 1),
+            "payload_bytes": payload,
+            "new": len(result.new),
+            "resolved": len(result.resolved),
+        })
+        return result
+
+    async def _full_resync(self):
+        problems, latest = await asyncio.gather(
+            zabbix_monitor.fetch_problems(self.severity, recent=False),
+            zabbix_monitor.latest_eventid(),
+        )
+        current = {p["eventid"]: p for p in problems}
+        new = [p for eid, p in current.items() if eid not in self.tracked]
+        resolved = [eid for eid in self.tracked if eid not in current]
+
+        self.tracked = {}
+        self.by_trigger = {}
+        for p in problems:
+            self._track(p)
+        self.cursor = max([latest] + [int(eid) for eid in current])
+        self._ticks_since_resync = 0
+        return PollResult("full", new, resolved, set(current)), len(json.dumps(problems))
+
+    async def _incremental(self):
+        changes = await zabbix_monitor.get_event_changes(self.cursor, self.severity, list(self.by_trigger))
+        new = []
+        for e in changes["new"]:
+            if e["eventid"] not in self.tracked:
+                self._track(e)
+                new.append(e)
+
+        resolved = []
+        for r in changes["recovered"]:
+            # Recuperação fecha os problemas do mesmo trigger abertos antes dela
+            for eid in list(self.by_trigger.get(r["objectid"], ())):
+                if int(eid) < int(r["eventid"]):
+                    self._untrack(eid)
+                    resolved.append(eid)
+
+        seen = [int(e["eventid"]) for e in changes["new"]] + [int(r["eventid"]) for r in changes["recovered"]]
+        if seen:
+            self.cursor = max([self.cursor] + seen)
+        return PollResult("incremental", new, resolved), len(json.dumps(changes))
+
+    def _track(self, p: dict):
+        self.tracked[p["eventid"]] = p["objectid"]
+        self.by_trigger.setdefault(p["objectid"], set()).add(p["eventid"])
+
+    def _untrack(self, eventid: str):
+        trigger = self.tracked.pop(eventid, None)
+        events = self.by_trigger.get(trigger)
+        if events is not None:
+            events.discard(eventid)
+            if not events:
+                del self.by_trigger[trigger]
+
+    def stats(self) -> dict:
+        def summary(samples):
+            if not samples:
+                return None
+            return {
+                "ticks": len(samples),
+                "avg_latency_ms": round(sum(s["latency_ms"] for s in samples) / len(samples), 1),
+                "avg_payload_bytes": round(sum(s["payload_bytes"] for s in samples) / len(samples)),
+                "last": samples[-1],
+            }
+
+        return {
+            "cursor": self.cursor,
+            "tracked_problems": len(self.tracked),
+            "resync_every": self.resync_every,
+            "ticks_since_resync": self._ticks_since_resync,
+            "full": summary(self._history["full"]),
+            "incremental": summary(self._history["incremental"]),
+        }
+
+
+problem_poller = IncrementalProblemPoller(severity=4, resync_every=settings.POLLER_RESYNC_EVERY)
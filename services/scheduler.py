@@ -1,59 +1,307 @@
-from apscheduler.schedulers.background import BackgroundScheduler
+from apscheduler.schedulers.asyncio import AsyncIOScheduler
 from apscheduler.triggers.interval import IntervalTrigger
+import asyncio
 import time
+from config import settings
+from .notification_dispatcher import notification_dispatcher
 from .notifications import notification_service
+from .problem_poller import problem_poller
 from .zabbix_monitor import zabbix_monitor
+from .state_store import state_store, STATUS_SENT, STATUS_FAILED, STATUS_SUPPRESSED
 
-scheduler = BackgroundScheduler()
+# Roda no event loop da aplicação (mesmo loop do cliente HTTP e da sessão Zabbix)
+scheduler = AsyncIOScheduler()
 
-# Simple in-memory state to avoid spamming alerts
-# Format: { event_id: timestamp }
-active_problems_cache = {}
+# Estado dos problemas já vistos/notificados (SQLite por padrão): sobrevive a
+# restarts e é compartilhado entre workers, então ninguém alerta duas vezes
 
-def check_device_status():
+async def _record_notification(refs, delivered):
+    # Chamado pelo dispatcher após cada entrega (um lote por card/digest)
+    status = STATUS_SENT if delivered else STATUS_FAILED
+    await asyncio.to_thread(state_store.set_status, {ref: status for ref in refs})
+
+notification_dispatcher.on_result = _record_notification
+
+
+class FlapDetector:
+    """
+    Dedup e supressão de flapping por host+trigger (não por eventid).
+    - Recuperação fica em hold-down: só vira aviso se o trigger não voltar antes do prazo;
+      se voltar, nem a normalização nem o novo problema são avisados.
+    - Com FLAP_THRESHOLD transições dentro de FLAP_WINDOW o trigger entra em flapping:
+      um único aviso e as transições seguintes ficam suprimidas até passar
+      FLAP_STABLE_AFTER sem mudanças, quando sai um aviso com o estado final.
+    O estado de cada chave fica no state_store (compartilhado entre workers e restarts):
+    cada ciclo lê e grava só as chaves que mudaram, numa transação, e os prazos vencidos
+    saem de uma consulta por next_due.
+    """
+
+    def __init__(self, store, window: float, threshold: int, holddown: float, stable_after: float):
+        self.store = store
+        self.window = window
+        self.threshold = threshold
+        self.holddown = holddown
+        self.stable_after = stable_after
+        # Contadores deste processo; o estado em si é o do store
+        self.stats_counters = {"notified": 0, "suppressed": 0, "held": 0, "flap_started": 0, "flap_ended": 0}
+
+    @staticmethod
+    def key_for(host, objectid) -> str:
+        return f"{host}|{objectid}"
+
+    @staticmethod
+    def _state(states, key, host, name, meta) -> dict:
+        st = states.get(key)
+        if st is None:
+            st = states[key] = {
+                "host": host, "name": name, "meta": meta or {},
+                "transitions": [],          # timestamps de problema/recuperação dentro da janela
+                "open": [],                 # eventids ainda em problema
+                "notified": None,           # último estado avisado: "problem" | "ok" | None
+                "flapping": False,
+                "pending_resolve": None,    # horário em que a normalização em hold-down será avisada
+                "next_due": None,
+            }
+        if meta:
+            st["meta"] = meta
+        st["name"] = name or st["name"]
+        return st
+
+    def _schedule(self, st: dict):
+        """Próximo prazo da chave: fim do hold-down, fim do flapping ou descarte do estado."""
+        last = st["transitions"][-1] if st["transitions"] else 0
+        dues = []
+        if st["pending_resolve"] is not None:
+            dues.append(st["pending_resolve"])
+        if st["flapping"]:
+            dues.append(last + self.stable_after)
+        elif not st["open"]:
+            dues.append(last + max(self.window, self.stable_after))
+        st["next_due"] = min(dues) if dues else None
+
+    def _transition(self, st: dict, now) -> bool:
+        """Registra a transição; devolve True se o trigger acabou de entrar em flapping."""
+        st["transitions"] = [t for t in st["transitions"] if t >= now - self.window] + [now]
+        if st["flapping"]:
+            return False
+        if len(st["transitions"]) >= self.threshold:
+            st["flapping"] = True
+            st["pending_resolve"] = None
+            self.stats_counters["flap_started"] += 1
+            return True
+        return False
+
+    def _on_problem(self, st: dict, eventid, now) -> str:
+        was_open = bool(st["open"])
+        if eventid not in st["open"]:
+            st["open"].append(eventid)
+        if was_open:
+            # Mais um evento do mesmo trigger ainda em problema: duplicado
+            self.stats_counters["suppressed"] += 1
+            return "suppress"
+        if self._transition(st, now):
+            return "flapping"
+        if st["flapping"]:
+            self.stats_counters["suppressed"] += 1
+            return "suppress"
+        if st["pending_resolve"] is not None:
+            # Voltou dentro do hold-down: para quem recebeu o alerta o problema nunca saiu
+            st["pending_resolve"] = None
+            self.stats_counters["suppressed"] += 1
+            return "suppress"
+        st["notified"] = "problem"
+        self.stats_counters["notified"] += 1
+        return "notify"
+
+    def _on_resolved(self, st: dict, eventid, now, was_notified) -> str:
+        if eventid in st["open"]:
+            st["open"].remove(eventid)
+        if st["open"]:
+            # Outro evento do mesmo trigger continua aberto
+            self.stats_counters["suppressed"] += 1
+            return "suppress"
+        if self._transition(st, now):
+            return "flapping"
+        if st["flapping"] or not (st["notified"] == "problem" or was_notified):
+            # Em flapping, ou o problema nunca foi avisado: nada a normalizar para o usuário
+            self.stats_counters["suppressed"] += 1
+            return "suppress"
+        st["pending_resolve"] = now + self.holddown
+        self.stats_counters["held"] += 1
+        return "hold"
+
+    def apply(self, changes, now) -> list:
+        """
+        Transições do ciclo, na ordem: (tipo, eventid, host, objectid, name, meta, was_notified)
+        com tipo "problem" ou "resolved". Devolve a ação de cada uma:
+        problema 'notify' | 'suppress' | 'flapping'; recuperação 'hold' | 'suppress' | 'flapping'.
+        was_notified vem do store (status 'sent'): cobre problemas avisados antes de um restart.
+        """
+        if not changes:
+            return []
+
+        def run(states):
+            actions = []
+            for kind, eventid, host, objectid, name, meta, was_notified in changes:
+                st = self._state(states, self.key_for(host, objectid), host, name, meta)
+                if kind == "problem":
+                    actions.append(self._on_problem(st, eventid, now))
+                else:
+                    actions.append(self._on_resolved(st, eventid, now, was_notified))
+            for st in states.values():
+                if st is not None:
+                    self._schedule(st)
+            return actions
+
+        return self.store.update_flaps({self.key_for(c[2], c[3]) for c in changes}, run)
+
+    def due(self, now) -> list:
+        """Prazos vencidos: ('resolved', estado) e ('stable', estado)."""
+        def run(states):
+            events = []
+            for key, st in states.items():
+                last = st["transitions"][-1] if st["transitions"] else 0
+                if st["pending_resolve"] is not None and st["pending_resolve"] <= now and not st["open"]:
+                    st["pending_resolve"] = None
+                    st["notified"] = "ok"
+                    self.stats_counters["notified"] += 1
+                    events.append(("resolved", st))
+                elif st["flapping"] and last + self.stable_after <= now:
+                    st["flapping"] = False
+                    st["transitions"] = []
+                    st["notified"] = "problem" if st["open"] else "ok"
+                    self.stats_counters["flap_ended"] += 1
+                    events.append(("stable", st))
+                elif not st["open"] and not st["flapping"] and st["pending_resolve"] is None:
+                    states[key] = None
+                    continue
+                self._schedule(st)
+            return events
+
+        return self.store.update_due_flaps(now, run)
+
+    def stats(self) -> dict:
+        return {**self.store.flap_stats(), **self.stats_counters}
+
+
+flap_detector = FlapDetector(
+    state_store,
+    window=settings.FLAP_WINDOW,
+    threshold=settings.FLAP_THRESHOLD,
+    holddown=settings.FLAP_HOLDDOWN,
+    stable_after=settings.FLAP_STABLE_AFTER,
+)
+
+async def _attach_routing_meta(problems):
+    """severity/host/tags/grupos que as regras dos canais usam (p['meta'], também gravado no store)."""
+    groups_by_host = {}
+    if problems and notification_service.routing.needs_host_groups:
+        hostids = {h["hostid"] for p in problems for h in p.get("hosts", [])}
+        try:
+            groups_by_host = await zabbix_monitor.host_groups(hostids)
+        except Exception as e:
+            print(f"[Scheduler] Host groups error: {e}")
+    for p in problems:
+        p["meta"] = {
+            "severity": int(p.get("severity") or 0),
+            "host": p.get("host"),
+            "tags": p.get("tags", []),
+            "groups": sorted({g for h in p.get("hosts", []) for g in groups_by_host.get(h["hostid"], [])}),
+        }
+
+async def check_device_status():
     """
     Polls Zabbix for high severity problems and sends notifications.
+    Só busca eventos novos desde o último ciclo; a leitura completa fica para o resync periódico.
     """
-    global active_problems_cache
     print(f"[Scheduler] Checking Zabbix status at {time.strftime('%H:%M:%S')}...")
     
-    problems = zabbix_monitor.get_problems(severity=4) # High or Disaster
+    try:
+        result = await problem_poller.poll() # High or Disaster
+    except Exception as e:
+        # Mantém o estado atual: sem resposta do Zabbix não dá para dizer o que normalizou
+        print(f"[Scheduler] Zabbix poll error: {e}")
+        return
     
-    current_event_ids = set()
+    await _attach_routing_meta(result.new)
     
-    for p in problems:
+    # Só notifica o que este processo registrou primeiro (INSERT OR IGNORE no store)
+    claimed = set(await asyncio.to_thread(state_store.claim_new, result.new))
+    statuses = {}
+    now = time.time()
+    
+    new = [p for p in result.new if p['eventid'] in claimed]
+    changes = [("problem", p['eventid'], p.get('host', 'Unknown Host'), p.get('objectid'),
+                p.get('name', 'Unknown Problem'), p["meta"], False) for p in new]
+    actions = await asyncio.to_thread(flap_detector.apply, changes, now)
+
+    for p, action in zip(new, actions):
         event_id = p['eventid']
-        current_event_ids.add(event_id)
-        
-        # If this is a NEW problem (not in cache)
-        if event_id not in active_problems_cache:
-            name = p.get('name', 'Unknown Problem')
-            host = "Unknown Host" # In a real app, we'd fetch host info too
-            
-            # Send Notification
-            title = f"🔴 ALERTA CRÍTICO: {name}"
-            message = f"Novo problema detectado no Zabbix.\nID: {event_id}\nSeveridade: {p.get('severity')}"
-            
-            notification_service.send_notification(title, message, "critical")
-            
-            # Add to cache
-            active_problems_cache[event_id] = time.time()
-            
-    # Cleanup resolved problems from cache
-    # If an event ID is in cache but NOT in current problems, it's resolved
-    resolved_ids = []
-    for cached_id in active_problems_cache:
-        if cached_id not in current_event_ids:
-            resolved_ids.append(cached_id)
-            
-    for rid in resolved_ids:
-        print(f"[Scheduler] Problem {rid} resolved.")
-        notification_service.send_notification(
-            "✅ Problema Resolvido", 
-            f"O evento {rid} foi normalizado.", 
-            "info"
-        )
-        del active_problems_cache[rid]
+        name = p.get('name', 'Unknown Problem')
+        host = p.get('host', 'Unknown Host')
+
+        if action == "flapping":
+            _notify_flapping(host, name, p["meta"])
+        if action != "notify":
+            statuses[event_id] = STATUS_SUPPRESSED
+            continue
+
+        # Send Notification
+        title = f"🔴 ALERTA CRÍTICO: {name}"
+        message = f"Novo problema detectado no Zabbix.\nHost: {host}\nID: {event_id}\nSeveridade: {p.get('severity')}"
+
+        # Vai para a fila do dispatcher; o status no store é gravado quando a entrega terminar
+        if not notification_dispatcher.enqueue(title, message, "critical", ref=event_id, meta=p["meta"]):
+            statuses[event_id] = STATUS_FAILED
+
+    if statuses:
+        await asyncio.to_thread(state_store.set_status, statuses)
+
+    # Problemas normalizados desde o último ciclo (recuperação ou ausência no resync)
+    resolved_ids = list(result.resolved)
+    if result.active is not None:
+        # No resync também fecha o que normalizou enquanto o processo estava parado
+        known = await asyncio.to_thread(state_store.known_ids)
+        resolved_ids += [eid for eid in known - result.active if eid not in result.resolved]
+
+    rows = await asyncio.to_thread(state_store.claim_resolved, resolved_ids)
+    for row in rows:
+        print(f"[Scheduler] Problem {row['eventid']} resolved.")
+    # Aviso só sai depois do hold-down (ver flap_detector.due)
+    changes = [("resolved", row['eventid'], row.get('host') or 'Unknown Host', row.get('objectid'),
+                row.get('name') or 'Unknown Problem', row.get('meta'), row.get('status') == STATUS_SENT)
+               for row in rows]
+    actions = await asyncio.to_thread(flap_detector.apply, changes, now)
+    for change, action in zip(changes, actions):
+        if action == "flapping":
+            _notify_flapping(change[2], change[4], change[5])
+
+    for kind, st in await asyncio.to_thread(flap_detector.due, now):
+        if kind == "resolved":
+            notification_dispatcher.enqueue(
+                "✅ Problema Resolvido",
+                f"{st['name']} foi normalizado.\nHost: {st['host']}",
+                "info",
+                meta=st['meta']
+            )
+        else:
+            state = "continua em problema" if st['open'] else "está normalizado"
+            notification_dispatcher.enqueue(
+                f"{'🔴' if st['open'] else '✅'} Estabilizou: {st['name']}",
+                f"Parou de oscilar e {state}.\nHost: {st['host']}",
+                "critical" if st['open'] else "info",
+                meta=st['meta']
+            )
+
+def _notify_flapping(host, name, meta):
+    print(f"[Scheduler] Flapping: {host} / {name}")
+    notification_dispatcher.enqueue(
+        f"🟠 Oscilando: {name}",
+        f"O trigger mudou de estado {flap_detector.threshold}+ vezes em {int(flap_detector.window // 60)} min.\n"
+        f"Host: {host}\nNovos avisos deste trigger ficam suspensos até estabilizar.",
+        "warning",
+        meta=meta
+    )
 
 def start_scheduler():
     if not scheduler.running:
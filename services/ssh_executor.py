@@ -0,0 +1,68 @@
+import asyncio
+import functools
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from config import settings
+
+
+class SSHExecutor:
+    """
+    Pool de threads dedicado às operações SSH bloqueantes (paramiko).
+    Os handlers async aguardam o resultado sem travar o event loop, e o
+    número de sessões SSH simultâneas fica limitado a max_workers.
+    """
+
+    def __init__(self, max_workers: int = 32):
+        self.max_workers = max_workers
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="ssh-worker")
+        self._lock = threading.Lock()
+        self._queued = 0
+        self._running = 0
+        self._completed = 0
+        self._failed = 0
+
+    async def run(self, fn, *args, **kwargs):
+        """Executa fn(*args, **kwargs) numa thread do pool e aguarda o resultado."""
+        with self._lock:
+            self._queued += 1
+        fut = self._executor.submit(functools.partial(self._tracked, fn, *args, **kwargs))
+        fut.add_done_callback(self._dequeue_cancelled)
+        return await asyncio.wrap_future(fut)
+
+    def _dequeue_cancelled(self, fut):
+        # Cancelado antes de rodar (shutdown(cancel_futures=True) ou await cancelado): _tracked não vai descontar
+        if fut.cancelled():
+            with self._lock:
+                self._queued -= 1
+
+    def _tracked(self, fn, *args, **kwargs):
+        with self._lock:
+            self._queued -= 1
+            self._running += 1
+        try:
+            result = fn(*args, **kwargs)
+        except Exception:
+            with self._lock:
+                self._failed += 1
+            raise
+        finally:
+            with self._lock:
+                self._running -= 1
+                self._completed += 1
+        return result
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "max_workers": self.max_workers,
+                "running": self._running,
+                "queued": self._queued,
+                "completed": self._completed,
+                "failed": self._failed,
+            }
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+
+ssh_executor = SSHExecutor(max_workers=settings.SSH_MAX_CONCURRENCY)
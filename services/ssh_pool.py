@@ -0,0 +1,326 @@
+import hashlib
+import hmac
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, List, Optional, Tuple
+from config import settings
+from services.ssh_reader import PromptReader, PromptTimeout
+
+# Comandos que mudam o modo do shell (config mode); sessões que rodaram
+# algum deles não voltam ao pool para não vazar estado para outro operador.
+# Comparados com a primeira palavra do comando (com as abreviações usuais), para
+# que "sysname"/"system ..." ou "interfaces" não descartem a sessão à toa.
+MODE_CHANGING_COMMANDS = frozenset({"configure", "config", "conf", "system-view", "sys", "interface", "int"})
+
+
+def changes_mode(cmd: str) -> bool:
+    words = cmd.split(None, 1)
+    return bool(words) and words[0].lower() in MODE_CHANGING_COMMANDS
+
+
+def _secret_digest(password: str) -> bytes:
+    return hashlib.sha256((password or "").encode("utf-8")).digest()
+
+
+class PooledSession:
+    """
+    Sessão SSH interativa já autenticada, com paginação desabilitada.
+    Não é thread-safe: o pool garante que só um chamador a usa por vez.
+    """
+
+    def __init__(self, host: str, username: str, password: str, connect_timeout: int = 20):
+        self.host = host
+        self.username = username
+        self._secret = _secret_digest(password)
+        self.created_at = time.time()
+        self.last_used = self.created_at
+        self.last_checked = self.created_at
+        self.uses = 0
+        self.dirty = False
+
+        import paramiko  # ~100 ms de import: fica para a primeira conexão, fora do startup
+        self.client = paramiko.SSHClient()
+        self.client.set_missing_host_key_policy(paramiko.AutoAddPolicy())
+        self.client.connect(host, username=username, password=password,
+                            timeout=connect_timeout, banner_timeout=connect_timeout,
+                            allow_agent=False, look_for_keys=False)
+        try:
+            self.chan = self.client.invoke_shell()
+            self.reader = PromptReader(self.chan)
+            self._prepare_shell()
+        except Exception:
+            self.client.close()
+            raise
+
+    def _prepare_shell(self):
+        self.prompt = self.reader.learn_prompt()
+        # Disable paging - Cisco IOS e Huawei (VRP); o erro do comando do outro fabricante é ignorado
+        for cmd in ("terminal length 0", "screen-length 0 temporary"):
+            self.reader.send_command(cmd, timeout=5.0)
+
+    def matches(self, password: str) -> bool:
+        """Só reutiliza a sessão para quem apresentar a mesma senha que a autenticou."""
+        return hmac.compare_digest(self._secret, _secret_digest(password))
+
+    def is_alive(self) -> bool:
+        transport = self.client.get_transport()
+        if not transport or not transport.is_active():
+            return False
+        if self.chan.closed or self.chan.eof_received:
+            return False
+        return True
+
+    def health_check(self) -> bool:
+        """Checagem ativa: envia um SSH_MSG_IGNORE para detectar conexões mortas."""
+        if not self.is_alive():
+            return False
+        try:
+            self.client.get_transport().send_ignore()
+        except Exception:
+            return False
+        self.last_checked = time.time()
+        return True
+
+    def run(self, cmd: str, timeout: Optional[float] = None) -> str:
+        """
+        Envia um comando e devolve a saída bruta decodificada, lida até o prompt.
+        Em timeout devolve a saída parcial e marca a sessão para não voltar ao pool.
+        """
+        self.uses += 1
+        if changes_mode(cmd):
+            self.dirty = True
+        try:
+            output = self.reader.send_command(cmd, timeout or settings.SSH_COMMAND_TIMEOUT)
+        except PromptTimeout as e:
+            # Saída restante chegaria no próximo comando de outro chamador
+            self.dirty = True
+            output = e.partial
+        self.last_used = time.time()
+        return output
+
+    def close(self):
+        try:
+            self.client.close()
+        except Exception:
+            pass
+
+
+class SSHSessionPool:
+    """
+    Pool de sessões SSH interativas indexado por (host, usuário).
+    Repetir comandos no mesmo switch reaproveita a sessão já autenticada,
+    evitando o handshake TCP+KEX+auth e o setup de paginação.
+    """
+
+    def __init__(self, idle_timeout: int = 300, max_per_host: int = 2, health_interval: int = 30):
+        self.idle_timeout = idle_timeout
+        self.max_per_host = max_per_host
+        self.health_interval = health_interval
+        self._idle: Dict[Tuple[str, str], List[PooledSession]] = {}
+        self._open_per_host: Dict[str, int] = {}
+        self._cond = threading.Condition()
+        self._reaper: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+        self._stats = {"created": 0, "reused": 0, "evicted": 0, "discarded": 0, "failed": 0}
+
+    # ── Ciclo de vida ─────────────────────────────────────────────────────
+    def start(self):
+        if self._reaper and self._reaper.is_alive():
+            return
+        self._stop.clear()
+        self._reaper = threading.Thread(target=self._reap_loop, name="ssh-pool-reaper", daemon=True)
+        self._reaper.start()
+
+    def shutdown(self):
+        self._stop.set()
+        with self._cond:
+            sessions = [s for lst in self._idle.values() for s in lst]
+            self._idle.clear()
+            for s in sessions:
+                self._forget(s)
+            self._cond.notify_all()
+        for s in sessions:
+            s.close()
+
+    def _reap_loop(self):
+        while not self._stop.wait(min(self.idle_timeout, 30)):
+            self.evict_idle()
+
+    # ── Aquisição / devolução ─────────────────────────────────────────────
+    def acquire(self, host: str, username: str, password: str, wait_timeout: float = 30.0) -> PooledSession:
+        key = (host, username)
+        deadline = time.time() + wait_timeout
+        while True:
+            stale: List[PooledSession] = []
+            found: Optional[PooledSession] = None
+            check = False
+            reserved = False
+            timed_out = False
+            with self._cond:
+                idle = self._idle.get(key, [])
+                # Sessões autenticadas com outra senha ficam no pool, mas não são entregues
+                for sess in reversed([s for s in idle if s.matches(password)]):
+                    idle.remove(sess)
+                    if not sess.is_alive():
+                        stale.append(sess)
+                    else:
+                        found = sess
+                        # A checagem ativa vai pela rede: roda fora do lock, com a sessão já fora da fila
+                        check = time.time() - sess.last_checked > self.health_interval
+                        break
+                if not idle:
+                    self._idle.pop(key, None)
+                for s in stale:
+                    self._forget(s)
+                self._stats["discarded"] += len(stale)
+
+                if not found and self._open_per_host.get(host, 0) >= self.max_per_host:
+                    # Limite atingido: libera uma sessão ociosa de outro usuário no mesmo host
+                    victim = self._pop_idle_for_host(host)
+                    if victim:
+                        self._forget(victim)
+                        self._stats["evicted"] += 1
+                        stale.append(victim)
+
+                if found:
+                    if not check:
+                        self._stats["reused"] += 1
+                elif self._open_per_host.get(host, 0) < self.max_per_host:
+                    # Reserva o slot antes de conectar fora do lock
+                    self._open_per_host[host] = self._open_per_host.get(host, 0) + 1
+                    reserved = True
+                else:
+                    remaining = deadline - time.time()
+                    if remaining <= 0:
+                        timed_out = True
+                    else:
+                        self._cond.wait(remaining)
+
+            for s in stale:
+                s.close()
+            if timed_out:
+                raise TimeoutError(f"SSH pool: limite de {self.max_per_host} sessões para {host} atingido")
+            if found and check:
+                healthy = found.health_check()
+                with self._cond:
+                    if healthy:
+                        self._stats["reused"] += 1
+                    else:
+                        self._forget(found)
+                        self._stats["discarded"] += 1
+                if not healthy:
+                    found.close()
+                    continue
+            if found:
+                return found
+            if not reserved:
+                continue
+
+            try:
+                sess = PooledSession(host, username, password)
+            except Exception:
+                with self._cond:
+                    self._release_slot(host)
+                    self._stats["failed"] += 1
+                raise
+            with self._cond:
+                self._stats["created"] += 1
+            return sess
+
+    def release(self, sess: PooledSession, healthy: bool = True):
+        reusable = healthy and not sess.dirty and sess.is_alive()
+        with self._cond:
+            if reusable:
+                sess.last_used = time.time()
+                self._idle.setdefault((sess.host, sess.username), []).append(sess)
+            else:
+                self._forget(sess)
+                self._stats["discarded"] += 1
+            self._cond.notify_all()
+        if not reusable:
+            sess.close()
+
+    @contextmanager
+    def session(self, host: str, username: str, password: str):
+        sess = self.acquire(host, username, password)
+        healthy = False
+        try:
+            yield sess
+            healthy = True
+        finally:
+            self.release(sess, healthy=healthy)
+
+    # ── Manutenção ────────────────────────────────────────────────────────
+    def evict_idle(self) -> int:
+        now = time.time()
+        expired = []
+        with self._cond:
+            for key, lst in list(self._idle.items()):
+                keep = []
+                for s in lst:
+                    if now - s.last_used > self.idle_timeout or not s.is_alive():
+                        expired.append(s)
+                    else:
+                        keep.append(s)
+                if keep:
+                    self._idle[key] = keep
+                else:
+                    del self._idle[key]
+            for s in expired:
+                self._forget(s)
+            self._stats["evicted"] += len(expired)
+            if expired:
+                self._cond.notify_all()
+        for s in expired:
+            s.close()
+        return len(expired)
+
+    def stats(self) -> dict:
+        with self._cond:
+            idle_total = sum(len(v) for v in self._idle.values())
+            open_total = sum(self._open_per_host.values())
+            return {
+                "idle_timeout": self.idle_timeout,
+                "max_per_host": self.max_per_host,
+                "open": open_total,
+                "idle": idle_total,
+                "in_use": open_total - idle_total,
+                "hosts": {
+                    host: {
+                        "open": count,
+                        "idle": sum(len(v) for (h, _), v in self._idle.items() if h == host),
+                    }
+                    for host, count in self._open_per_host.items()
+                },
+                **self._stats,
+            }
+
+    # ── Helpers internos (chamar com o lock) ──────────────────────────────
+    def _release_slot(self, host: str):
+        count = self._open_per_host.get(host, 0) - 1
+        if count > 0:
+            self._open_per_host[host] = count
+        else:
+            self._open_per_host.pop(host, None)
+        self._cond.notify_all()
+
+    def _forget(self, sess: PooledSession):
+        self._release_slot(sess.host)
+
+    def _pop_idle_for_host(self, host: str) -> Optional[PooledSession]:
+        candidates = [(k, s) for k, lst in self._idle.items() if k[0] == host for s in lst]
+        if not candidates:
+            return None
+        key, victim = min(candidates, key=lambda ks: ks[1].last_used)
+        self._idle[key].remove(victim)
+        if not self._idle[key]:
+            del self._idle[key]
+        return victim
+
+
+ssh_pool = SSHSessionPool(
+    idle_timeout=settings.SSH_POOL_IDLE_TIMEOUT,
+    max_per_host=settings.SSH_POOL_MAX_PER_HOST,
+    health_interval=settings.SSH_POOL_HEALTH_INTERVAL,
+)
@@ -0,0 +1,117 @@
+import re
+import select
+import time
+from typing import Optional
+
+# Prompt genérico (Cisco "SW#", "SW(config)#", "SW>"; Huawei "<SW>", "[SW]"; FortiOS "FG # ")
+GENERIC_PROMPT_RE = re.compile(rb'(?:^|[\r\n])[<\[]?[\w\-.:/@~]+(?:\([\w\-./]+\))?\s?[#>$\]]\s*$')
+MORE_RE = re.compile(rb'-+\s*More\s*-+|<--- More --->', re.IGNORECASE)
+MORE_TEXT_RE = re.compile(r'\s*(?:-+\s*More\s*-+|<--- More --->)[\x08 ]*', re.IGNORECASE)
+TAIL_BYTES = 512
+
+
+def prompt_hostname(prompt: str) -> str:
+    """Hostname contido no prompt: "<SW-01>", "[~SW-01]", "SW-01(config)#" → "SW-01"."""
+    base = re.sub(r'^[<\[~*]+|[#>$\]]\s*$', '', prompt.strip())
+    return re.sub(r'\(.*\)$', '', base).strip()
+
+
+class PromptTimeout(Exception):
+    """O prompt não reapareceu dentro do tempo limite do comando."""
+
+    def __init__(self, partial: str):
+        super().__init__("prompt não encontrado dentro do timeout")
+        self.partial = partial
+
+
+class PromptDetectionError(Exception):
+    """O dispositivo não devolveu um prompt reconhecível depois do login."""
+
+
+class PromptReader:
+    """
+    Leitor de canal SSH interativo guiado pelo prompt do dispositivo.
+    Aprende o prompt depois do login e lê cada comando até o prompt reaparecer,
+    bloqueando em select() em vez de fazer polling com sleep.
+    """
+
+    def __init__(self, chan, read_size: int = 65536):
+        self.chan = chan
+        self.read_size = read_size
+        self.prompt: Optional[str] = None
+        self._prompt_re = GENERIC_PROMPT_RE
+
+    def learn_prompt(self, timeout: float = 10.0) -> str:
+        """
+        Descarta banner/MOTD e aprende o prompt a partir da resposta a um ENTER.
+        """
+        try:
+            self._read_until(GENERIC_PROMPT_RE, min(timeout, 3.0))
+        except PromptTimeout:
+            pass
+        # A última linha da resposta a um ENTER é o prompt (evita confundir com o banner).
+        # Banner lento ou leitura vazia: tenta mais um ENTER antes de desistir.
+        last_line = ""
+        for _ in range(2):
+            self.chan.send("\n")
+            try:
+                echo = self._read_until(GENERIC_PROMPT_RE, timeout)
+            except PromptTimeout as e:
+                if e.partial.strip():
+                    raise
+                echo = ""
+            lines = echo.replace("\r", "\n").rstrip().splitlines()
+            last_line = lines[-1].strip() if lines else ""
+            if last_line:
+                break
+        if not last_line:
+            raise PromptDetectionError("prompt do dispositivo não detectado após o login")
+        self.prompt = last_line
+        self._prompt_re = self._compile_prompt(last_line)
+        return last_line
+
+    @staticmethod
+    def _compile_prompt(prompt: str):
+        # Ancora no hostname: aceita variações de modo ("SW(config-if)#", "[~SW-Gi0/1]")
+        base = prompt_hostname(prompt)
+        if not base:
+            return GENERIC_PROMPT_RE
+        return re.compile(
+            rb'(?:^|[\r\n])[<\[~*]*' + re.escape(base.encode('utf-8', errors='replace'))
+            + rb'[^\r\n]{0,48}?[#>$\]]\s*$'
+        )
+
+    def send_command(self, cmd: str, timeout: float = 30.0) -> str:
+        """Envia um comando e devolve a saída bruta até (e incluindo) o prompt."""
+        # Encode to latin-1 to avoid character corruption on legacy devices
+        try:
+            payload = cmd.encode('latin-1') + b"\n"
+        except UnicodeEncodeError:
+            payload = cmd.encode('utf-8') + b"\n"
+        self.chan.send(payload)
+        return MORE_TEXT_RE.sub("\n", self._read_until(self._prompt_re, timeout))
+
+    def _read_until(self, pattern, timeout: float) -> str:
+        chunks = []
+        tail = b""
+        deadline = time.monotonic() + timeout
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise PromptTimeout(b"".join(chunks).decode('utf-8', errors='replace'))
+            readable, _, _ = select.select([self.chan], [], [], remaining)
+            if not readable:
+                continue
+            data = self.chan.recv(self.read_size)
+            if not data:
+                # Canal fechado pelo dispositivo
+                return b"".join(chunks).decode('utf-8', errors='replace')
+            chunks.append(data)
+            tail = (tail + data)[-TAIL_BYTES:]
+            if MORE_RE.search(tail):
+                # Paginação não desabilitada: avança a página
+                self.chan.send(" ")
+                tail = b""
+                continue
+            if pattern.search(tail):
+                return b"".join(chunks).decode('utf-8', errors='replace')
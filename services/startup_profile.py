@@ -0,0 +1,159 @@
+import importlib
+import json
+import os
+import re
+import subprocess
+import sys
+import threading
+import time
+from typing import Any, Dict, List, Optional
+from config import settings
+
+# Módulos pesados que ficam fora do caminho de startup (importados no primeiro uso)
+LAZY_MODULES = ("paramiko", "httpcore", "pandas", "openpyxl")
+
+_IMPORTTIME_LINE = re.compile(r"^import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s+)(\S+)$")
+
+
+def _ms(seconds: float) -> float:
+    return round(seconds * 1000, 1)
+
+
+class StartupProfile:
+    """
+    Tempo do import do main.py até o app ficar pronto (fim do startup do lifespan),
+    por fase, comparado com STARTUP_BUDGET_MS. O perfil por módulo (-X importtime)
+    é gerado sob demanda num processo separado, sem pesar no startup.
+    """
+
+    def __init__(self, budget_ms: int, prewarm: str = ""):
+        self.budget_ms = budget_ms
+        self.prewarm_modules = [m.strip() for m in prewarm.split(",") if m.strip()]
+        self.phases: List[Dict[str, Any]] = []
+        self.prewarmed: Dict[str, Any] = {}
+        self.ready_ms: Optional[float] = None
+        self._started: Optional[float] = None
+        self._last: Optional[float] = None
+        self._import_profile: Optional[Dict[str, Any]] = None
+        self._lock = threading.Lock()
+
+    def start(self, started: float):
+        """started: time.perf_counter() da primeira linha do main.py."""
+        self._started = self._last = started
+
+    def mark(self, phase: str):
+        if self._last is None:
+            return
+        now = time.perf_counter()
+        self.phases.append({"phase": phase, "ms": _ms(now - self._last)})
+        self._last = now
+
+    def ready(self):
+        if self._started is None:
+            return
+        self.ready_ms = _ms(time.perf_counter() - self._started)
+        if self.budget_ms and self.ready_ms > self.budget_ms:
+            slowest = max(self.phases, key=lambda p: p["ms"]) if self.phases else None
+            print(f"[Startup] Pronto em {self.ready_ms} ms, acima do orçamento de {self.budget_ms} ms"
+                  + (f" (fase mais lenta: {slowest['phase']} {slowest['ms']} ms)" if slowest else ""))
+        else:
+            print(f"[Startup] Pronto em {self.ready_ms} ms")
+        if self.prewarm_modules:
+            # Depois do app pronto: o primeiro SSH/HTTP não paga o import no event loop
+            threading.Thread(target=self._prewarm, name="startup-prewarm", daemon=True).start()
+
+    def _prewarm(self):
+        for name in self.prewarm_modules:
+            started = time.perf_counter()
+            try:
+                importlib.import_module(name)
+                self.prewarmed[name] = _ms(time.perf_counter() - started)
+            except Exception as e:
+                self.prewarmed[name] = f"erro: {e}"
+
+    def import_profile(self, top: int = 25) -> Dict[str, Any]:
+        """
+        Roda `python -X importtime -c "import main"` num processo novo e devolve os
+        módulos mais caros. O resultado fica guardado: o código não muda com o processo no ar.
+        """
+        with self._lock:
+            if self._import_profile is None:
+                self._import_profile = self._run_importtime()
+        profile = self._import_profile
+        return {**profile, "top_level": profile["top_level"][:top], "slowest": profile["slowest"][:top]}
+
+    @staticmethod
+    def _run_importtime() -> Dict[str, Any]:
+        root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        started = time.perf_counter()
+        proc = subprocess.run([sys.executable, "-X", "importtime", "-c", "import main"],
+                              cwd=root, capture_output=True, text=True, timeout=120)
+        modules = []
+        for line in proc.stderr.splitlines():
+            m = _IMPORTTIME_LINE.match(line)
+            if m:
+                modules.append({
+                    "module": m.group(4),
+                    "depth": (len(m.group(3)) - 1) // 2,
+                    "self_ms": round(int(m.group(1)) / 1000, 1),
+                    "cumulative_ms": round(int(m.group(2)) / 1000, 1),
+                })
+        main_entry = next((m for m in modules if m["module"] == "main"), None)
+        return {
+            "returncode": proc.returncode,
+            "wall_ms": _ms(time.perf_counter() - started),
+            "main_cumulative_ms": main_entry["cumulative_ms"] if main_entry else None,
+            # Imports diretos do main.py, pelo custo total de cada um
+            "top_level": sorted((m for m in modules if m["depth"] == 1),
+                                key=lambda m: m["cumulative_ms"], reverse=True),
+            "slowest": sorted(modules, key=lambda m: m["self_ms"], reverse=True),
+        }
+
+    def stats(self) -> dict:
+        return {
+            "import_to_ready_ms": self.ready_ms,
+            "budget_ms": self.budget_ms,
+            "within_budget": None if self.ready_ms is None or not self.budget_ms else self.ready_ms <= self.budget_ms,
+            "phases": self.phases,
+            "lazy_modules_loaded": {m: m in sys.modules for m in LAZY_MODULES},
+            "prewarmed": self.prewarmed,
+        }
+
+
+startup_profile = StartupProfile(settings.STARTUP_BUDGET_MS, settings.STARTUP_PREWARM_IMPORTS)
+
+
+_BENCH_CHILD = """
+import asyncio, json
+import main
+from services.startup_profile import startup_profile
+async def go():
+    async with main.app.router.lifespan_context(main.app):
+        print("STARTUP_STATS " + json.dumps(startup_profile.stats()))
+asyncio.run(go())
+"""
+
+
+if __name__ == "__main__":
+    # Regressão do startup: python -m services.startup_profile [orçamento_ms] [rodadas]
+    # Sobe o app (import + lifespan) em processos novos e falha se a mediana passar do orçamento.
+    budget = int(sys.argv[1]) if len(sys.argv) > 1 else settings.STARTUP_BUDGET_MS
+    rounds = int(sys.argv[2]) if len(sys.argv) > 2 else 5
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    samples = []
+    for _ in range(rounds):
+        proc = subprocess.run([sys.executable, "-c", _BENCH_CHILD], cwd=root, capture_output=True,
+                              text=True, timeout=120, env={**os.environ, "STARTUP_PREWARM_IMPORTS": ""})
+        line = next((l for l in proc.stdout.splitlines() if l.startswith("STARTUP_STATS ")), None)
+        if line is None:
+            print(proc.stdout, proc.stderr)
+            sys.exit(2)
+        stats = json.loads(line[len("STARTUP_STATS "):])
+        samples.append(stats["import_to_ready_ms"])
+    samples.sort()
+    median = samples[len(samples) // 2]
+    print(f"import->ready: mediana {median} ms (min {samples[0]}, max {samples[-1]}) em {rounds} rodadas; "
+          f"orçamento {budget} ms")
+    print("fases (última rodada):", ", ".join(f"{p['phase']}={p['ms']}" for p in stats["phases"]))
+    print("módulos pesados carregados no startup:", [m for m, loaded in stats["lazy_modules_loaded"].items() if loaded] or "nenhum")
+    sys.exit(0 if median <= budget and not any(stats["lazy_modules_loaded"].values()) else 1)
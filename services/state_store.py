@@ -0,0 +1,356 @@
+import json
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+from typing import Any, Callable, Dict, Iterable, List, Optional
+from config import settings
+
+# Status de notificação de cada problema conhecido
+STATUS_PENDING = "pending"
+STATUS_SENT = "sent"
+STATUS_FAILED = "failed"
+STATUS_SUPPRESSED = "suppressed"   # dedup/flapping: não virou alerta
+
+
+class ProblemStateStore(ABC):
+    """
+    Interface do estado de problemas do scheduler (eventid -> first_seen/status).
+    As operações de escrita recebem o lote inteiro de um ciclo e os métodos claim_*
+    devolvem só os eventids que ESTE processo deve notificar: com vários workers
+    ou após um restart, quem já registrou o problema não alerta de novo.
+    """
+
+    backend = "base"
+
+    def open(self):
+        pass
+
+    def close(self):
+        pass
+
+    @abstractmethod
+    def load(self) -> Dict[str, dict]:
+        ...
+
+    @abstractmethod
+    def known_ids(self) -> set:
+        ...
+
+    @abstractmethod
+    def claim_new(self, problems: List[dict]) -> List[str]:
+        ...
+
+    @abstractmethod
+    def set_status(self, statuses: Dict[str, str]):
+        ...
+
+    @abstractmethod
+    def claim_resolved(self, eventids: Iterable[str]) -> List[dict]:
+        """Remove os eventids e devolve os registros removidos (com o meta de roteamento)."""
+
+    # Estado de flapping por host+trigger (ver FlapDetector): cada estado é um dict
+    # serializável em JSON, com "next_due" (próximo prazo, ou None) e "flapping".
+
+    @abstractmethod
+    def update_flaps(self, keys: Iterable[str], fn: Callable[[Dict[str, Optional[dict]]], Any]) -> Any:
+        """
+        Lê os estados das chaves, chama fn({chave: estado ou None}) e grava o resultado,
+        tudo numa transação: com vários workers as decisões de flapping não se cruzam.
+        fn altera o dict; chaves com None são apagadas. Devolve o retorno de fn.
+        """
+
+    @abstractmethod
+    def update_due_flaps(self, now: float, fn: Callable[[Dict[str, Optional[dict]]], Any]) -> Any:
+        """Como update_flaps, para os estados cujo next_due já venceu."""
+
+    @abstractmethod
+    def flap_stats(self) -> dict:
+        ...
+
+    def stats(self) -> dict:
+        return {"backend": self.backend, "known_problems": len(self.known_ids())}
+
+
+def _record(p: dict, now: float) -> dict:
+    return {
+        "eventid": p["eventid"],
+        "objectid": p.get("objectid"),
+        "host": p.get("host"),
+        "name": p.get("name"),
+        "severity": int(p.get("severity") or 0),
+        "first_seen": now,
+        "status": STATUS_PENDING,
+        "notified_at": None,
+        # severity/host/groups/tags do alerta original: a normalização segue para os mesmos canais
+        "meta": json.dumps(p.get("meta") or {}),
+    }
+
+
+def _row_to_dict(row) -> dict:
+    d = dict(row)
+    d["meta"] = json.loads(d.get("meta") or "{}")
+    return d
+
+
+class MemoryStateStore(ProblemStateStore):
+    """Estado só em memória: não sobrevive a restart nem é compartilhado entre workers."""
+
+    backend = "memory"
+
+    def __init__(self):
+        self._rows: Dict[str, dict] = {}
+        self._flaps: Dict[str, str] = {}     # chave -> estado em JSON (cópia, como no SQLite)
+        self._lock = threading.Lock()
+
+    def load(self) -> Dict[str, dict]:
+        with self._lock:
+            return {k: _row_to_dict(v) for k, v in self._rows.items()}
+
+    def known_ids(self) -> set:
+        with self._lock:
+            return set(self._rows)
+
+    def claim_new(self, problems: List[dict]) -> List[str]:
+        now = time.time()
+        claimed = []
+        with self._lock:
+            for p in problems:
+                if p["eventid"] not in self._rows:
+                    self._rows[p["eventid"]] = _record(p, now)
+                    claimed.append(p["eventid"])
+        return claimed
+
+    def set_status(self, statuses: Dict[str, str]):
+        now = time.time()
+        with self._lock:
+            for eventid, status in statuses.items():
+                row = self._rows.get(eventid)
+                if row is not None:
+                    row["status"] = status
+                    row["notified_at"] = now if status == STATUS_SENT else row["notified_at"]
+
+    def claim_resolved(self, eventids: Iterable[str]) -> List[dict]:
+        with self._lock:
+            removed = [self._rows.pop(eid, None) for eid in eventids]
+        return [_row_to_dict(r) for r in removed if r is not None]
+
+    def _update_flaps(self, keys, fn):
+        states = {k: json.loads(self._flaps[k]) if k in self._flaps else None for k in keys}
+        result = fn(states)
+        for key, st in states.items():
+            if st is None:
+                self._flaps.pop(key, None)
+            else:
+                self._flaps[key] = json.dumps(st)
+        return result
+
+    def update_flaps(self, keys: Iterable[str], fn: Callable[[Dict[str, Optional[dict]]], Any]) -> Any:
+        with self._lock:
+            return self._update_flaps(list(keys), fn)
+
+    def update_due_flaps(self, now: float, fn: Callable[[Dict[str, Optional[dict]]], Any]) -> Any:
+        with self._lock:
+            due = []
+            for key, value in self._flaps.items():
+                next_due = json.loads(value).get("next_due")
+                if next_due is not None and next_due <= now:
+                    due.append(key)
+            return self._update_flaps(due, fn)
+
+    def flap_stats(self) -> dict:
+        with self._lock:
+            states = [json.loads(v) for v in self._flaps.values()]
+        return {"tracked_keys": len(states), "flapping": sum(1 for st in states if st.get("flapping")),
+                "scheduled": sum(1 for st in states if st.get("next_due") is not None)}
+
+
+class SQLiteStateStore(ProblemStateStore):
+    """
+    Estado em SQLite (modo WAL), compartilhado entre workers do uvicorn e entre restarts.
+    Cada lote é uma única transação; INSERT OR IGNORE / DELETE decidem qual
+    processo "ganhou" cada eventid.
+    """
+
+    backend = "sqlite"
+
+    def __init__(self, path: str):
+        self.path = path
+        self._conn: Optional[sqlite3.Connection] = None
+        self._lock = threading.RLock()
+
+    @property
+    def conn(self) -> sqlite3.Connection:
+        if self._conn is None:
+            self.open()
+        return self._conn
+
+    def open(self):
+        with self._lock:
+            if self._conn is not None:
+                return
+            conn = sqlite3.connect(self.path, timeout=10, isolation_level=None, check_same_thread=False)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS problems (
+                    eventid     TEXT PRIMARY KEY,
+                    objectid    TEXT,
+                    host        TEXT,
+                    name        TEXT,
+                    severity    INTEGER,
+                    first_seen  REAL NOT NULL,
+                    status      TEXT NOT NULL,
+                    notified_at REAL,
+                    meta        TEXT
+                )
+            """)
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS flap_state (
+                    key      TEXT PRIMARY KEY,
+                    state    TEXT NOT NULL,
+                    next_due REAL,
+                    flapping INTEGER NOT NULL DEFAULT 0
+                )
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS flap_state_next_due ON flap_state (next_due)")
+            columns = {r[1] for r in conn.execute("PRAGMA table_info(problems)")}
+            if "meta" not in columns:
+                # Bancos criados antes do roteamento por canal
+                conn.execute("ALTER TABLE problems ADD COLUMN meta TEXT")
+            self._conn = conn
+        print(f"[StateStore] SQLite em {self.path} ({len(self.known_ids())} problemas conhecidos)")
+
+    def close(self):
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+    def _transaction(self, fn):
+        conn = self.conn
+        with self._lock:
+            # IMMEDIATE pega o lock de escrita já no início: outro worker espera em vez de falhar no meio
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                result = fn(conn)
+                conn.execute("COMMIT")
+                return result
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+
+    def load(self) -> Dict[str, dict]:
+        with self._lock:
+            rows = self.conn.execute("SELECT * FROM problems").fetchall()
+        return {r["eventid"]: _row_to_dict(r) for r in rows}
+
+    def known_ids(self) -> set:
+        with self._lock:
+            return {r[0] for r in self.conn.execute("SELECT eventid FROM problems")}
+
+    def claim_new(self, problems: List[dict]) -> List[str]:
+        if not problems:
+            return []
+        now = time.time()
+
+        def insert(conn):
+            claimed = []
+            for p in problems:
+                r = _record(p, now)
+                cur = conn.execute(
+                    "INSERT OR IGNORE INTO problems (eventid, objectid, host, name, severity, first_seen, "
+                    "status, notified_at, meta) VALUES (:eventid, :objectid, :host, :name, :severity, "
+                    ":first_seen, :status, :notified_at, :meta)", r)
+                if cur.rowcount == 1:
+                    claimed.append(r["eventid"])
+            return claimed
+
+        return self._transaction(insert)
+
+    def set_status(self, statuses: Dict[str, str]):
+        if not statuses:
+            return
+        now = time.time()
+        self._transaction(lambda conn: conn.executemany(
+            "UPDATE problems SET status = ?, notified_at = CASE WHEN ? = 'sent' THEN ? ELSE notified_at END "
+            "WHERE eventid = ?",
+            [(status, status, now, eventid) for eventid, status in statuses.items()],
+        ))
+
+    def claim_resolved(self, eventids: Iterable[str]) -> List[dict]:
+        eventids = list(eventids)
+        if not eventids:
+            return []
+
+        def delete(conn):
+            removed = []
+            for eid in eventids:
+                # Dentro do BEGIN IMMEDIATE: nenhum outro worker apaga entre o SELECT e o DELETE
+                row = conn.execute("SELECT * FROM problems WHERE eventid = ?", (eid,)).fetchone()
+                if row is not None:
+                    conn.execute("DELETE FROM problems WHERE eventid = ?", (eid,))
+                    removed.append(_row_to_dict(row))
+            return removed
+
+        return self._transaction(delete)
+
+    @staticmethod
+    def _write_flaps(conn, states: Dict[str, Optional[dict]]):
+        for key, st in states.items():
+            if st is None:
+                conn.execute("DELETE FROM flap_state WHERE key = ?", (key,))
+            else:
+                conn.execute("INSERT OR REPLACE INTO flap_state (key, state, next_due, flapping) VALUES (?, ?, ?, ?)",
+                             (key, json.dumps(st), st.get("next_due"), int(bool(st.get("flapping")))))
+
+    def update_flaps(self, keys: Iterable[str], fn: Callable[[Dict[str, Optional[dict]]], Any]) -> Any:
+        keys = list(keys)
+
+        def run(conn):
+            states: Dict[str, Optional[dict]] = {k: None for k in keys}
+            for i in range(0, len(keys), 500):
+                chunk = keys[i:i + 500]
+                for row in conn.execute(f"SELECT key, state FROM flap_state WHERE key IN ({','.join('?' * len(chunk))})",
+                                        chunk):
+                    states[row[0]] = json.loads(row[1])
+            result = fn(states)
+            self._write_flaps(conn, states)
+            return result
+
+        return self._transaction(run)
+
+    def update_due_flaps(self, now: float, fn: Callable[[Dict[str, Optional[dict]]], Any]) -> Any:
+        def run(conn):
+            rows = conn.execute("SELECT key, state FROM flap_state WHERE next_due <= ?", (now,)).fetchall()
+            states = {row[0]: json.loads(row[1]) for row in rows}
+            result = fn(states)
+            self._write_flaps(conn, states)
+            return result
+
+        return self._transaction(run)
+
+    def flap_stats(self) -> dict:
+        with self._lock:
+            row = self.conn.execute("SELECT COUNT(*), COALESCE(SUM(flapping), 0), COUNT(next_due) FROM flap_state").fetchone()
+        return {"tracked_keys": row[0], "flapping": row[1], "scheduled": row[2]}
+
+    def stats(self) -> dict:
+        with self._lock:
+            rows = self.conn.execute("SELECT status, COUNT(*) FROM problems GROUP BY status").fetchall()
+        by_status = {r[0]: r[1] for r in rows}
+        return {"backend": self.backend, "path": self.path,
+                "known_problems": sum(by_status.values()), "by_status": by_status}
+
+
+def build_state_store() -> ProblemStateStore:
+    backend = settings.STATE_STORE_BACKEND.lower()
+    if backend == "memory":
+        return MemoryStateStore()
+    if backend != "sqlite":
+        print(f"[StateStore] Backend '{settings.STATE_STORE_BACKEND}' desconhecido; usando sqlite")
+    return SQLiteStateStore(settings.STATE_STORE_PATH)
+
+
+state_store = build_state_store()
@@ -1,19 +1,23 @@
-import random
+import asyncio
+import time
+from typing import Dict, Tuple
 from config import settings
 from services.discovery import discovery_service
+from services.neighbor_parser import classify_device
+from services.ssh_executor import ssh_executor
+from services.zabbix_monitor import zabbix_monitor
 
 class TopologyService:
     def __init__(self):
-        pass
+        self._realtime: Dict[str, Tuple[float, dict]] = {}   # store_id -> (expira em, grafo)
+        self._locks: Dict[str, asyncio.Lock] = {}
 
     def get_topology_data(self, store_id=None, mode="mock"):
         """
         Generates the network topology graph (Nodes and Edges).
         If store_id is provided, generates a topology specific to that store.
+        (mode=realtime é async: ver get_realtime_topology)
         """
-        if mode == "realtime" and store_id:
-            return self.get_realtime_topology(store_id)
-
         nodes = []
         edges = []
 
@@ -42,82 +46,70 @@ class TopologyService:
 
         return {"nodes": nodes, "edges": edges}
 
-    def get_realtime_topology(self, store_id):
+    async def get_realtime_topology(self, store_id: str, refresh: bool = False) -> dict:
         """
-        Performs real-time discovery using SSH.
+        Descoberta CDP/LLDP real a partir dos equipamentos de rede da loja no Zabbix
+        (host group = código da loja), todos como seeds de uma única BFS paralela.
+        O grafo fica em cache por loja por TOPOLOGY_REALTIME_TTL; requisições
+        simultâneas da mesma loja esperam a mesma varredura.
         """
-        # In a real app, we'd resolve the store's IP from Zabbix or DB
-        # For now, we'll use a placeholder IP or the one from settings if available
-        # Assuming the store_id maps to a specific gateway/switch IP
-        
-        # Mocking IP resolution for demo purposes
-        target_ip = "192.168.10.2" 
-        
-        # Get credentials from settings
-        username = settings.SSH_USER or "admin"
-        password = settings.SSH_PASSWORD or "password"
-        
-        result = discovery_service.discover(target_ip, username, password)
-        
-        nodes = []
-        edges = []
-        
-        # Add the seed node (The Switch we connected to)
-        seed_id = f"sw-{store_id.lower()}"
-        nodes.append({
-            "id": seed_id,
-            "label": f"Switch {store_id}",
-            "group": "switch",
-            "level": 1,
-            "data": {
-                "ip": target_ip,
-                "status": "UP",
-                "model": "Detected via SSH"
+        asked_at = time.time()
+        cached = self._realtime.get(store_id)
+        if cached and not refresh and cached[0] > asked_at:
+            return {**cached[1], "cached": True}
+
+        lock = self._locks.get(store_id)
+        seeds = None
+        if lock is None:
+            # Lock por loja só depois que o Zabbix confirmou a loja: ids desconhecidos não acumulam locks
+            seeds = await self.resolve_seeds(store_id)
+            if not seeds:
+                return self._no_seeds(store_id)
+            lock = self._locks.setdefault(store_id, asyncio.Lock())
+        async with lock:
+            # Quem esperou no lock aproveita a varredura que terminou nesse meio tempo (inclusive no refresh)
+            cached = self._realtime.get(store_id)
+            if cached and cached[0] > time.time() and (not refresh or cached[1]["generated_at"] >= asked_at):
+                return {**cached[1], "cached": True}
+
+            if seeds is None:
+                seeds = await self.resolve_seeds(store_id)
+            if not seeds:
+                return self._no_seeds(store_id)
+
+            result = await ssh_executor.run(
+                discovery_service.discover_many,
+                seeds=[(s["ip"], s["name"]) for s in seeds],
+                username=settings.SSH_USER,
+                password=settings.SSH_PASSWORD,
+                max_hops=settings.TOPOLOGY_REALTIME_HOPS,
+                cache_mode="refresh" if refresh else "auto",
+            )
+            data = {
+                "nodes": result.get("nodes", []),
+                "edges": result.get("edges", []),
+                "store_id": store_id,
+                "seeds": [{"ip": s["ip"], "name": s["name"]} for s in seeds],
+                "generated_at": time.time(),
+                "elapsed_ms": result.get("elapsed_ms"),
+                "cache": result.get("cache"),
+                "error": result.get("error"),
             }
-        })
-        
-        if result["success"]:
-            neighbors = result["neighbors"]
-            for i, neighbor in enumerate(neighbors):
-                n_id = neighbor.get("id", f"dev-{i}")
-                n_label = neighbor.get("id", "Unknown Device")
-                n_ip = neighbor.get("ip", "0.0.0.0")
-                n_model = neighbor.get("model", "Unknown")
-                
-                # Determine group based on model/id
-                group = "switch"
-                if "AIR" in n_model or "AP" in n_id:
-                    group = "ap"
-                elif "Phone" in n_model:
-                    group = "phone"
-                elif "Router" in n_model:
-                    group = "router"
-                
-                nodes.append({
-                    "id": n_id,
-                    "label": n_label,
-                    "group": group,
-                    "level": 2,
-                    "data": {
-                        "ip": n_ip,
-                        "model": n_model,
-                        "status": "UP"
-                    }
-                })
-                
-                edges.append({"from": seed_id, "to": n_id})
-        else:
-            # Fallback or Error Node
-            nodes.append({
-                "id": "error-node",
-                "label": f"Discovery Failed: {result.get('error')}",
-                "group": "cloud",
-                "level": 2,
-                "color": "red"
-            })
-            edges.append({"from": seed_id, "to": "error-node"})
+            # Só guarda varredura que encontrou alguém além dos seeds que falharam
+            if result.get("success") and any("error" not in t for t in result.get("timings", [])):
+                self._realtime[store_id] = (time.time() + settings.TOPOLOGY_REALTIME_TTL, data)
+            return {**data, "cached": False}
 
-        return {"nodes": nodes, "edges": edges}
+    @staticmethod
+    def _no_seeds(store_id: str) -> dict:
+        return {"nodes": [], "edges": [], "store_id": store_id, "seeds": [], "cached": False,
+                "error": f"Nenhum equipamento de rede com IP cadastrado no Zabbix para a loja {store_id}"}
+
+    async def resolve_seeds(self, store_id: str) -> list:
+        """Hosts da loja no Zabbix que parecem equipamento de rede; sem nenhum, todos os hosts com IP."""
+        hosts = await zabbix_monitor.store_hosts([store_id])
+        network = [h for h in hosts if classify_device(h.get("name") or h.get("host") or "", "") in discovery_service.INCLUDE_TYPES]
+        return network or hosts
 
     def _add_store_nodes(self, nodes, edges, store_id, uplinks):
         clean_id = store_id.lower().replace(" ", "-")
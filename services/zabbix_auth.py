@@ -0,0 +1,134 @@
+import asyncio
+import time
+from typing import List, Optional
+from config import settings
+from services.http_clients import http_clients
+
+# Trechos das mensagens de erro do Zabbix quando o token expira ou é inválido
+SESSION_EXPIRED_MARKERS = ("re-login", "session terminated", "not authorised", "not authorized", "session expired")
+
+# Métodos que não aceitam o parâmetro "auth"
+UNAUTHENTICATED_METHODS = {"apiinfo.version", "user.login"}
+
+
+class ZabbixAPIError(Exception):
+    def __init__(self, method: str, error: dict):
+        self.method = method
+        self.error = error or {}
+        super().__init__(f"{method}: {self.error.get('data') or self.error.get('message') or self.error}")
+
+
+def is_session_expired(error: Optional[dict]) -> bool:
+    if not error:
+        return False
+    text = f"{error.get('message', '')} {error.get('data', '')}".lower()
+    return any(marker in text for marker in SESSION_EXPIRED_MARKERS)
+
+
+class ZabbixAuthManager:
+    """
+    Sessão única do backend no Zabbix, compartilhada pelo proxy e pelo monitor.
+    Faz login sob demanda com as credenciais do .env e refaz o login de forma
+    transparente quando o Zabbix responde que a sessão expirou.
+    """
+
+    def __init__(self):
+        self._token: Optional[str] = None
+        self._lock: Optional[asyncio.Lock] = None
+        self._stats = {"logins": 0, "relogins": 0, "login_failures": 0, "last_login": None}
+
+    @property
+    def configured(self) -> bool:
+        return bool(settings.ZABBIX_USER and settings.ZABBIX_PASSWORD)
+
+    async def token(self) -> str:
+        if self._token:
+            return self._token
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        async with self._lock:
+            # Outro chamador pode ter feito o login enquanto esperávamos o lock
+            if not self._token:
+                self._token = await self._login()
+        return self._token
+
+    async def _login(self) -> str:
+        if not self.configured:
+            raise ZabbixAPIError("user.login", {"data": "Credenciais Zabbix não configuradas no .env"})
+        # Suporta Zabbix 6.0+ (usa "username", não "user")
+        response = await http_clients.zabbix_post({
+            "jsonrpc": "2.0", "method": "user.login", "id": 1,
+            "params": {"username": settings.ZABBIX_USER, "password": settings.ZABBIX_PASSWORD},
+        })
+        data = response.json()
+        if not data.get("result"):
+            self._stats["login_failures"] += 1
+            raise ZabbixAPIError("user.login", data.get("error"))
+        self._stats["logins"] += 1
+        self._stats["last_login"] = time.time()
+        print(f"[ZabbixAuth] Sessão do backend iniciada para {settings.ZABBIX_USER}")
+        return data["result"]
+
+    def _invalidate(self, token: str):
+        # Só descarta se ninguém já trocou o token nesse meio tempo
+        if self._token == token:
+            self._token = None
+
+    async def request(self, body: dict) -> dict:
+        """
+        Envia um payload JSON-RPC com o token do backend e devolve a resposta bruta.
+        Em sessão expirada refaz o login uma vez e repete a chamada.
+        """
+        method = body.get("method", "")
+        if method in UNAUTHENTICATED_METHODS:
+            body = {k: v for k, v in body.items() if k != "auth"}
+            return (await http_clients.zabbix_post(body)).json()
+
+        for attempt in range(2):
+            token = await self.token()
+            response = await http_clients.zabbix_post({**body, "auth": token})
+            data = response.json()
+            if attempt == 0 and isinstance(data, dict) and is_session_expired(data.get("error")):
+                print(f"[ZabbixAuth] Sessão expirada em {method}; refazendo login")
+                self._stats["relogins"] += 1
+                self._invalidate(token)
+                continue
+            return data
+        return data
+
+    async def request_batch(self, bodies: List[dict]) -> List[dict]:
+        """
+        Envia vários payloads JSON-RPC numa única requisição HTTP (batch).
+        Devolve as respostas na mesma ordem dos payloads enviados.
+        """
+        for attempt in range(2):
+            token = await self.token()
+            batch = [{**{k: v for k, v in b.items() if k != "auth"}, "id": i}
+                     if b.get("method") in UNAUTHENTICATED_METHODS else {**b, "auth": token, "id": i}
+                     for i, b in enumerate(bodies)]
+            response = await http_clients.zabbix_post(batch)
+            data = response.json()
+            if not isinstance(data, list):
+                # Servidor recusou o batch como um todo
+                raise ZabbixAPIError("batch", data.get("error") if isinstance(data, dict) else None)
+            by_id = {d.get("id"): d for d in data}
+            ordered = [by_id.get(i, {"error": {"data": "resposta ausente no batch"}}) for i in range(len(bodies))]
+            if attempt == 0 and any(is_session_expired(d.get("error")) for d in ordered):
+                self._stats["relogins"] += 1
+                self._invalidate(token)
+                continue
+            return ordered
+        return ordered
+
+    async def call(self, method: str, params) -> list:
+        """Chamada autenticada que devolve apenas o 'result' (ou levanta ZabbixAPIError)."""
+        data = await self.request({"jsonrpc": "2.0", "method": method, "params": params, "id": 1})
+        if "error" in data:
+            raise ZabbixAPIError(method, data["error"])
+        return data.get("result", [])
+
+    def stats(self) -> dict:
+        return {"has_session": bool(self._token), **self._stats}
+
+
+zabbix_auth = ZabbixAuthManager()
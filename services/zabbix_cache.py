@@ -0,0 +1,156 @@
+import asyncio
+import json
+import time
+from collections import OrderedDict
+from typing import Awaitable, Callable, Dict, Set
+from config import settings
+
+# TTL (segundos) por método de leitura; métodos fora da lista não são cacheados
+METHOD_TTLS = {
+    "apiinfo.version": 3600,
+    "hostgroup.get": 300,
+    "map.get": 300,
+    "host.get": 60,
+    "trigger.get": 30,
+    "item.get": 15,
+    "problem.get": 10,
+    "event.get": 10,
+    "history.get": 30,
+    "trend.get": 300,
+}
+
+# Escritas num objeto invalidam o .get do próprio objeto e estes relacionados
+RELATED_INVALIDATIONS = {
+    "event": ("problem.get", "trigger.get"),
+    "problem": ("event.get", "trigger.get"),
+    "trigger": ("problem.get", "event.get"),
+    "host": ("hostgroup.get", "item.get", "problem.get", "trigger.get"),
+    "hostgroup": ("host.get",),
+    "item": ("history.get", "trend.get"),
+    "map": (),
+}
+
+# Métodos que não leem nem alteram dados monitorados
+NEUTRAL_METHODS = {"user.login", "user.logout", "user.checkAuthentication"}
+
+
+def is_write_method(method: str) -> bool:
+    return method not in METHOD_TTLS and method not in NEUTRAL_METHODS and not method.endswith(".get")
+
+
+class _Entry:
+    __slots__ = ("method", "response", "expires_at")
+
+    def __init__(self, method: str, response: dict, expires_at: float):
+        self.method = method
+        self.response = response
+        self.expires_at = expires_at
+
+
+class ZabbixResponseCache:
+    """
+    Cache LRU com TTL por método para respostas JSON-RPC do Zabbix.
+    Requisições idênticas simultâneas compartilham uma única chamada ao upstream
+    (single-flight); escritas passam direto e invalidam os métodos afetados.
+    Cada método tem uma geração, incrementada antes e depois de uma escrita: uma
+    leitura que começou numa geração anterior não grava no cache, para que uma
+    resposta lida durante a escrita não volte a servir dado antigo.
+    """
+
+    def __init__(self, max_entries: int = 1000):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, _Entry]" = OrderedDict()
+        self._by_method: Dict[str, Set[str]] = {}
+        self._inflight: Dict[str, asyncio.Task] = {}
+        self._generation: Dict[str, int] = {}
+        self._stats = {"hits": 0, "misses": 0, "coalesced": 0, "bypass": 0, "invalidations": 0, "evictions": 0,
+                       "stale_fills": 0}
+
+    @staticmethod
+    def make_key(method: str, params) -> str:
+        # O token de auth fica fora da chave: todas as abas usam a mesma conta de serviço
+        return method + ":" + json.dumps(params, sort_keys=True, separators=(",", ":"), default=str)
+
+    async def fetch(self, method: str, params, upstream: Callable[[], Awaitable[dict]]) -> dict:
+        ttl = METHOD_TTLS.get(method)
+        if not ttl:
+            self._stats["bypass"] += 1
+            if not is_write_method(method):
+                return await upstream()
+            # Antes: nada lido a partir de agora entra no cache. Depois: descarta o que
+            # foi lido enquanto a escrita ainda não tinha sido aplicada.
+            self.invalidate_for_write(method)
+            try:
+                return await upstream()
+            finally:
+                self.invalidate_for_write(method)
+
+        key = self.make_key(method, params)
+        entry = self._entries.get(key)
+        now = time.monotonic()
+        if entry and entry.expires_at > now:
+            self._entries.move_to_end(key)
+            self._stats["hits"] += 1
+            return entry.response
+
+        task = self._inflight.get(key)
+        if task:
+            self._stats["coalesced"] += 1
+        else:
+            self._stats["misses"] += 1
+            task = asyncio.ensure_future(self._load(key, method, ttl, upstream, self._generation.get(method, 0)))
+            self._inflight[key] = task
+        # shield: se este cliente desconectar, os demais ainda recebem a resposta
+        return await asyncio.shield(task)
+
+    async def _load(self, key: str, method: str, ttl: float, upstream, generation: int) -> dict:
+        try:
+            response = await upstream()
+            # Erros (ex: sessão expirada) não vão para o cache
+            if isinstance(response, dict) and "result" in response:
+                if self._generation.get(method, 0) == generation:
+                    self._store(key, method, response, ttl)
+                else:
+                    # Uma escrita afetou o método durante a leitura
+                    self._stats["stale_fills"] += 1
+            return response
+        finally:
+            if self._inflight.get(key) is asyncio.current_task():
+                self._inflight.pop(key, None)
+
+    def _store(self, key: str, method: str, response: dict, ttl: float):
+        self._entries[key] = _Entry(method, response, time.monotonic() + ttl)
+        self._entries.move_to_end(key)
+        self._by_method.setdefault(method, set()).add(key)
+        while len(self._entries) > self.max_entries:
+            old_key, old = self._entries.popitem(last=False)
+            self._by_method.get(old.method, set()).discard(old_key)
+            self._stats["evictions"] += 1
+
+    def invalidate_for_write(self, method: str):
+        obj = method.split(".")[0]
+        self.invalidate({f"{obj}.get", *RELATED_INVALIDATIONS.get(obj, ())})
+
+    def invalidate(self, methods):
+        for m in methods:
+            self._generation[m] = self._generation.get(m, 0) + 1
+            # Leituras em andamento desses métodos não são mais compartilhadas com novos pedidos
+            prefix = m + ":"
+            for key in [k for k in self._inflight if k.startswith(prefix)]:
+                del self._inflight[key]
+            for key in self._by_method.pop(m, set()):
+                if self._entries.pop(key, None) is not None:
+                    self._stats["invalidations"] += 1
+
+    def stats(self) -> dict:
+        lookups = self._stats["hits"] + self._stats["misses"] + self._stats["coalesced"]
+        return {
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "in_flight": len(self._inflight),
+            "hit_rate": round((self._stats["hits"] + self._stats["coalesced"]) / lookups, 3) if lookups else None,
+            **self._stats,
+        }
+
+
+zabbix_cache = ZabbixResponseCache(max_entries=settings.ZABBIX_CACHE_MAX_ENTRIES)
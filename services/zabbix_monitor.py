@@ -1,64 +1,227 @@
-import requests
-import json
-import urllib3
-from config import settings
+import asyncio
+import time
+from typing import Dict, List, Tuple
+from services.zabbix_auth import zabbix_auth, ZabbixAPIError
+
+PAGE_SIZE = 1000
+# Grupos de host mudam pouco; usados só pelas regras de roteamento por grupo
+GROUPS_TTL = 300
 
-# Disable SSL warnings
-urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
 
 class ZabbixMonitor:
+    """
+    Cliente async do Zabbix usado pelo scheduler. Usa a sessão compartilhada do
+    backend (zabbix_auth) e o cliente HTTP keep-alive da aplicação; várias chamadas
+    independentes vão numa única requisição via batch JSON-RPC.
+    """
+
     def __init__(self):
-        self.url = settings.ZABBIX_URL
-        self.user = settings.ZABBIX_USER
-        self.password = settings.ZABBIX_PASSWORD
-        self.auth_token = None
-
-    def authenticate(self):
-        if self.auth_token: return True
-        
-        try:
-            payload = {
-                "jsonrpc": "2.0",
-                "method": "user.login",
-                "params": {"user": self.user, "password": self.password},
-                "id": 1
-            }
-            response = requests.post(self.url, json=payload, timeout=5, verify=False)
-            data = response.json()
-            if 'result' in data:
-                self.auth_token = data['result']
-                return True
-        except Exception as e:
-            print(f"[ZabbixMonitor] Auth Error: {e}")
-        return False
+        # None = ainda não sabemos se o servidor aceita batch JSON-RPC
+        self.batch_supported = None
+        self._groups: Dict[str, Tuple[float, List[str]]] = {}   # hostid -> (expira em, nomes)
 
-    def get_problems(self, severity=4):
+    async def call(self, method: str, params: dict):
+        return await zabbix_auth.call(method, params)
+
+    async def batch(self, calls: Dict[str, Tuple[str, dict]]) -> Dict[str, list]:
         """
-        Get active problems with severity >= given level.
-        Severity: 4=High, 5=Disaster
+        Executa {nome: (método, params)} numa só ida ao Zabbix e devolve {nome: result}.
+        Se o servidor recusar batch, cai para chamadas concorrentes na mesma conexão.
+        """
+        names = list(calls)
+        if self.batch_supported is not False:
+            try:
+                responses = await zabbix_auth.request_batch([
+                    {"jsonrpc": "2.0", "method": m, "params": p} for m, p in calls.values()
+                ])
+                self.batch_supported = True
+                results = {}
+                for name, resp in zip(names, responses):
+                    if "error" in resp:
+                        raise ZabbixAPIError(calls[name][0], resp["error"])
+                    results[name] = resp.get("result", [])
+                return results
+            except ZabbixAPIError as e:
+                if e.method != "batch":
+                    raise
+                print(f"[ZabbixMonitor] Batch JSON-RPC não suportado ({e}); usando chamadas paralelas")
+                self.batch_supported = False
+
+        values = await asyncio.gather(*(self.call(m, p) for m, p in calls.values()))
+        return dict(zip(names, values))
+
+    async def paginate(self, method: str, params: dict, first_page: list = None,
+                       page_size: int = PAGE_SIZE, id_field: str = "eventid", ascending: bool = False) -> list:
         """
-        if not self.authenticate(): return []
+        Pagina problem.get/event.get por eventid (eventid_till decrescente ou
+        eventid_from crescente), já que a API não tem offset. first_page permite
+        reaproveitar a página vinda de um batch.
+        """
+        rows = list(first_page) if first_page is not None else await self.call(method, {**params, "limit": page_size})
+        page = rows
+        while len(page) >= page_size:
+            if ascending:
+                bound = {"eventid_from": str(max(int(r[id_field]) for r in page) + 1)}
+            else:
+                bound = {"eventid_till": str(min(int(r[id_field]) for r in page) - 1)}
+            page = await self.call(method, {**params, **bound, "limit": page_size})
+            rows.extend(page)
+        return rows
+
+    @staticmethod
+    def attach_host(p: dict, hosts: list) -> dict:
+        p["hosts"] = hosts
+        p["host"] = ", ".join(h.get("name") or h.get("host", "") for h in hosts) or "Unknown Host"
+        return p
 
+    async def get_problems(self, severity=4, recent=True) -> List[dict]:
+        """
+        Get active problems with severity >= given level, já com os hosts.
+        Severity: 4=High, 5=Disaster
+        Em caso de erro devolve lista vazia (use fetch_problems para propagar o erro).
+        """
         try:
-            payload = {
-                "jsonrpc": "2.0",
-                "method": "problem.get",
-                "params": {
-                    "output": "extend",
-                    "selectAcknowledges": "extend",
-                    "severity": str(severity),
-                    "sortfield": ["eventid"],
-                    "sortorder": "DESC",
-                    "recent": "true"
-                },
-                "auth": self.auth_token,
-                "id": 2
-            }
-            response = requests.post(self.url, json=payload, timeout=10, verify=False)
-            data = response.json()
-            return data.get('result', [])
+            return await self.fetch_problems(severity, recent)
         except Exception as e:
             print(f"[ZabbixMonitor] Get Problems Error: {e}")
             return []
 
+    async def fetch_problems(self, severity=4, recent=True) -> List[dict]:
+        """Problemas e triggers (com hosts) vêm num único round-trip e são unidos aqui."""
+        problem_params = {
+            "output": ["eventid", "objectid", "name", "severity", "clock", "acknowledged", "r_eventid"],
+            "selectTags": ["tag", "value"],
+            "severities": list(range(severity, 6)),
+            "source": 0,
+            "object": 0,
+            "sortfield": ["eventid"],
+            "sortorder": "DESC",
+            "recent": "true" if recent else "false",
+        }
+        data = await self.batch({
+            "problems": ("problem.get", {**problem_params, "limit": PAGE_SIZE}),
+            "triggers": ("trigger.get", {
+                "output": ["triggerid", "description", "priority"],
+                "selectHosts": ["hostid", "host", "name"],
+                "min_severity": severity,
+                "filter": {"value": 1},
+                "monitored": True,
+                "skipDependent": True,
+            }),
+        })
+        problems = await self.paginate("problem.get", problem_params, first_page=data["problems"])
+
+        hosts_by_trigger = {t["triggerid"]: t.get("hosts", []) for t in data["triggers"]}
+        missing = {p["objectid"] for p in problems if p["objectid"] not in hosts_by_trigger}
+        if missing:
+            # Triggers já normalizados (problemas "recent") não vêm no filtro value=1
+            try:
+                extra = await self.call("trigger.get", {
+                    "output": ["triggerid"],
+                    "selectHosts": ["hostid", "host", "name"],
+                    "triggerids": list(missing),
+                })
+                hosts_by_trigger.update({t["triggerid"]: t.get("hosts", []) for t in extra})
+            except Exception as e:
+                print(f"[ZabbixMonitor] Trigger hosts Error: {e}")
+
+        for p in problems:
+            self.attach_host(p, hosts_by_trigger.get(p["objectid"], []))
+        return problems
+
+    async def latest_eventid(self) -> int:
+        rows = await self.call("event.get", {
+            "output": ["eventid"], "sortfield": ["eventid"], "sortorder": "DESC", "limit": 1,
+        })
+        return int(rows[0]["eventid"]) if rows else 0
+
+    async def get_event_changes(self, since_eventid: int, severity: int, tracked_triggerids) -> Dict[str, list]:
+        """
+        Eventos criados depois do cursor: novos problemas (value=1, com hosts) e
+        eventos de recuperação (value=0) dos triggers que estamos acompanhando.
+        """
+        base = {"source": 0, "object": 0, "sortfield": ["eventid"], "sortorder": "ASC",
+                "eventid_from": str(since_eventid + 1)}
+        new_params = {
+            **base, "value": 1, "severities": list(range(severity, 6)),
+            "output": ["eventid", "objectid", "name", "severity", "clock"],
+            "selectHosts": ["hostid", "host", "name"],
+            "selectTags": ["tag", "value"],
+        }
+        calls = {"new": ("event.get", {**new_params, "limit": PAGE_SIZE})}
+        rec_params = None
+        if tracked_triggerids:
+            rec_params = {**base, "value": 0, "objectids": list(tracked_triggerids),
+                          "output": ["eventid", "objectid", "clock"]}
+            calls["recovered"] = ("event.get", {**rec_params, "limit": PAGE_SIZE})
+
+        data = await self.batch(calls)
+        new = await self.paginate("event.get", new_params, first_page=data["new"], ascending=True)
+        recovered = []
+        if rec_params:
+            recovered = await self.paginate("event.get", rec_params, first_page=data["recovered"], ascending=True)
+
+        # Problemas que surgiram e normalizaram entre dois ciclos
+        new_triggers = {e["objectid"] for e in new} - set(tracked_triggerids or ())
+        if new_triggers:
+            recovered += await self.paginate("event.get", {
+                **base, "value": 0, "objectids": list(new_triggers), "output": ["eventid", "objectid", "clock"],
+            }, ascending=True)
+        for e in new:
+            self.attach_host(e, e.get("hosts", []))
+        return {"new": new, "recovered": recovered}
+
+    async def host_groups(self, hostids) -> Dict[str, List[str]]:
+        """Nomes dos grupos de cada hostid, com cache de GROUPS_TTL segundos."""
+        now = time.monotonic()
+        hostids = set(hostids)
+        missing = [h for h in hostids if h not in self._groups or self._groups[h][0] < now]
+        if missing:
+            # hostgroup.get + selectHosts funciona igual em todas as versões (selectGroups mudou no 6.2)
+            groups = await self.call("hostgroup.get", {
+                "output": ["name"], "hostids": missing, "selectHosts": ["hostid"],
+            })
+            found = {h: [] for h in missing}
+            for g in groups:
+                for h in g.get("hosts", []):
+                    if h["hostid"] in found:
+                        found[h["hostid"]].append(g["name"])
+            for h, names in found.items():
+                self._groups[h] = (now + GROUPS_TTL, names)
+        return {h: self._groups[h][1] for h in hostids if h in self._groups}
+
+    async def store_hosts(self, store_ids: List[str]) -> List[dict]:
+        """
+        Hosts das lojas (host group do Zabbix = código da loja) com o IP de gerência:
+        [{hostid, host, name, ip, store_id}]. Prefere a interface principal e ignora
+        loopback/0.0.0.0; hosts sem IP ficam de fora.
+        """
+        # Como em host_groups: hostgroup.get + selectHosts (host.get selectGroups saiu no 6.2+)
+        groups = await self.call("hostgroup.get", {
+            "output": ["groupid", "name"],
+            "filter": {"name": store_ids},
+            "selectHosts": ["hostid"],
+        })
+        host_to_store: Dict[str, str] = {}
+        for g in groups:
+            for h in g.get("hosts", []):
+                host_to_store.setdefault(h["hostid"], g["name"])
+        if not host_to_store:
+            return []
+        hosts = await self.call("host.get", {
+            "output": ["hostid", "host", "name"],
+            "hostids": list(host_to_store),
+            "selectInterfaces": ["ip", "main"],
+        })
+        result = []
+        for h in hosts:
+            ips = [i["ip"] for i in h.get("interfaces", []) if i.get("ip") and i["ip"] not in ("127.0.0.1", "0.0.0.0")]
+            main_ips = [i["ip"] for i in h.get("interfaces", []) if i.get("main") == "1" and i.get("ip") in ips]
+            ip = (main_ips or ips or [None])[0]
+            if not ip:
+                continue
+            result.append({"hostid": h["hostid"], "host": h.get("host"), "name": h.get("name"), "ip": ip,
+                           "store_id": host_to_store.get(h["hostid"])})
+        return result
+
 zabbix_monitor = ZabbixMonitor()
@@ -0,0 +1,155 @@
+import os
+
+import pytest
+
+from services.neighbor_parser import classify_device, count_neighbors, detect_format, is_command_error, parse_neighbors
+
+FIXTURES = os.path.join(os.path.dirname(__file__), "fixtures")
+
+
+def fixture(name: str) -> str:
+    with open(os.path.join(FIXTURES, name), encoding="utf-8") as f:
+        return f.read()
+
+
+# ─── parse_neighbors ──────────────────────────────────────────────────────────
+def test_parse_cdp_ios_detail():
+    neighbors = parse_neighbors(fixture("cdp_detail_ios.txt"))
+    assert [n["id"] for n in neighbors] == ["LJ0421-SW-CORE.lojas.corp.local", "LJ0421-AP-01", "SEP001B54A1B2C3"]
+    assert neighbors[0] == {
+        "id": "LJ0421-SW-CORE.lojas.corp.local", "ip": "10.42.1.1", "model": "cisco WS-C3850-24T",
+        "capabilities": "Router Switch IGMP", "local_interface": "GigabitEthernet1/0/52",
+        "remote_interface": "GigabitEthernet1/0/1",
+    }
+    assert neighbors[1]["capabilities"] == "Trans-Bridge Source-Route-Bridge IGMP"
+    assert neighbors[2]["remote_interface"] == "Port 1"
+
+
+def test_parse_cdp_nxos_detail():
+    neighbors = parse_neighbors(fixture("cdp_detail_nxos.txt"))
+    # "Device ID:NOME(SERIAL)" sem espaço; vale o primeiro IPv4 (interface, não mgmt)
+    assert [(n["id"], n["ip"]) for n in neighbors] == [("DC-LEAF-02", "10.250.0.12"), ("WAN-RTR-01", "172.16.0.1")]
+    assert neighbors[0]["model"] == "N9K-C93180YC-EX"
+    assert (neighbors[1]["local_interface"], neighbors[1]["remote_interface"]) == ("mgmt0", "GigabitEthernet0/0/2")
+
+
+def test_parse_lldp_ios_detail():
+    neighbors = parse_neighbors(fixture("lldp_detail_ios.txt"))
+    assert neighbors == [
+        {"local_interface": "Gi1/0/49", "remote_interface": "Gi1/0/1", "id": "LJ0421-SW-CORE",
+         "model": "Cisco IOS Software, C3850 Software (CAT3K_CAA-UNIV", "capabilities": "Bridge Router",
+         "ip": "10.42.1.1"},
+        {"local_interface": "Gi1/0/48", "remote_interface": "GigabitEthernet0/0/1", "id": "LJ0421-SW-HW-01",
+         "model": "S5720-28X-LI-AC", "capabilities": "Bridge", "ip": "10.42.1.20"},
+    ]
+
+
+def test_parse_lldp_huawei_detail():
+    neighbors = parse_neighbors(fixture("lldp_detail_huawei.txt"))
+    assert [(n["id"], n["local_interface"], n["remote_interface"], n["ip"]) for n in neighbors] == [
+        ("LJ0421-SW-ACESSO-01", "GigabitEthernet0/0/1", "GigabitEthernet1/0/48", "10.42.1.2"),
+        ("LJ0421-AP-HW-02", "GigabitEthernet0/0/24", "GigabitEthernet0/0/1", "10.42.30.12"),
+    ]
+    assert all(len(n["model"]) <= 50 for n in neighbors)
+
+
+def test_parse_lldp_comware_detail():
+    neighbors = parse_neighbors(fixture("lldp_detail_comware.txt"))
+    assert [(n["id"], n["local_interface"], n["remote_interface"], n["ip"]) for n in neighbors] == [
+        ("LJ0530-SW-CORE", "GigabitEthernet1/0/25", "GigabitEthernet1/0/52", "10.53.0.1"),
+        ("LJ0530-SW-ACESSO-01", "GigabitEthernet1/0/1", "GigabitEthernet1/0/28", "10.53.0.11"),
+    ]
+    assert neighbors[1]["capabilities"] == "Bridge"
+
+
+@pytest.mark.parametrize("name, fmt", [
+    ("cdp_detail_ios.txt", "cdp"),
+    ("cdp_detail_nxos.txt", "cdp"),
+    ("lldp_detail_ios.txt", "lldp_cisco"),
+    ("lldp_detail_huawei.txt", "lldp_huawei"),
+    ("lldp_detail_comware.txt", "lldp_huawei"),
+    ("cdp_detail_empty.txt", None),
+    ("cdp_invalid_command.txt", None),
+])
+def test_detect_format(name, fmt):
+    assert detect_format(fixture(name)) == fmt
+
+
+@pytest.mark.parametrize("name", ["cdp_detail_empty.txt", "cdp_invalid_command.txt"])
+def test_parse_without_neighbors(name):
+    assert parse_neighbors(fixture(name)) == []
+
+
+def test_parse_empty_output():
+    assert parse_neighbors("") == []
+
+
+def test_parse_truncated_cdp_keeps_blocks_with_device_id():
+    # Bloco sem "Device ID" é descartado; o último, cortado no meio, fica só com o id
+    assert parse_neighbors(fixture("cdp_detail_truncated.txt")) == [
+        {"id": "LJ0421-SW-ACESSO-02", "ip": "10.42.1.3", "model": "cisco WS-C2960X-48FPD-L",
+         "capabilities": "Switch IGMP", "local_interface": "GigabitEthernet1/0/47",
+         "remote_interface": "GigabitEthernet1/0/52"},
+        {"id": "LJ0421-SW-ACESSO-03"},
+    ]
+
+
+def test_invalid_command_is_detected():
+    assert is_command_error(fixture("cdp_invalid_command.txt"))
+    assert not is_command_error(fixture("cdp_detail_ios.txt"))
+
+
+# ─── classify_device ──────────────────────────────────────────────────────────
+@pytest.mark.parametrize("name, types", [
+    ("cdp_detail_ios.txt", ["switch", "ap", "unknown"]),
+    ("cdp_detail_nxos.txt", ["switch", "router"]),
+    ("lldp_detail_ios.txt", ["switch", "switch"]),
+    ("lldp_detail_huawei.txt", ["switch", "ap"]),
+])
+def test_classify_parsed_neighbors(name, types):
+    neighbors = parse_neighbors(fixture(name))
+    assert [classify_device(n["id"], n.get("model", ""), n.get("capabilities", "")) for n in neighbors] == types
+
+
+@pytest.mark.parametrize("device_id, platform, capabilities, expected", [
+    ("LJ0530-SW-ACESSO-01", "H3C Comware Platform Software", "Bridge", "switch"),
+    ("AR-LOJA-01", "Huawei AR651", "Router", "router"),
+    ("AP-SALA", "", "WLAN-Access-Point", "ap"),
+    ("FGT60F-LOJA12", "", "", "firewall"),
+    ("FG-LOJA12", "", "", "firewall"),
+    ("LJ0421-SW-01", "cisco WS-C2960X-48FPD-L", "Router Switch IGMP", "switch"),
+    ("LJ0421-RT-01", "cisco ISR4331/K9", "Router Switch IGMP", "router"),
+    ("LJ0421-CAM-01", "Axis Q6135", "Host", "unknown"),
+])
+def test_classify_device(device_id, platform, capabilities, expected):
+    assert classify_device(device_id, platform, capabilities) == expected
+
+
+# ─── count_neighbors ──────────────────────────────────────────────────────────
+@pytest.mark.parametrize("name, expected", [
+    ("cdp_summary_ios.txt", 3),
+    ("cdp_summary_nxos.txt", 2),
+    ("lldp_summary_ios.txt", 2),
+    ("lldp_brief_huawei.txt", 2),
+    ("cdp_detail_empty.txt", 0),
+    ("cdp_invalid_command.txt", None),
+])
+def test_count_neighbors(name, expected):
+    assert count_neighbors(fixture(name)) == expected
+
+
+def test_count_wrapped_cdp_summary_counts_each_device_once():
+    # Sem "Total entries": o ID longo fica sozinho numa linha e o resto vem na seguinte
+    assert count_neighbors(fixture("cdp_summary_ios_wrapped.txt")) == 2
+
+
+@pytest.mark.parametrize("name", ["cdp_summary_ios.txt", "cdp_summary_nxos.txt", "lldp_summary_ios.txt"])
+def test_count_without_total_line_matches_total(name):
+    text = fixture(name)
+    without_total = "\n".join(l for l in text.splitlines() if not l.startswith("Total"))
+    assert count_neighbors(without_total) == count_neighbors(text)
+
+
+def test_count_ignores_detail_output():
+    # "Device ID:" do detail não é cabeçalho da tabela resumida
+    assert count_neighbors(fixture("cdp_detail_truncated.txt")) is None